@@ -22,6 +22,46 @@ INCOMPLETE_SPS_PKG_PATH:
     pacotes de XML validados e nomeados de acordo com SPS, mas com ativos digitais faltantes
 ERRORS_PATH:	
     arquivos de erros    
+SOURCE_PACK_PATH:
+    arquivos XML baixados do AM gravados em packs compactados, alternativa
+    a SOURCE_PATH para grandes volumes de documentos
+SOURCE_PACK_MAX_SIZE:
+    tamanho máximo, em bytes, de cada pack
+RAW_BODY_SINK_PATH:
+    pasta onde são gravados em packs, para depuração, os `body` recebidos
+    pela conversão. Quando vazia, os `body` não são gravados
+
+REQUEST_POOL_SIZE:
+    quantidade máxima de conexões persistentes mantidas por host
+REQUEST_TIMEOUT:
+    tempo máximo, em segundos, de espera por uma resposta HTTP
+REQUEST_RETRIES:
+    quantidade de novas tentativas em falhas de conexão e respostas 5xx.
+    Nas requisições ao AM, as respostas 429 também são repetidas e cada
+    tentativa aguarda o circuito e o `Retry-After` informado pelo AM
+REQUEST_BACKOFF_FACTOR:
+    fator de espera exponencial entre as novas tentativas
+REQUEST_CACHE_MAX_SIZE:
+    tamanho máximo, em bytes, do cache de respostas do AM
+REQUEST_CACHE_MAX_AGE:
+    idade máxima, em segundos, de uma resposta servida do cache sem
+    requisição condicional ao AM
+REQUEST_LIMIT_INITIAL:
+    limite inicial de requisições simultâneas ao AM, ajustado durante a
+    execução conforme a latência e os erros das respostas
+REQUEST_LIMIT_MAX:
+    limite máximo de requisições simultâneas ao AM
+REQUEST_LATENCY_TARGET:
+    latência, em segundos, acima da qual uma resposta do AM é considerada
+    sinal de sobrecarga
+REQUEST_BREAKER_THRESHOLD:
+    quantidade de falhas consecutivas que interrompe as requisições ao AM
+REQUEST_BREAKER_RESET:
+    tempo, em segundos, de pausa das requisições ao AM antes de testá-lo
+    novamente
+REQUEST_BREAKER_MAX_WAIT:
+    tempo máximo, em segundos, que uma requisição aguarda o AM voltar a
+    responder
 """
 
 _default = dict(
@@ -40,6 +80,21 @@ _default = dict(
     CONSTRUCTOR_PATH=os.path.join(BASE_PATH, "xml/constructor"),
     ERRORS_PATH=os.path.join(BASE_PATH, "xml/errors"),
     CACHE_PATH=os.path.join(BASE_PATH, ".cache"),
+    SOURCE_PACK_PATH=os.path.join(BASE_PATH, "xml/source_packs"),
+    SOURCE_PACK_MAX_SIZE=str(256 * 1024 ** 2),
+    RAW_BODY_SINK_PATH="",
+    REQUEST_POOL_SIZE="10",
+    REQUEST_TIMEOUT="30",
+    REQUEST_RETRIES="3",
+    REQUEST_BACKOFF_FACTOR="0.5",
+    REQUEST_CACHE_MAX_SIZE=str(2 * 1024 ** 3),
+    REQUEST_CACHE_MAX_AGE=str(24 * 60 * 60),
+    REQUEST_LIMIT_INITIAL="4",
+    REQUEST_LIMIT_MAX="64",
+    REQUEST_LATENCY_TARGET="10",
+    REQUEST_BREAKER_THRESHOLD="5",
+    REQUEST_BREAKER_RESET="30",
+    REQUEST_BREAKER_MAX_WAIT="300",
 )
 
 
@@ -52,7 +107,7 @@ def get(config: str):
 
 
 INITIAL_PATH = [get(k) for k, v in _default.items() if k.endswith("_PATH")]
-INITIAL_PATH = [item for item in INITIAL_PATH if item is not None]
+INITIAL_PATH = [item for item in INITIAL_PATH if item]
 
 
 DOC_TYPE_XML = """<!DOCTYPE article PUBLIC "-//NLM//DTD JATS (Z39.96) Journal Publishing DTD v1.1 20151215//EN" "https://jats.nlm.nih.gov/publishing/1.1/JATS-journalpublishing1.dtd">"""
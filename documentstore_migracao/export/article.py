@@ -3,9 +3,6 @@ import logging
 from articlemeta.client import RestfulClient
 from documentstore_migracao import config
 from documentstore_migracao.utils import request
-from documentstore.domain import retry_gracefully
-from requests.exceptions import HTTPError, ConnectTimeout, ConnectionError
-from urllib3.exceptions import MaxRetryError
 
 logger = logging.getLogger(__name__)
 client = RestfulClient()
@@ -15,23 +12,47 @@ def ext_identifiers(issn_journal):
     articles_id = request.get(
         "%s/article/identifiers/" % config.get("AM_URL_API"),
         params={"collection": config.get("SCIELO_COLLECTION"), "issn": issn_journal},
+        throttled=True,
     )
     if articles_id:
         return articles_id.json()
 
 
+def ext_identifiers_page(offset, limit=1000, **filters):
+    """Retorna uma página da listagem de identificadores dos documentos
+    da coleção. `filters` aceita os parâmetros `issn`, `from` e `until`
+    do AM"""
+
+    params = {
+        "collection": config.get("SCIELO_COLLECTION"),
+        "offset": offset,
+        "limit": limit,
+    }
+    params.update((key, value) for key, value in filters.items() if value)
+    return request.get(
+        "%s/article/identifiers/" % config.get("AM_URL_API"),
+        params=params,
+        throttled=True,
+    ).json()
+
+
 def get_articles(issn_journal):
     return client.documents(
         collection=config.get("SCIELO_COLLECTION"), issn=issn_journal
     )
 
 
-@retry_gracefully(exc_list=[HTTPError, ConnectTimeout, MaxRetryError, ConnectionError])
-def ext_article(code, **ext_params):
+def ext_article(code, revalidate=False, **ext_params):
     params = ext_params
     params.update({"collection": config.get("SCIELO_COLLECTION"), "code": code})
     try:
-        article = request.get("%s/article" % config.get("AM_URL_API"), params=params)
+        article = request.get(
+            "%s/article" % config.get("AM_URL_API"),
+            params=params,
+            cached=True,
+            throttled=True,
+            revalidate=revalidate,
+        )
     except request.HTTPGetError:
         logger.error("Erro coletando dados do artigo PID %s" % code)
     else:
@@ -44,9 +65,11 @@ def ext_article_json(code, **ext_params):
         return article.json()
 
 
-def ext_article_txt(code, **ext_params):
+def ext_article_txt(code, revalidate=False, **ext_params):
     logger.debug("\t Arquivo XML '%s' extraido", code)
-    article = ext_article(code, body="true", format="xmlrsps", **ext_params)
+    article = ext_article(
+        code, revalidate=revalidate, body="true", format="xmlrsps", **ext_params
+    )
     if article:
         return article.text
 
@@ -64,6 +87,45 @@ def get_all_articles_notXML(issn):
     return articles
 
 
+def iter_documents(issn_journal, page_size=100):
+    """Pagina a listagem de documentos de um periódico no AM. Os itens
+    da listagem não incluem o conteúdo dos documentos"""
+
+    params = {
+        "collection": config.get("SCIELO_COLLECTION"),
+        "issn": issn_journal,
+        "limit": page_size,
+        "offset": 0,
+        "body": "false",
+    }
+    while True:
+        page = request.get(
+            "%s/articles" % config.get("AM_URL_API"), params=params, throttled=True
+        )
+        documents = page.json().get("objects", [])
+        yield from documents
+
+        if len(documents) < page_size:
+            break
+        params = dict(params, offset=params["offset"] + page_size)
+
+
+def iter_notXML_codes(issn_journal, page_size=100):
+    """Retorna os PIDs dos documentos de um periódico que não estão no
+    formato XML, descartando os demais sem baixar seu conteúdo"""
+
+    skipped = 0
+    for document in iter_documents(issn_journal, page_size=page_size):
+        if document.get("version") == "xml":
+            skipped += 1
+            continue
+        yield document["code"]
+
+    logger.debug(
+        "\t %s documentos XML ignorados do periódico '%s'", skipped, issn_journal
+    )
+
+
 def get_not_xml_article(article):
     if article.data["version"] != "xml":
         return ext_article_txt(article.data["code"])
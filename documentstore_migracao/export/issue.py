@@ -9,13 +9,17 @@ def ext_identifiers(issn_journal):
     issues_id = request.get(
         "%s/issue/identifiers/" % config.get("AM_URL_API"),
         params={"collection": config.get("SCIELO_COLLECTION"), "issn": issn_journal},
+        throttled=True,
     ).json()
+    return issues_id
 
 
 def ext_issue(code, **ext_params):
 
     issue = request.get(
-        "%s/issue" % config.AM_URL_API,
+        "%s/issue" % config.get("AM_URL_API"),
         params={"collection": config.get("SCIELO_COLLECTION"), "code": code},
+        throttled=True,
     ).json()
     obj_issue = Issue(issue)
+    return obj_issue
@@ -14,6 +14,7 @@ def ext_identifiers():
     journals_id = request.get(
         "%s/journal/identifiers/" % config.get("AM_URL_API"),
         params={"collection": config.get("SCIELO_COLLECTION")},
+        throttled=True,
     ).json()
     return journals_id
 
@@ -23,6 +24,7 @@ def ext_journal(issn):
         journal = request.get(
             "%s/journal" % config.get("AM_URL_API"),
             params={"collection": config.get("SCIELO_COLLECTION"), "issn": issn},
+            throttled=True,
         )
     except request.HTTPGetError:
         logger.error(
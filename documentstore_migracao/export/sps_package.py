@@ -13,6 +13,11 @@ from documentstore_migracao import exceptions
 
 logger = logging.getLogger(__name__)
 
+XPATH_BODIES = etree.XPath("//body")
+XPATH_LANGUAGES = etree.XPath(
+    '/article/@xml:lang | //sub-article[@article-type="translation"]/@xml:lang'
+)
+
 
 def parse_date(_date):
     def format(value):
@@ -362,9 +367,7 @@ class SPS_Package:
     def languages(self):
         """The language of the main document plus all translations.
         """
-        return self.xmltree.xpath(
-            '/article/@xml:lang | //sub-article[@article-type="translation"]/@xml:lang'
-        )
+        return XPATH_LANGUAGES(self.xmltree)
 
     @property
     def media_prefix(self):
@@ -374,13 +377,19 @@ class SPS_Package:
 
         return f"{self.issn}_{self.acron}/{self.scielo_id}"
 
-    def transform_body(self):
+    def transform_body(self, pipeline=None):
+        """Converte o conteúdo HTML dos `body` para SPS. Uma instância de
+        `HTML2SPSPipeline` pode ser informada em `pipeline` para ser
+        reaproveitada entre documentos"""
 
-        for index, body in enumerate(self.xmltree.xpath("//body"), start=1):
+        for index, body in enumerate(XPATH_BODIES(self.xmltree), start=1):
             logger.info("Processando body numero: %s" % index)
 
             txt_body = body.findtext("./p") or ""
-            convert = HTML2SPSPipeline(pid=self.publisher_id, index_body=index)
+            if pipeline is None:
+                convert = HTML2SPSPipeline(pid=self.publisher_id, index_body=index)
+            else:
+                convert = pipeline.reset(self.publisher_id, index)
             _, obj_html_body = convert.deploy(txt_body)
 
             # sobrecreve o html escapado anterior pelo novo xml tratado
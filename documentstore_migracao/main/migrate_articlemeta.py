@@ -1,6 +1,7 @@
 """  """
 import logging
 import argparse
+from datetime import datetime
 
 from .base import base_parser, minio_parser, mongodb_parser
 
@@ -9,15 +10,22 @@ from documentstore_migracao.processing import (
     conversion,
     validation,
     packing,
+    fused,
     inserting,
 )
 from documentstore_migracao.object_store import minio
+from documentstore_migracao.utils import request, pids, metrics
 from documentstore import adapters as ds_adapters
 
 
 logger = logging.getLogger(__name__)
 
 
+def since_date(value):
+    datetime.strptime(value, "%Y-%m-%d")
+    return value
+
+
 def migrate_articlemeta_parser(sargs):
     """ method to migrate articlemeta """
 
@@ -29,14 +37,126 @@ def migrate_articlemeta_parser(sargs):
     )
     subparsers = parser.add_subparsers(title="Commands", metavar="", dest="command")
 
+    # DESCOBERTA
+    discover_parser = subparsers.add_parser(
+        "discover",
+        help="Lista os PIDs dos documentos da coleção no AM, com suas datas de "
+        "processamento, para uso no comando `extract`",
+    )
+    discover_parser.add_argument(
+        "--output",
+        required=True,
+        help="Arquivo de saída, um PID por linha. Aceita arquivos compactados "
+        "com gzip (.gz) ou '-' para gravar na saída padrão",
+    )
+    discover_parser.add_argument(
+        "--since",
+        type=since_date,
+        metavar="AAAA-MM-DD",
+        help="Lista apenas os documentos processados a partir desta data",
+    )
+    discover_parser.add_argument(
+        "--issn", help="Lista apenas os documentos do periódico informado"
+    )
+    discover_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Número de páginas requisitadas ao AM simultaneamente, default: 1",
+    )
+
     # EXTRACAO
     extraction_parser = subparsers.add_parser(
         "extract", help="Extrai todos os artigos originários do formato HTML"
     )
     extraction_parser.add_argument(
         "file",
-        type=argparse.FileType("r"),
-        help="Arquivo com a lista de PIDs dos artigos a serem extraidos",
+        help="Arquivo com a lista de PIDs dos artigos a serem extraidos, "
+        "um por linha. Aceita arquivos compactados com gzip (.gz) ou '-' "
+        "para ler da entrada padrão",
+    )
+    extraction_parser.add_argument(
+        "--by-issn",
+        dest="by_issn",
+        action="store_true",
+        default=False,
+        help="Interpreta `file` como uma lista de ISSNs e extrai todos os "
+        "documentos não XML de cada periódico",
+    )
+    extraction_parser.add_argument(
+        "--shard",
+        type=pids.parse_shard,
+        metavar="i/n",
+        help="Extrai apenas a i-ésima de n partições, com 0 <= i < n, "
+        "e.g: --shard 0/4. Particiona a lista de PIDs ou, com --by-issn, "
+        "a lista de ISSNs",
+    )
+    extraction_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Número de requisições ao AM mantidas em andamento, default: 1",
+    )
+    extraction_parser.add_argument(
+        "--cache",
+        action="store_true",
+        default=False,
+        help="Mantém as respostas do AM em cache na pasta 'CACHE_PATH', "
+        "evitando novos downloads de documentos não alterados",
+    )
+    extraction_parser.add_argument(
+        "--packed",
+        action="store_true",
+        default=False,
+        help="Grava os XMLs em packs compactados na pasta 'SOURCE_PACK_PATH' "
+        "em vez de um arquivo por documento em 'SOURCE_PATH'",
+    )
+    extraction_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Extrai novamente os documentos já extraídos, registrados no "
+        "banco de estágios em 'CACHE_PATH'",
+    )
+    extraction_parser.add_argument(
+        "--metrics-interval",
+        dest="metrics_interval",
+        type=float,
+        default=60,
+        metavar="SECONDS",
+        help="Intervalo entre os resumos das métricas de requisições e de "
+        "gravação em disco; 0 emite apenas o resumo final, default: 60",
+    )
+    extraction_parser.add_argument(
+        "--metrics-output",
+        dest="metrics_output",
+        metavar="FILE",
+        help="Acrescenta os resumos das métricas, em JSON, ao arquivo "
+        "informado em vez de registrá-los no log",
+    )
+
+    # METADADOS
+    metadata_parser = subparsers.add_parser(
+        "metadata",
+        help="Extrai os metadados dos periódicos ou fascículos da coleção em "
+        "formato JSON Lines, compatível com `migrate_isis import`",
+    )
+    metadata_parser.add_argument(
+        "--type",
+        choices=["journal", "issue"],
+        required=True,
+        help="Tipo de metadado extraído",
+    )
+    metadata_parser.add_argument(
+        "--output", required=True, help="Arquivo de saída, e.g: journals.jsonl"
+    )
+    metadata_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Número de requisições ao AM mantidas em andamento, default: 1",
     )
 
     # CONVERCAO
@@ -49,6 +169,38 @@ def migrate_articlemeta_parser(sargs):
         metavar="",
         help="Converte apenas o arquivo XML imformado",
     )
+    import_parser.add_argument(
+        "--packed",
+        action="store_true",
+        default=False,
+        help="Converte os XMLs gravados em packs na pasta 'SOURCE_PACK_PATH'",
+    )
+    import_parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Número de processos de conversão, default: 1",
+    )
+    import_parser.add_argument(
+        "--profile-pipes",
+        dest="profile_pipes",
+        metavar="FILE",
+        help="Mede o tempo e os nós tratados por pipe da conversão em cada "
+        "documento e grava no arquivo informado o relatório agregado em JSON",
+    )
+    import_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Ignora os documentos que não mudaram, assim como o conversor, "
+        "desde a última conversão bem sucedida",
+    )
+    import_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Com '--incremental', converte todos os documentos, registrando "
+        "a conversão para as próximas execuções",
+    )
 
     # VALIDACAO
     validation_parser = subparsers.add_parser(
@@ -86,6 +238,40 @@ def migrate_articlemeta_parser(sargs):
         help="Gera o pacote `SPS` apenas para o documento XML imformado",
     )
 
+    # PROCESSAMENTO EM MEMORIA
+    process_parser = subparsers.add_parser(
+        "process",
+        help="Converte, valida e empacota os XMLs extraídos, sem gravar os "
+        "arquivos intermediários de `convert` e `validate`",
+    )
+    process_parser.add_argument(
+        "--file",
+        "-f",
+        dest="processFile",
+        metavar="",
+        help="Processa apenas o arquivo XML imformado",
+    )
+    process_parser.add_argument(
+        "--packed",
+        action="store_true",
+        default=False,
+        help="Processa os XMLs gravados em packs na pasta 'SOURCE_PACK_PATH'",
+    )
+    process_parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Número de processos, default: 1",
+    )
+    process_parser.add_argument(
+        "--keep-files",
+        dest="keep_files",
+        action="store_true",
+        help="Grava também os XMLs convertidos em 'CONVERSION_PATH' e os "
+        "válidos em 'VALID_XML_PATH'",
+    )
+
     # IMPORTACAO
     import_parser = subparsers.add_parser(
         "import",
@@ -95,20 +281,62 @@ def migrate_articlemeta_parser(sargs):
 
     ################################################################################################
     args = parser.parse_args(sargs)
+    if args.command == "convert" and args.force and not args.incremental:
+        parser.error("convert: o argumento --force exige --incremental")
 
     # CHANGE LOGGER
     level = getattr(logging, args.loglevel.upper())
     logger = logging.getLogger()
     logger.setLevel(level)
 
-    if args.command == "extract":
-        extracted.extract_all_data(args.file.readlines())
+    if args.command == "discover":
+        request.ensure_pool_size(args.concurrency)
+        extracted.discover_documents(
+            args.output, since=args.since, issn=args.issn, concurrency=args.concurrency
+        )
+
+    elif args.command == "extract":
+        request.ensure_pool_size(args.concurrency)
+        if args.cache:
+            request.enable_cache()
+        if args.by_issn:
+            extract, iter_lines = extracted.extract_all_data_by_issn, pids.iter_pids
+        else:
+            # as datas de processamento geradas por `discover` permitem
+            # extrair novamente os documentos atualizados no AM
+            extract, iter_lines = extracted.extract_all_data, pids.iter_pids_with_dates
+        reporter = metrics.Reporter(
+            metrics.registry, args.metrics_interval, args.metrics_output
+        )
+        with reporter, pids.open_pids_file(args.file) as pids_file:
+            extract(
+                iter_lines(pids_file, shard=args.shard),
+                concurrency=args.concurrency,
+                packed=args.packed,
+                force=args.force,
+            )
+
+    elif args.command == "metadata":
+        request.ensure_pool_size(args.concurrency)
+        extracted.extract_metadata(args.type, args.output, concurrency=args.concurrency)
 
     elif args.command == "convert":
         if args.convertFile:
             conversion.convert_article_xml(args.convertFile)
+        elif args.packed:
+            conversion.convert_article_ALLpacks(
+                jobs=args.jobs,
+                profile_path=args.profile_pipes,
+                incremental=args.incremental,
+                force=args.force,
+            )
         else:
-            conversion.convert_article_ALLxml()
+            conversion.convert_article_ALLxml(
+                jobs=args.jobs,
+                profile_path=args.profile_pipes,
+                incremental=args.incremental,
+                force=args.force,
+            )
 
     elif args.command == "validate":
         if args.validateFile:
@@ -124,6 +352,14 @@ def migrate_articlemeta_parser(sargs):
         else:
             packing.pack_article_ALLxml()
 
+    elif args.command == "process":
+        if args.processFile:
+            fused.process_article_xml(args.processFile, keep_files=args.keep_files)
+        elif args.packed:
+            fused.process_article_ALLpacks(jobs=args.jobs, keep_files=args.keep_files)
+        else:
+            fused.process_article_ALLxml(jobs=args.jobs, keep_files=args.keep_files)
+
     elif args.command == "import":
         mongo = ds_adapters.MongoDB(uri=args.uri, dbname=args.db)
         DB_Session = ds_adapters.Session.partial(mongo)
@@ -24,7 +24,8 @@ def migrate_isis_parser(sargs):
     import_parser.add_argument(
         "import_file",
         metavar="file",
-        help="JSON file path that contains mst extraction result, e.g: collection-title.json",
+        help="JSON file path that contains mst extraction result, e.g: collection-title.json. "
+        "JSON Lines files (.jsonl) produced by `ds_migracao metadata` are also accepted",
     )
     import_parser.add_argument(
         "--type",
@@ -4,7 +4,7 @@ import argparse
 
 from .base import base_parser, paths_parser
 
-from documentstore_migracao.tools import generation, constructor
+from documentstore_migracao.tools import generation, constructor, replay, benchmark
 from documentstore_migracao import config
 
 
@@ -52,6 +52,88 @@ def tools_parser(sargs):
         ],
     )
 
+    # BENCHMARK EXTRACTION
+    benchmark_parser = subparsers.add_parser(
+        "benchmark",
+        help="Mede a vazão da extração de documentos contra um servidor local "
+        "que reproduz as respostas do AM gravadas na pasta '--samples'",
+    )
+    benchmark_parser.add_argument(
+        "--samples",
+        required=True,
+        help="Pasta com as respostas gravadas: arquivos .xml para '/article' e "
+        "journal*.json ou issue*.json para '/journal' e '/issue'",
+    )
+    benchmark_parser.add_argument(
+        "--documents",
+        type=int,
+        default=1000,
+        help="Quantidade de documentos extraídos, default: 1000",
+    )
+    benchmark_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Número de requisições mantidas em andamento, default: 1",
+    )
+    benchmark_parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Latência, em segundos, de cada resposta, default: 0.05",
+    )
+    benchmark_parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="Variação máxima, em segundos, acrescida à latência, default: 0",
+    )
+    benchmark_parser.add_argument(
+        "--error-rate",
+        dest="error_rate",
+        type=float,
+        default=0.0,
+        help="Probabilidade de uma resposta ser um erro 503, default: 0",
+    )
+    benchmark_parser.add_argument(
+        "--seed", type=int, default=0, help="Semente dos atrasos e erros, default: 0"
+    )
+
+    # BENCHMARK CONVERSION
+    conversion_benchmark_parser = subparsers.add_parser(
+        "benchmark-conversion",
+        help="Mede o tempo e o pico de memória da conversão dos XMLs da pasta "
+        "'--samples' e de corpos HTML sintéticos, comparando com uma referência",
+    )
+    conversion_benchmark_parser.add_argument(
+        "--samples", required=True, help="Pasta com os XMLs do AM a converter"
+    )
+    conversion_benchmark_parser.add_argument(
+        "--scale",
+        type=int,
+        default=1000,
+        help="Quantidade de âncoras, linhas de tabela e <br> dos corpos "
+        "sintéticos, default: 1000",
+    )
+    conversion_benchmark_parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Execuções de cada caso, das quais se usa a mediana, default: 3",
+    )
+    conversion_benchmark_parser.add_argument(
+        "--baseline", help="Relatório JSON de referência para comparação"
+    )
+    conversion_benchmark_parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Aumento de tempo tolerado em relação à referência, default: 0.2",
+    )
+    conversion_benchmark_parser.add_argument(
+        "--output", help="Arquivo onde o relatório JSON será gravado"
+    )
+
     ################################################################################################
     args = parser.parse_args(sargs)
 
@@ -66,6 +148,38 @@ def tools_parser(sargs):
     elif args.command == "construction":
         constructor.article_ALL_constructor(args.source_path, args.desc_path)
 
+    elif args.command == "benchmark":
+        server = replay.create_server(
+            args.samples,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        )
+        server.start()
+        try:
+            report = benchmark.run_extraction_benchmark(
+                server, args.documents, concurrency=args.concurrency
+            )
+        finally:
+            server.stop()
+        print(benchmark.format_report(report))
+
+    elif args.command == "benchmark-conversion":
+        report = benchmark.run_conversion_benchmark(
+            args.samples, scale=args.scale, repeat=args.repeat
+        )
+        regressions = None
+        if args.baseline:
+            regressions = benchmark.compare_with_baseline(
+                report, benchmark.load_report(args.baseline), args.tolerance
+            )
+        if args.output:
+            benchmark.write_report(args.output, report)
+        print(benchmark.format_conversion_report(report, regressions))
+        if regressions:
+            return 1
+
     else:
         raise SystemExit(
             "Vc deve escolher algum parametro, ou '--help' ou '-h' para ajuda"
@@ -1,20 +1,95 @@
+import io
 import os
+import hashlib
 import logging
+import traceback
+import multiprocessing
+import pkg_resources
+from collections import deque, namedtuple
 
 from tqdm import tqdm
 from lxml import etree
-from typing import List
+from typing import Callable, Iterable, List, Tuple, Union
 from xylose.scielodocument import Journal, Issue
-from documentstore_migracao.utils import files, xml, string, xylose_converter
+from documentstore_migracao.utils import files, xml, string, xylose_converter, packs
+from documentstore_migracao.utils import body_sink, checkpoint, profiling
+from documentstore_migracao.utils import convert_html_body
+from documentstore_migracao.utils.convert_html_body import (
+    HTML2SPSPipeline,
+    TagDispatchPipe,
+)
+from documentstore_migracao.export import sps_package
 from documentstore_migracao.export.sps_package import SPS_Package
 from documentstore_migracao import config
 
 logger = logging.getLogger(__name__)
 
+ConversionResult = namedtuple("ConversionResult", "name error traceback profile output")
+ConversionResult.__new__.__defaults__ = (None, None)
+
+# documento convertido por `convert_article`, como árvore ou bytes
+ConvertedArticle = namedtuple("ConvertedArticle", "document languages")
+
+# pipeline reaproveitado pelas conversões do processo, criado por `init_worker`
+_pipeline = None
+_profiler = None
+
 
 def convert_article_xml(file_xml_path):
 
     obj_xmltree = xml.loadToXML(file_xml_path)
+    _, fname = os.path.split(file_xml_path)
+    fname, fext = fname.rsplit(".", 1)
+
+    return convert_article_xmltree(obj_xmltree, fname, fext)
+
+
+def convert_article_xmltree(obj_xmltree, fname, fext="xml"):
+    """Converte para SPS o XML de um documento já carregado, gravando o
+    resultado em `CONVERSION_PATH` com o nome `fname`. Retorna o path do
+    arquivo gravado"""
+
+    xmltree, languages = convert_article(obj_xmltree)
+
+    new_file_xml_path = os.path.join(
+        config.get("CONVERSION_PATH"), "%s.%s.%s" % (fname, "-".join(languages), fext)
+    )
+
+    xml.objXML2file(new_file_xml_path, xmltree, pretty=True)
+    return new_file_xml_path
+
+
+def convert_article(
+    source: Union[bytes, etree._ElementTree],
+    serialize: bool = False,
+    pretty: bool = True,
+    pipeline: HTML2SPSPipeline = None,
+) -> ConvertedArticle:
+    """Converte para SPS um documento informado como bytes ou como árvore
+    já carregada, que é alterada, sem acessar o sistema de arquivos.
+
+    Retorna o documento convertido e a lista de seus idiomas. Com
+    `serialize`, o documento é retornado como bytes, com o DOCTYPE
+    `DOC_TYPE_XML`. O `pipeline` informado é reaproveitado na conversão
+    dos `body`; por padrão é utilizado o do processo, criado por
+    `init_worker`"""
+
+    if isinstance(source, bytes):
+        source = xml.loadToXML(io.BytesIO(source))
+    elif etree.iselement(source):
+        source = source.getroottree()
+
+    xml_sps = convert_article_sps(source, pipeline)
+    if serialize:
+        return ConvertedArticle(
+            xml.objXML2bytes(xml_sps.xmltree, pretty=pretty), xml_sps.languages
+        )
+    return ConvertedArticle(xml_sps.xmltree, xml_sps.languages)
+
+
+def convert_article_sps(obj_xmltree, pipeline=None) -> SPS_Package:
+    """Converte para SPS, em memória, o XML de um documento já carregado"""
+
     obj_xml = obj_xmltree.getroot()
 
     obj_xml.set("specific-use", "sps-1.9")
@@ -22,37 +97,238 @@ def convert_article_xml(file_xml_path):
 
     xml_sps = SPS_Package(obj_xmltree)
     # CONVERTE O BODY DO AM PARA SPS
-    xml_sps.transform_body()
+    xml_sps.transform_body(pipeline=pipeline or _pipeline)
     # CONVERTE PUB-DATE PARA SPS 1.9
     xml_sps.transform_pubdate()
 
     # CONSTROI O SCIELO-id NO XML CONVERTIDO
     xml_sps.create_scielo_id()
+    return xml_sps
 
-    languages = "-".join(xml_sps.languages)
-    _, fname = os.path.split(file_xml_path)
-    fname, fext = fname.rsplit(".", 1)
 
-    new_file_xml_path = os.path.join(
-        config.get("CONVERSION_PATH"), "%s.%s.%s" % (fname, languages, fext)
+def init_worker(profile: bool = False):
+    """Cria o pipeline de conversão do processo uma única vez, medindo
+    o tempo de cada pipe quando `profile` é verdadeiro"""
+
+    global _pipeline, _profiler
+
+    _pipeline = HTML2SPSPipeline(pid=None)
+    _profiler = None
+    if profile:
+        _profiler = profiling.PipeProfiler()
+        _profiler.instrument(_pipeline)
+
+
+def convert_job(
+    job: Tuple[str, Union[str, bytes]],
+    convert_file: Callable = None,
+    convert_xmltree: Callable = None,
+) -> ConversionResult:
+    """Converte um documento informado como `(nome, path)` ou
+    `(nome, conteúdo)`, retornando o erro ocorrido em vez de propagá-lo
+    para que possa ser registrado por quem distribui as conversões.
+
+    `convert_file` e `convert_xmltree` substituem `convert_article_xml` e
+    `convert_article_xmltree`, permitindo que outras etapas aproveitem a
+    distribuição das conversões"""
+
+    name, source = job
+    if _profiler is not None:
+        _profiler.reset()
+    try:
+        if isinstance(source, bytes):
+            output = (convert_xmltree or convert_article_xmltree)(
+                xml.loadToXML(io.BytesIO(source)), name
+            )
+        else:
+            output = (convert_file or convert_article_xml)(source)
+    except Exception as ex:
+        return ConversionResult(name, repr(ex), traceback.format_exc())
+    return ConversionResult(
+        name, None, None, _profiler.samples if _profiler is not None else None, output
     )
 
-    xml.objXML2file(new_file_xml_path, xml_sps.xmltree, pretty=True)
 
+def converter_fingerprint() -> str:
+    """Identifica a versão do conversor pela versão do pacote, pela lista
+    de pipes de conversão e pelo código dos módulos que os implementam"""
+
+    try:
+        version = pkg_resources.get_distribution("documentstore-migracao").version
+    except pkg_resources.DistributionNotFound:
+        version = ""
+
+    names = []
+    pending = list(HTML2SPSPipeline(pid=None).pipes)
+    while pending:
+        pipe = pending.pop(0)
+        names.append(type(pipe).__qualname__)
+        if isinstance(pipe, TagDispatchPipe):
+            pending[:0] = pipe.pipes
+        elif isinstance(pipe, HTML2SPSPipeline.SanitizationPipe):
+            pending[:0] = pipe.convert.pipes
+
+    digest = hashlib.sha1(("%s %s" % (version, " ".join(names))).encode("utf-8"))
+    for module in (convert_html_body, sps_package):
+        with open(module.__file__, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def convert_all(
+    jobs: Iterable,
+    total: int = None,
+    processes: int = 1,
+    profile_path: str = None,
+    incremental: bool = False,
+    force: bool = False,
+    job: Callable = convert_job,
+) -> int:
+    """Converte os documentos de `jobs` com `processes` processos,
+    registrando os erros na ordem dos documentos, independente da ordem
+    em que as conversões terminam. Retorna a quantidade de erros.
+
+    Com `profile_path`, mede o tempo e os nós tratados por pipe em cada
+    documento convertido e grava o relatório agregado, em JSON, no arquivo
+    informado, registrando também a tabela no log.
+
+    Com `incremental`, registra o hash de cada documento convertido e a
+    versão do conversor, ignorando os documentos que não mudaram desde a
+    última conversão bem sucedida, exceto com `force`.
+
+    Cada documento é tratado por `job`, que recebe `(nome, path)` ou
+    `(nome, conteúdo)` e retorna um `ConversionResult`"""
+
+    errors = 0
+    skipped = 0
+    report = profiling.PipeProfileReport() if profile_path else None
+    # `(nome, hash)` dos documentos enviados para conversão, na ordem dos
+    # resultados
+    changed = deque()
 
-def convert_article_ALLxml():
+    def changed_jobs(jobs, stages, fingerprint):
+        nonlocal skipped
+
+        conversion_path = config.get("CONVERSION_PATH")
+        for name, source in jobs:
+            if isinstance(source, bytes):
+                content = source
+            else:
+                with open(source, "rb") as f:
+                    content = f.read()
+            digest = hashlib.sha1(content).hexdigest()
+
+            previous = None if force else stages.get(name)
+            if previous is not None:
+                # `value` registrado: "<hash> <fingerprint> <path convertido>"
+                previous_digest, previous_fingerprint, output = previous.split(" ", 2)
+                if (
+                    previous_digest == digest
+                    and previous_fingerprint == fingerprint
+                    and os.path.dirname(output) == conversion_path
+                    and os.path.exists(output)
+                ):
+                    skipped += 1
+                    continue
+
+            changed.append((name, "%s %s" % (digest, fingerprint)))
+            yield name, source
+
+    stages = None
+    if incremental:
+        stages = checkpoint.open_stage_store(__name__)
+        jobs = changed_jobs(jobs, stages, converter_fingerprint())
+    if processes > 1:
+        chunksize = max(1, min(64, (total or 0) // (processes * 4)))
+        pool = multiprocessing.Pool(
+            processes, initializer=init_worker, initargs=(report is not None,)
+        )
+        results = pool.imap(job, jobs, chunksize=chunksize)
+    else:
+        pool = None
+        init_worker(report is not None)
+        results = map(job, jobs)
+
+    completed = False
+    try:
+        for result in tqdm(results, total=total):
+            if result.error is not None:
+                errors += 1
+                logger.error(result.name)
+                logger.error(result.traceback.rstrip())
+            elif report is not None:
+                report.add(result.name, result.profile)
+
+            if stages is not None:
+                name, digest = changed.popleft()
+                if result.error is None:
+                    stages.register(name, "%s %s" % (digest, result.output))
+        completed = True
+    finally:
+        if stages is not None:
+            stages.close()
+        if pool is None:
+            body_sink.close_sink()
+        elif completed:
+            # encerra os processos normalmente para que gravem os `body`
+            # pendentes no sink de depuração
+            pool.close()
+            pool.join()
+        else:
+            pool.terminate()
+            pool.join()
+
+    logger.info("\t Total de %s erros de conversão", errors)
+    if incremental:
+        logger.info("\t Total de %s documentos sem alteração ignorados", skipped)
+    if report is not None:
+        report.write(profile_path)
+        logger.info(
+            "Perfil dos pipes de conversão:\n%s",
+            profiling.format_report(report.to_dict()),
+        )
+    return errors
+
+
+def convert_article_ALLxml(
+    jobs: int = 1,
+    profile_path: str = None,
+    incremental: bool = False,
+    force: bool = False,
+):
 
     logger.info("Iniciando Conversão do xmls")
     list_files_xmls = files.xml_files_list(config.get("SOURCE_PATH"))
-    for file_xml in tqdm(list_files_xmls):
+    convert_all(
+        (
+            (file_xml, os.path.join(config.get("SOURCE_PATH"), file_xml))
+            for file_xml in list_files_xmls
+        ),
+        total=len(list_files_xmls),
+        processes=jobs,
+        profile_path=profile_path,
+        incremental=incremental,
+        force=force,
+    )
+
 
-        try:
-            convert_article_xml(os.path.join(config.get("SOURCE_PATH"), file_xml))
+def convert_article_ALLpacks(
+    jobs: int = 1,
+    profile_path: str = None,
+    incremental: bool = False,
+    force: bool = False,
+):
+    """Converte os XMLs gravados em packs na pasta `SOURCE_PACK_PATH`,
+    lendo cada pack sequencialmente"""
 
-        except Exception as ex:
-            logger.error(file_xml)
-            logger.exception(ex)
-            # raise
+    logger.info("Iniciando Conversão dos packs")
+    convert_all(
+        packs.iter_documents(config.get("SOURCE_PACK_PATH")),
+        processes=jobs,
+        profile_path=profile_path,
+        incremental=incremental,
+        force=force,
+    )
 
 
 def conversion_journal_to_bundle(journal: dict) -> None:
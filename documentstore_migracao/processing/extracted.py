@@ -1,46 +1,284 @@
 import logging
 import os
-from typing import List
+import json
+import contextlib
+from datetime import date
+from typing import Iterable
 from tqdm import tqdm
-from documentstore_migracao.export import article
-from documentstore_migracao.utils import files
+from documentstore_migracao.export import article, journal, issue
+from documentstore_migracao.utils import (
+    files,
+    threads,
+    checkpoint,
+    packs,
+    request,
+    pids,
+    metrics,
+)
 from documentstore_migracao import config
+from documentstore_migracao.utils.extract_isis import create_output_dir
 
 
 logger = logging.getLogger(__name__)
 
 
-def extract_all_data(list_documents_pids: List[str]):
-    """Extrai documentos XML a partir de uma lista de PIDS
-    de entrada"""
+def extract_document(documents_pid: str, revalidate: bool = False) -> str:
+    """Coleta o XML de um documento no AM. Com `revalidate`, a resposta
+    guardada em cache é revalidada no AM mesmo que seja recente"""
+
+    logger.debug("\t coletando dados do Documento '%s'", documents_pid)
+    return article.ext_article_txt(documents_pid, revalidate=revalidate)
+
+
+def open_source_pack():
+    """Abre um novo pack em `SOURCE_PACK_PATH` para gravação"""
 
-    pids_to_extract, pids_extracteds, stage_path = files.fetch_stages_info(
-        list_documents_pids, __name__
+    return packs.PackWriter(
+        config.get("SOURCE_PACK_PATH"), int(config.get("SOURCE_PACK_MAX_SIZE"))
     )
 
+
+def extract_all_data(
+    list_documents_pids: Iterable[str],
+    concurrency: int = 1,
+    packed: bool = False,
+    force: bool = False,
+):
+    """Extrai documentos XML a partir de uma lista de PIDS
+    de entrada.
+
+    A lista é consumida sob demanda e pode ser um arquivo ou um gerador.
+    PIDs repetidos são descartados à medida que são lidos, consultando o
+    banco de estágios e as requisições em andamento, o que mantém o uso
+    de memória constante.
+
+    Os itens também podem ser pares `(PID, data de processamento)`, como
+    os de `pids.iter_pids_with_dates`. A data é registrada no banco de
+    estágios e os documentos processados novamente no AM desde a última
+    extração são extraídos outra vez.
+
+    `concurrency` define o número de requisições mantidas em andamento
+    ao mesmo tempo. Cada documento é gravado em `SOURCE_PATH` assim que
+    sua requisição é finalizada e registrado no banco de estágios, de
+    modo que documentos já extraídos sejam ignorados ao retomar a
+    extração. Com `packed` os documentos são gravados em packs na pasta
+    `SOURCE_PACK_PATH` em vez de um arquivo por documento.
+
+    Com `force`, os documentos já registrados no banco de estágios são
+    extraídos novamente, e o registro é atualizado. Nesse caso, só são
+    descartados os PIDs repetidos cujas requisições estão em andamento."""
+
     logger.info("Iniciando extração dos Documentos")
     count = 0
+    skipped = 0
+    in_flight = {}
+    updated = set()
 
-    try:
-        for documents_pid in tqdm(
-            iterable=pids_to_extract,
-            initial=len(pids_extracteds),
-            total=len(list_documents_pids),
-        ):
+    def pids_to_extract(stages):
+        nonlocal skipped
+
+        for item in list_documents_pids:
+            documents_pid, processing_date = (
+                item if isinstance(item, tuple) else (item, None)
+            )
             documents_pid = documents_pid.strip()
+            if documents_pid in in_flight:
+                skipped += 1
+                continue
+            if force:
+                updated.add(documents_pid)
+            elif processing_date:
+                registered = stages.get(documents_pid)
+                if registered == processing_date:
+                    skipped += 1
+                    continue
+                if registered is not None or documents_pid in stages:
+                    updated.add(documents_pid)
+            elif documents_pid in stages:
+                skipped += 1
+                continue
+            in_flight[documents_pid] = processing_date
+            yield documents_pid
+
+    def extract(documents_pid):
+        # a resposta em cache de um documento atualizado está desatualizada
+        return extract_document(documents_pid, revalidate=documents_pid in updated)
+
+    with contextlib.ExitStack() as stack:
+        stages = stack.enter_context(checkpoint.open_stage_store(__name__))
+        source_pack = stack.enter_context(open_source_pack()) if packed else None
+        try:
+            jobs = threads.bounded_map(extract, pids_to_extract(stages), concurrency)
+            for documents_pid, xml_article in tqdm(iterable=jobs):
+                if xml_article:
+                    count += 1
+
+                    with metrics.registry.timed("source.write"):
+                        if packed:
+                            source_pack.write(documents_pid, xml_article)
+                        else:
+                            file_path = os.path.join(
+                                config.get("SOURCE_PATH"), "%s.xml" % documents_pid
+                            )
+                            logger.debug("\t Salvando arquivo '%s'", file_path)
+                            files.write_file(file_path, xml_article)
+                    stages.register(documents_pid, in_flight[documents_pid])
+                in_flight.pop(documents_pid)
+                updated.discard(documents_pid)
+        except KeyboardInterrupt:
+            ...
+
+    metrics.registry.incr("extract.documents", count)
+    metrics.registry.incr("extract.skipped", skipped)
+    logger.info("\t Total de %s artigos, %s ignorados", count, skipped)
+    return count
+
+
+def extract_all_data_by_issn(
+    list_issns: Iterable[str],
+    concurrency: int = 1,
+    packed: bool = False,
+    force: bool = False,
+):
+    """Extrai os documentos não XML dos periódicos de uma lista de ISSNs.
+
+    Os PIDs são obtidos paginando a listagem de documentos de cada
+    periódico no AM, sem baixar o conteúdo dos documentos XML, e
+    coletados por `extract_all_data` à medida que as páginas chegam."""
+
+    def documents_pids():
+        for issn in list_issns:
+            issn = issn.strip()
+            logger.info("\t Listando documentos do periódico '%s'", issn)
+            yield from article.iter_notXML_codes(issn)
+
+    extract_all_data(
+        documents_pids(), concurrency=concurrency, packed=packed, force=force
+    )
+
+
+def extract_journal(issn: str) -> dict:
+    """Coleta os metadados de um periódico no AM"""
+
+    obj_journal = journal.ext_journal(issn)
+    if obj_journal is not None:
+        return obj_journal.data
+
+
+def extract_issue(code: str) -> dict:
+    """Coleta os metadados de um fascículo no AM"""
 
-            logger.debug("\t coletando dados do Documento '%s'", documents_pid)
-            xml_article = article.ext_article_txt(documents_pid)
-            if xml_article:
+    try:
+        return issue.ext_issue(code).data["issue"]
+    except (request.HTTPGetError, KeyError, ValueError) as exc:
+        logger.error("Erro coletando dados do fascículo %s: %s", code, exc)
+
+
+def journals_codes() -> Iterable[str]:
+    for identifier in journal.ext_identifiers().get("objects", []):
+        yield identifier["code"]
+
+
+def issues_codes(list_issns: Iterable[str], concurrency: int = 1) -> Iterable[str]:
+    """Lista os códigos dos fascículos dos periódicos de `list_issns`,
+    mantendo até `concurrency` listagens em andamento"""
+
+    listings = threads.bounded_map(issue.ext_identifiers, list_issns, concurrency)
+    for issn, identifiers in listings:
+        for identifier in (identifiers or {}).get("objects", []):
+            yield identifier["code"]
+
+
+def write_json_lines(output_path: str, records: Iterable) -> int:
+    """Grava `records` no arquivo JSON Lines `output_path` à medida que
+    são produzidos, ignorando os registros vazios"""
+
+    create_output_dir(output_path)
+    count = 0
+    with open(output_path, "w", encoding="utf-8") as output:
+        for record in records:
+            if record:
+                output.write(json.dumps(record) + "\n")
                 count += 1
+    return count
+
+
+def extract_metadata(metadata_type: str, output_path: str, concurrency: int = 1) -> int:
+    """Exporta os metadados dos periódicos (`journal`) ou dos fascículos
+    (`issue`) da coleção para um arquivo JSON Lines compatível com o
+    comando `migrate_isis import`.
+
+    Até `concurrency` requisições são mantidas em andamento e cada
+    registro é gravado assim que sua requisição é finalizada, sem manter
+    a coleção em memória."""
+
+    logger.info("Iniciando extração dos metadados de '%s'", metadata_type)
+    if metadata_type == "journal":
+        fetch, codes = extract_journal, journals_codes()
+    elif metadata_type == "issue":
+        fetch, codes = extract_issue, issues_codes(journals_codes(), concurrency)
+    else:
+        raise ValueError("Tipo de metadado desconhecido: %s" % metadata_type)
 
-                file_path = os.path.join(
-                    config.get("SOURCE_PATH"), "%s.xml" % documents_pid
-                )
-                logger.debug("\t Salvando arquivo '%s'", file_path)
-                files.write_file(file_path, xml_article)
-                files.register_latest_stage(stage_path, documents_pid)
-    except KeyboardInterrupt:
-        ...
+    jobs = threads.bounded_map(fetch, codes, concurrency)
+    count = write_json_lines(output_path, tqdm(data for _, data in jobs))
+
+    logger.info("\t Total de %s registros gravados em '%s'", count, output_path)
+    return count
+
+
+def iter_identifiers(
+    concurrency: int = 1, page_size: int = 1000, **filters
+) -> Iterable[dict]:
+    """Pagina a listagem de identificadores dos documentos do AM.
+
+    O total de documentos informado pela primeira página permite
+    requisitar as demais simultaneamente, mantendo até `concurrency`
+    páginas em andamento. Sem o total, as páginas são requisitadas em
+    sequência até a primeira incompleta."""
+
+    def fetch_page(offset):
+        return article.ext_identifiers_page(offset, limit=page_size, **filters)
+
+    page = fetch_page(0)
+    yield from page.get("objects", [])
+
+    total = (page.get("meta") or {}).get("total")
+    if total is not None:
+        offsets = range(page_size, total, page_size)
+        for _, page in threads.bounded_map(fetch_page, offsets, concurrency):
+            yield from page.get("objects", [])
+        return
+
+    offset = 0
+    while len(page.get("objects", [])) == page_size:
+        offset += page_size
+        page = fetch_page(offset)
+        yield from page.get("objects", [])
+
+
+def discover_documents(
+    output_path: str, since: str = None, issn: str = None, concurrency: int = 1
+) -> int:
+    """Grava em `output_path` os PIDs dos documentos da coleção, um por
+    linha, acompanhados da data de processamento no AM. O arquivo pode
+    ser informado diretamente ao comando `extract`.
+
+    Com `since` apenas os documentos processados a partir desta data
+    (AAAA-MM-DD) são listados, permitindo migrações incrementais. A data
+    final é fixada no início da listagem para que a paginação não seja
+    deslocada por documentos processados durante a execução."""
+
+    logger.info("Iniciando descoberta dos Documentos")
+    filters = {"issn": issn, "from": since, "until": date.today().isoformat()}
+
+    count = 0
+    with pids.open_pids_file(output_path, "w") as output:
+        identifiers = iter_identifiers(concurrency=concurrency, **filters)
+        for identifier in tqdm(identifiers):
+            line = "%s %s" % (identifier["code"], identifier.get("processing_date", ""))
+            output.write(line.rstrip() + "\n")
+            count += 1
 
-    logger.info("\t Total de %s artigos", count)
+    logger.info("\t Total de %s documentos descobertos", count)
+    return count
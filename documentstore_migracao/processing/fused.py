@@ -0,0 +1,107 @@
+""" module to convert, validate and pack the documents without intermediate files """
+import io
+import os
+import logging
+import functools
+
+from documentstore_migracao.utils import files, packs, xml
+from documentstore_migracao.processing import conversion, packing, validation
+from documentstore_migracao import config
+
+logger = logging.getLogger(__name__)
+
+
+def process_article_xmltree(obj_xmltree, fname, fext="xml", keep_files=False):
+    """Converte, valida e empacota um documento já carregado, mantendo-o em
+    memória entre as etapas. Retorna o path do XML gravado no pacote ou
+    `None` quando o documento convertido é inválido.
+
+    Os erros de validação são gravados em `XML_ERRORS_PATH`, como em
+    `validate`. Os XMLs convertidos e válidos só são gravados em
+    `CONVERSION_PATH` e `VALID_XML_PATH` com `keep_files`"""
+
+    xmltree, languages = conversion.convert_article(obj_xmltree)
+    file_xml = "%s.%s.%s" % (fname, "-".join(languages), fext)
+    xml.set_doctype(xmltree)
+
+    content = None
+    if keep_files:
+        content = xml.objXML2bytes(xmltree, pretty=True)
+        files.write_file_binary(
+            os.path.join(config.get("CONVERSION_PATH"), file_xml), content
+        )
+
+    errors = validation.validate_article_xml(xmltree, False, filename=file_xml)
+    if errors:
+        # valida o XML serializado para que as linhas dos erros correspondam
+        # às do XML gravado junto aos erros
+        content = content or xml.objXML2bytes(xmltree, pretty=True)
+        errors = validation.validate_article_xml(
+            io.BytesIO(content), False, filename=file_xml
+        )
+
+    errors_path = config.get("XML_ERRORS_PATH")
+    if errors_path:
+        err_file = os.path.join(errors_path, "%s.err" % fname)
+        if os.path.isfile(err_file):
+            os.unlink(err_file)
+        if errors:
+            validation.write_error_file(errors, err_file, content.decode("utf-8"))
+
+    if errors:
+        logger.error("%s possui %s erros de validação", file_xml, len(errors))
+        return None
+
+    if keep_files and config.get("VALID_XML_PATH"):
+        files.write_file_binary(
+            os.path.join(config.get("VALID_XML_PATH"), file_xml), content
+        )
+
+    return packing.pack_article_xmltree(xmltree, fname, file_xml)
+
+
+def process_article_xml(file_xml_path, keep_files=False):
+
+    obj_xmltree = xml.loadToXML(file_xml_path)
+    _, fname = os.path.split(file_xml_path)
+    fname, fext = fname.rsplit(".", 1)
+
+    return process_article_xmltree(obj_xmltree, fname, fext, keep_files)
+
+
+def process_job(job, keep_files=False) -> conversion.ConversionResult:
+    return conversion.convert_job(
+        job,
+        convert_file=functools.partial(process_article_xml, keep_files=keep_files),
+        convert_xmltree=functools.partial(
+            process_article_xmltree, keep_files=keep_files
+        ),
+    )
+
+
+def process_article_ALLxml(jobs: int = 1, keep_files: bool = False):
+    """Converte, valida e empacota os XMLs da pasta `SOURCE_PATH`"""
+
+    logger.info("Iniciando o processamento dos xmls")
+    list_files_xmls = files.xml_files_list(config.get("SOURCE_PATH"))
+    return conversion.convert_all(
+        (
+            (file_xml, os.path.join(config.get("SOURCE_PATH"), file_xml))
+            for file_xml in list_files_xmls
+        ),
+        total=len(list_files_xmls),
+        processes=jobs,
+        job=functools.partial(process_job, keep_files=keep_files),
+    )
+
+
+def process_article_ALLpacks(jobs: int = 1, keep_files: bool = False):
+    """Converte, valida e empacota os XMLs gravados em packs na pasta
+    `SOURCE_PACK_PATH`"""
+
+    logger.info("Iniciando o processamento dos packs")
+    return conversion.convert_all(
+        packs.iter_documents(config.get("SOURCE_PACK_PATH")),
+        processes=jobs,
+        job=functools.partial(process_job, keep_files=keep_files),
+    )
@@ -18,6 +18,14 @@ def pack_article_xml(file_xml_path):
 
     obj_xml = xml.file2objXML(file_xml_path)
 
+    return pack_article_xmltree(obj_xml, original_filename, file_xml_path)
+
+
+def pack_article_xmltree(obj_xml, original_filename, file_xml_path=None):
+    """Empacota um XML já carregado, chamado `original_filename`, baixando
+    seus ativos digitais. Retorna o path do XML gravado no pacote"""
+
+    file_xml_path = file_xml_path or original_filename
     sps_package = SPS_Package(obj_xml, original_filename)
 
     SPS_PKG_PATH = config.get("SPS_PKG_PATH")
@@ -35,9 +43,9 @@ def pack_article_xml(file_xml_path):
         asset_replacements, pkg_path, bad_pkg_path, sps_package.package_name
     )
 
-    xml.objXML2file(
-        os.path.join(package_path, "%s.xml" % (sps_package.package_name)), obj_xml
-    )
+    package_xml_path = os.path.join(package_path, "%s.xml" % (sps_package.package_name))
+    xml.objXML2file(package_xml_path, obj_xml)
+    return package_xml_path
 
 
 def pack_article_ALLxml():
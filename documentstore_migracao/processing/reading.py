@@ -1,6 +1,6 @@
 import logging
 import json
-from typing import List
+from typing import Iterator, List
 
 
 from documentstore_migracao.utils import files
@@ -10,6 +10,19 @@ logger = logging.getLogger(__name__)
 
 def read_json_file(file_path: str) -> List[dict]:
     """Ler um arquivo JSON e retorna o resultado
-    em formato de estruturas Python"""
+    em formato de estruturas Python. Arquivos com extensão `.jsonl`
+    são lidos como JSON Lines, retornando a lista de seus registros"""
 
+    if file_path.endswith(".jsonl"):
+        return list(read_json_lines(file_path))
     return json.loads(files.read_file(file_path))
+
+
+def read_json_lines(file_path: str) -> Iterator[dict]:
+    """Itera pelos registros de um arquivo JSON Lines"""
+
+    logger.debug("Lendo arquivo: %s", file_path)
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
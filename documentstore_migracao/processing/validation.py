@@ -10,20 +10,41 @@ from lxml import etree
 
 logger = logging.getLogger(__name__)
 
+# DTDs carregados pelo catálogo, por PUBLIC-ID
+_dtds = {}
 
-def validate_article_xml(file_xml_path, print_error=True):
 
+def get_dtd(public_id: str) -> etree.DTD:
+    """Retorna o DTD de um PUBLIC-ID, carregado pelo catálogo uma única vez"""
+
+    dtd = _dtds.get(public_id)
+    if dtd is None:
+        dtd = _dtds[public_id] = etree.DTD(external_id=public_id.encode("utf-8"))
+    return dtd
+
+
+def validate_article_xml(file_xml_path, print_error=True, filename=None):
+    """Valida um XML contra o DTD declarado em seu DOCTYPE. `file_xml_path`
+    também pode ser um documento já carregado, identificado nos erros
+    por `filename`"""
+
+    filename = filename or file_xml_path
     result = {}
-    logger.debug(file_xml_path)
+    logger.debug(filename)
     try:
-        xmlvalidator = XMLValidator.parse(file_xml_path)
+        if isinstance(file_xml_path, etree._ElementTree):
+            xmlvalidator = XMLValidator.parse(
+                file_xml_path, dtd=get_dtd(file_xml_path.docinfo.public_id)
+            )
+        else:
+            xmlvalidator = XMLValidator.parse(file_xml_path)
         is_valid, errors = xmlvalidator.validate()
     except (exceptions.XMLSPSVersionError, etree.LxmlError) as e:
         result[str(e)] = {
             "count": 1,
             "lineno": [1],
             "message": [str(e)],
-            "filename": {file_xml_path},
+            "filename": {filename},
         }
         return result
 
@@ -37,7 +58,7 @@ def validate_article_xml(file_xml_path, print_error=True):
                 "count": 1,
                 "lineno": [error.line],
                 "message": [error.message],
-                "filename": {file_xml_path},
+                "filename": {filename},
             }
             dicts.merge(result, message, data)
 
@@ -98,6 +119,13 @@ def manage_error_file(errors, err_file, converted_file):
         except:
             pass
 
+    if errors:
+        write_error_file(errors, err_file, files.read_file(converted_file))
+
+
+def write_error_file(errors, err_file, content):
+    """Grava em `err_file` o XML `content` seguido dos erros de validação"""
+
     if errors:
         msg = []
         for err, data in errors.items():
@@ -109,7 +137,4 @@ def manage_error_file(errors, err_file, converted_file):
                 ]
             )
 
-        files.write_file(
-            err_file,
-            "%s %s\n%s" % (files.read_file(converted_file), "=" * 80, "\n".join(msg)),
-        )
+        files.write_file(err_file, "%s %s\n%s" % (content, "=" * 80, "\n".join(msg)))
@@ -0,0 +1,304 @@
+""" module to measure the extraction and conversion throughput """
+import os
+import json
+import math
+import time
+import logging
+import resource
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+from statistics import median
+from typing import Callable, Dict, List
+
+from documentstore_migracao.processing import conversion, extracted
+from documentstore_migracao.tools.replay import ReplayServer
+from documentstore_migracao.utils import files, request, xml
+from documentstore_migracao.utils.convert_html_body import HTML2SPSPipeline
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Calcula o percentil `pct` de `values` pelo método do posto mais
+    próximo"""
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def benchmark_pids(documents: int) -> List[str]:
+    return ["S0036-36341997%09d" % i for i in range(documents)]
+
+
+@contextmanager
+def _environ(**kwargs):
+    orig = {key: os.environ.get(key) for key in kwargs}
+    os.environ.update(kwargs)
+    try:
+        yield
+    finally:
+        for key, value in orig.items():
+            if value is None:
+                del os.environ[key]
+            else:
+                os.environ[key] = value
+
+
+def run_extraction_benchmark(
+    server: ReplayServer, documents: int, concurrency: int = 1
+) -> dict:
+    """Executa `extract_all_data` para `documents` PIDs sintéticos contra
+    o servidor `server`, gravando os XMLs em uma pasta temporária, e
+    retorna as métricas de vazão, latência e novas tentativas"""
+
+    latencies = []
+
+    def record_latency(response, *args, **kwargs):
+        latencies.append(response.elapsed.total_seconds())
+
+    request.ensure_pool_size(concurrency)
+    # as requisições ao AM são feitas pela sessão controlada por `Throttle`
+    session = request.get_session(throttled=True)
+    session.hooks["response"].append(record_latency)
+    requests_before = sum(server.requests.values())
+    retries_before = server.retries
+    errors_before = server.errors
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir, _environ(
+            AM_URL_API="%s/api/v1" % server.url, SOURCE_PATH=tmpdir, CACHE_PATH=tmpdir
+        ):
+            started_at = time.perf_counter()
+            count = extracted.extract_all_data(
+                benchmark_pids(documents), concurrency=concurrency
+            )
+            elapsed = time.perf_counter() - started_at
+    finally:
+        session.hooks["response"].remove(record_latency)
+
+    return {
+        "documents": documents,
+        "extracted": count,
+        "concurrency": concurrency,
+        "elapsed": elapsed,
+        "docs_per_sec": count / elapsed if elapsed else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p99": percentile(latencies, 99),
+        "requests": sum(server.requests.values()) - requests_before,
+        "retries": server.retries - retries_before,
+        "errors": server.errors - errors_before,
+    }
+
+
+def format_report(report: dict) -> str:
+    return "\n".join(
+        [
+            "Documentos extraídos: %(extracted)d de %(documents)d" % report,
+            "Concorrência: %(concurrency)d" % report,
+            "Tempo total: %(elapsed).2fs" % report,
+            "Vazão: %(docs_per_sec).2f docs/s" % report,
+            "Latência p50: %.1fms" % (report["latency_p50"] * 1000),
+            "Latência p99: %.1fms" % (report["latency_p99"] * 1000),
+            "Requisições: %(requests)d" % report,
+            "Novas tentativas: %(retries)d" % report,
+            "Erros injetados: %(errors)d" % report,
+        ]
+    )
+
+
+# o parser de HTML limita a profundidade da árvore a 255 níveis
+NESTING_DEPTH = 200
+BENCHMARK_PID = "S0000-00002019000100001"
+
+
+def synthetic_bodies(scale: int = 1000) -> Dict[str, str]:
+    """Gera corpos HTML que exercitam os piores casos da conversão, com
+    `scale` âncoras e notas, elementos aninhados, linhas de tabela e `<br>`"""
+
+    depth = min(scale, NESTING_DEPTH)
+    nested = (
+        "<div><ul><li><p><b>" * (depth // 5)
+        + "texto"
+        + "</b></p></li></ul></div>" * (depth // 5)
+    )
+    return {
+        "synthetic-anchors": "".join(
+            '<p>Texto <a href="#fn%d">%d</a></p>' % (i, i) for i in range(scale)
+        )
+        + "".join('<p><a name="fn%d"></a>Nota %d</p>' % (i, i) for i in range(scale)),
+        "synthetic-nesting": nested * max(1, scale // depth),
+        "synthetic-table": '<table border="1">'
+        + "".join(
+            "<tr>%s</tr>" % "".join("<td><b>%d</b> %d</td>" % (r, c) for c in range(10))
+            for r in range(scale)
+        )
+        + "</table>",
+        "synthetic-br": "<p>%s</p>"
+        % "".join("linha %d<br/>" % i for i in range(scale)),
+    }
+
+
+def _measure(func: Callable, repeat: int) -> dict:
+    """Executa `func` `repeat` vezes, retornando a mediana do tempo, em
+    milissegundos, e o pico de memória alocada pelo Python durante uma
+    execução adicional, em KiB. O pico não inclui a memória alocada pela
+    libxml2 para as árvores do lxml"""
+
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started_at) * 1000)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ms": median(timings), "peak_kb": peak / 1024}
+
+
+def run_conversion_benchmark(
+    samples_path: str, scale: int = 1000, repeat: int = 3
+) -> dict:
+    """Mede a conversão dos XMLs de `samples_path` com `convert_article_xml`
+    e de seus `body`, além dos corpos de `synthetic_bodies`, com
+    `HTML2SPSPipeline.deploy`. Retorna o tempo e o pico de memória de cada
+    caso, a vazão de cada tipo de conversão e o pico de memória residente
+    do processo"""
+
+    pipeline = HTML2SPSPipeline(pid=BENCHMARK_PID)
+    conversion.init_worker()
+
+    def deploy(body):
+        return lambda: pipeline.reset(BENCHMARK_PID, 1).deploy(body)
+
+    cases = []
+    errors = []
+    with tempfile.TemporaryDirectory() as tmpdir, _environ(CONVERSION_PATH=tmpdir):
+        for name in sorted(files.xml_files_list(samples_path)):
+            path = os.path.join(samples_path, name)
+            try:
+                bodies = [
+                    body.findtext("./p") or ""
+                    for body in xml.loadToXML(path).iterfind(".//body")
+                ]
+                cases.append(
+                    dict(
+                        _measure(lambda: conversion.convert_article_xml(path), repeat),
+                        document=name,
+                        kind="convert",
+                    )
+                )
+            except Exception as exc:
+                logger.info("Documento %s ignorado: %r", name, exc)
+                errors.append(name)
+                continue
+
+            for index, body in enumerate(bodies, start=1):
+                cases.append(
+                    dict(
+                        _measure(deploy(body), repeat),
+                        document="%s#body%d" % (name, index),
+                        kind="deploy",
+                    )
+                )
+
+        for name, body in synthetic_bodies(scale).items():
+            cases.append(
+                dict(_measure(deploy(body), repeat), document=name, kind="synthetic")
+            )
+
+    throughput = {}
+    for kind in ("convert", "deploy", "synthetic"):
+        timings = [case["ms"] for case in cases if case["kind"] == kind]
+        if timings:
+            throughput[kind] = {
+                "documents": len(timings),
+                "docs_per_sec": len(timings) / (sum(timings) / 1000),
+                "latency_p50": percentile(timings, 50),
+                "latency_p99": percentile(timings, 99),
+            }
+
+    return {
+        "scale": scale,
+        "repeat": repeat,
+        "cases": cases,
+        "errors": errors,
+        "throughput": throughput,
+        # em KiB no Linux
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def compare_with_baseline(
+    report: dict, baseline: dict, tolerance: float = 0.2
+) -> List[dict]:
+    """Retorna os casos de `report` mais lentos que os de mesmo nome em
+    `baseline` por mais de `tolerance` (proporção do tempo de referência)"""
+
+    reference = {case["document"]: case["ms"] for case in baseline["cases"]}
+    regressions = []
+    for case in report["cases"]:
+        baseline_ms = reference.get(case["document"])
+        if baseline_ms is not None and case["ms"] > baseline_ms * (1 + tolerance):
+            regressions.append(
+                {
+                    "document": case["document"],
+                    "ms": case["ms"],
+                    "baseline_ms": baseline_ms,
+                    "ratio": case["ms"] / baseline_ms if baseline_ms else math.inf,
+                }
+            )
+    return regressions
+
+
+def load_report(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_report(path: str, report: dict) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def format_conversion_report(report: dict, regressions: List[dict] = None) -> str:
+    lines = [
+        "%-50s %-10s %12s %12s" % ("Documento", "Tipo", "Tempo (ms)", "Pico (KiB)")
+    ]
+    for case in report["cases"]:
+        lines.append("%(document)-50s %(kind)-10s %(ms)12.2f %(peak_kb)12.1f" % case)
+
+    lines.append("")
+    for kind, throughput in report["throughput"].items():
+        lines.append(
+            "%s: %d documentos, %.2f docs/s, p50 %.2fms, p99 %.2fms"
+            % (
+                kind,
+                throughput["documents"],
+                throughput["docs_per_sec"],
+                throughput["latency_p50"],
+                throughput["latency_p99"],
+            )
+        )
+    lines.append("Pico de memória residente: %(max_rss_kb)d KiB" % report)
+    if report["errors"]:
+        lines.append("Documentos ignorados: %s" % ", ".join(report["errors"]))
+
+    if regressions is not None:
+        lines.append("")
+        if regressions:
+            lines.append("Regressões em relação à referência:")
+            lines.extend(
+                "%(document)s: %(ms).2fms (referência %(baseline_ms).2fms, "
+                "%(ratio).2fx)" % regression
+                for regression in regressions
+            )
+        else:
+            lines.append("Nenhuma regressão em relação à referência")
+    return "\n".join(lines)
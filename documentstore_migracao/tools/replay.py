@@ -0,0 +1,159 @@
+""" module to replay recorded ArticleMeta responses from a local http server """
+import os
+import time
+import random
+import logging
+import threading
+from collections import Counter
+from socketserver import ThreadingMixIn
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qsl
+
+from documentstore_migracao.utils import files
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_KEYS = {"article": "code", "journal": "issn", "issue": "code"}
+
+
+def load_samples(samples_path: str) -> dict:
+    """Carrega as respostas gravadas em `samples_path`: os arquivos `.xml`
+    são servidos em `/article`, e os arquivos `journal*.json` e
+    `issue*.json` em `/journal` e `/issue`, indexados pelo nome do
+    arquivo sem extensão"""
+
+    records = {endpoint: {} for endpoint in ENDPOINT_KEYS}
+    for filename in sorted(files.list_files(samples_path)):
+        name, ext = os.path.splitext(filename)
+        file_path = os.path.join(samples_path, filename)
+        if ext == ".xml":
+            records["article"][name] = (
+                "text/xml; charset=utf-8",
+                files.read_file(file_path).encode("utf-8"),
+            )
+        elif ext == ".json":
+            for endpoint in ("journal", "issue"):
+                if name.startswith(endpoint):
+                    records[endpoint][name] = (
+                        "application/json; charset=utf-8",
+                        files.read_file(file_path).encode("utf-8"),
+                    )
+    return records
+
+
+class ReplayServer(ThreadingMixIn, HTTPServer):
+    """Servidor HTTP que substitui o AM em testes de desempenho.
+
+    As respostas de cada endpoint são buscadas pelo identificador da
+    requisição (`code` ou `issn`) e, quando ausentes, escolhidas de forma
+    determinística entre as gravadas, o que permite servir quaisquer PIDs.
+    Cada resposta aguarda `latency` segundos acrescidos de até `jitter`
+    segundos, e com probabilidade `error_rate` é substituída por um erro
+    `error_status`. A sequência de atrasos e erros é reproduzível por
+    meio de `seed`."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        address,
+        records: dict,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        seed: int = None,
+    ):
+        super().__init__(address, ReplayRequestHandler)
+        self.records = records
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = Counter()
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return "http://%s:%s" % (host, port)
+
+    @property
+    def retries(self) -> int:
+        """Quantidade de requisições repetidas pelos clientes"""
+
+        with self._lock:
+            return sum(self.requests.values()) - len(self.requests)
+
+    def draw(self, request_key) -> tuple:
+        """Registra uma requisição e sorteia seu atraso e se resultará
+        em erro"""
+
+        with self._lock:
+            self.requests[request_key] += 1
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        return delay, failed
+
+    def find(self, endpoint: str, identifier: str):
+        records = self.records.get(endpoint) or {}
+        if identifier in records:
+            return records[identifier]
+        if not records or not identifier:
+            return None
+        names = sorted(records)
+        return records[names[sum(identifier.encode("utf-8")) % len(names)]]
+
+    def start(self) -> threading.Thread:
+        """Inicia o servidor em uma thread"""
+
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+        params = dict(parse_qsl(url.query))
+
+        delay, failed = self.server.draw((url.path, url.query))
+        time.sleep(delay)
+
+        if endpoint not in ENDPOINT_KEYS:
+            return self.reply(404, "text/plain", b"Not Found")
+        if failed:
+            return self.reply(self.server.error_status, "text/plain", b"Injected error")
+
+        record = self.server.find(endpoint, params.get(ENDPOINT_KEYS[endpoint], ""))
+        if record is None:
+            return self.reply(404, "text/plain", b"Not Found")
+        self.reply(200, *record)
+
+    def reply(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def create_server(
+    samples_path: str, host: str = "127.0.0.1", port: int = 0, **kwargs
+) -> ReplayServer:
+    return ReplayServer((host, port), load_samples(samples_path), **kwargs)
@@ -0,0 +1,79 @@
+""" module to save the raw html bodies received by the conversion """
+import os
+import queue
+import logging
+import threading
+from multiprocessing import util
+from typing import Optional
+
+from documentstore_migracao import config
+from documentstore_migracao.utils import packs
+
+logger = logging.getLogger(__name__)
+
+_sink = None
+_sink_pid = None
+_sink_lock = threading.Lock()
+
+
+class RawBodySink:
+    """Grava em packs da pasta `path` os `body` recebidos pela conversão,
+    para depuração. A compactação e a escrita ocorrem em uma thread
+    própria; `put` só bloqueia quando há `queue_size` documentos
+    aguardando gravação"""
+
+    def __init__(self, path: str, max_size: int, queue_size: int = 1000):
+        self._writer = packs.PackWriter(path, max_size)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, name: str, content: str) -> None:
+        self._queue.put((name, content))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._writer.write(*item)
+            except Exception as exc:
+                logger.error("Não foi possível gravar o body '%s': %s", item[0], exc)
+
+    def close(self) -> None:
+        """Aguarda a gravação dos documentos pendentes e fecha o pack"""
+
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._writer.close()
+
+
+def get_sink() -> Optional[RawBodySink]:
+    """Retorna o sink do processo, criado na primeira chamada, quando a
+    configuração `RAW_BODY_SINK_PATH` está definida. Cada processo grava
+    em seus próprios packs, fechados ao término do processo"""
+
+    global _sink, _sink_pid
+
+    path = config.get("RAW_BODY_SINK_PATH")
+    if not path:
+        return None
+
+    with _sink_lock:
+        # a thread de gravação não sobrevive ao fork dos processos de conversão
+        if _sink is None or _sink_pid != os.getpid():
+            _sink = RawBodySink(path, int(config.get("SOURCE_PACK_MAX_SIZE")))
+            _sink_pid = os.getpid()
+            util.Finalize(_sink, _sink.close, exitpriority=10)
+        return _sink
+
+
+def close_sink() -> None:
+    global _sink
+
+    with _sink_lock:
+        if _sink is not None and _sink_pid == os.getpid():
+            _sink.close()
+        _sink = None
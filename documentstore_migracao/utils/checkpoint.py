@@ -0,0 +1,117 @@
+""" module to checkpoint of already processed stages """
+import os
+import logging
+import sqlite3
+import threading
+from typing import Optional
+
+from documentstore_migracao import config
+
+logger = logging.getLogger(__name__)
+
+
+class StageStore:
+    """Registro indexado dos `estágios` já realizados por uma função,
+    persistido em um banco SQLite em modo WAL.
+
+    Os registros são acumulados em memória e gravados em lotes de
+    `batch_size` itens, o que torna a gravação barata mesmo para milhões
+    de estágios. A consulta `stage_id in store` é respondida pelo índice
+    da chave primária, sem carregar os registros em memória. O modo WAL
+    permite leitores e escritores simultâneos, inclusive de processos
+    distintos.
+
+    Cada estágio pode guardar um `value`, como o hash do conteúdo que o
+    originou, consultado por `get`."""
+
+    def __init__(self, path: str, batch_size: int = 1000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.batch_size = batch_size
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS stages "
+            "(stage_id TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID"
+        )
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(stages)")]
+        if "value" not in columns:
+            self._conn.execute("ALTER TABLE stages ADD COLUMN value TEXT")
+
+    def __contains__(self, stage_id: str) -> bool:
+        with self._lock:
+            if stage_id in self._pending:
+                return True
+            cursor = self._conn.execute(
+                "SELECT 1 FROM stages WHERE stage_id = ?", (stage_id,)
+            )
+            return cursor.fetchone() is not None
+
+    def get(self, stage_id: str) -> Optional[str]:
+        """Retorna o `value` registrado para um `stage_id`"""
+
+        with self._lock:
+            if stage_id in self._pending:
+                return self._pending[stage_id]
+            row = self._conn.execute(
+                "SELECT value FROM stages WHERE stage_id = ?", (stage_id,)
+            ).fetchone()
+            return row[0] if row is not None else None
+
+    def __len__(self) -> int:
+        self.commit()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM stages").fetchone()[0]
+
+    def register(self, stage_id: str, value: str = None) -> None:
+        """Marca um `stage_id` como realizado, substituindo o `value`
+        registrado anteriormente"""
+
+        with self._lock:
+            self._pending[stage_id] = value
+            if len(self._pending) < self.batch_size:
+                return
+        self.commit()
+
+    def commit(self) -> None:
+        """Grava em uma única transação os estágios pendentes"""
+
+        with self._lock:
+            if not self._pending:
+                return
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO stages (stage_id, value) VALUES (?, ?)",
+                    self._pending.items(),
+                )
+            logger.debug("Gravados %d estágios em '%s'", len(self._pending), self.path)
+            self._pending = {}
+
+    def close(self) -> None:
+        self.commit()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def stage_store_path(func_name: str) -> str:
+    """Retorna o path do banco de estágios de uma função"""
+
+    return os.path.join(config.get("CACHE_PATH"), "%s.db" % func_name)
+
+
+def open_stage_store(func_name: str, **kwargs) -> StageStore:
+    return StageStore(stage_store_path(func_name), **kwargs)
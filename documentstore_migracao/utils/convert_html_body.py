@@ -2,16 +2,25 @@ import logging
 import plumber
 import html
 import re
-import os
 from lxml import etree
 from copy import deepcopy
-from documentstore_migracao.utils import files
+from documentstore_migracao.utils import files, body_sink
 from documentstore_migracao.utils import xml as utils_xml
 from documentstore_migracao import config
 
 
 logger = logging.getLogger(__name__)
 
+XPATH_DESCENDANTS = etree.XPath(".//*")
+XPATH_COMMENTS = etree.XPath("//comment()")
+XPATH_P_WITH_P = etree.XPath(".//p[p]")
+XPATH_BODIES = etree.XPath(".//body")
+XPATH_LI_OR_SELF = etree.XPath("descendant-or-self::li")
+XPATH_NESTED_EXT_LINK_GRAPHIC = etree.XPath("descendant::ext-link[graphic]")
+XPATH_NESTED_BODY_TABLE = etree.XPath("descendant::body[table]")
+XPATH_NESTED_P_TABLE = etree.XPath("descendant::p[table]")
+XPATH_NESTED_FN = etree.XPath("descendant::fn")
+
 
 def _remove_element_or_comment(node):
     parent = node.getparent()
@@ -54,27 +63,37 @@ def _process(xml, tag, func):
 
 def wrap_node(node, elem_wrap="p"):
 
-    _node = deepcopy(node)
     p = etree.Element(elem_wrap)
-    p.append(_node)
-    node.getparent().replace(node, p)
+    node.addprevious(p)
+    p.append(node)
 
     return p
 
 
+def copy_if_contains(node, xpath):
+    """Substitui `node` por uma cópia quando ele contém nós de `xpath`.
+    Os nós internos já coletados por `_process` ficam fora do documento e
+    não são tratados, como quando os nós eram sempre copiados antes de
+    serem movidos"""
+
+    if xpath(node):
+        _node = deepcopy(node)
+        node.getparent().replace(node, _node)
+        return _node
+    return node
+
+
 def wrap_content_node(node, elem_wrap="p"):
 
-    _node = deepcopy(node)
     p = etree.Element(elem_wrap)
-    if _node.text:
-        p.text = _node.text
-    if _node.tail:
-        p.tail = _node.tail
+    if node.text:
+        p.text = node.text
+    if node.tail:
+        p.tail = node.tail
 
-    _node.text = None
-    _node.tail = None
-    _node.append(p)
-    node.getparent().replace(node, _node)
+    node.text = None
+    node.tail = None
+    node.append(p)
 
 
 def gera_id(_string):
@@ -86,18 +105,120 @@ def gera_id(_string):
         return rid
 
 
+class NodeIndex(object):
+    """Índice dos nós de um documento pelo valor de seus atributos.
+
+    O índice de cada atributo é construído na primeira consulta, com uma
+    única varredura do documento, e os nós encontrados são conferidos a
+    cada consulta, de modo que nós renomeados, removidos ou cujo atributo
+    foi alterado são ignorados. Quando algum nó indexado foi removido do
+    documento, o índice do atributo é reconstruído para incluir eventuais
+    cópias. Quem atribui um atributo indexado deve chamar `invalidate`."""
+
+    def __init__(self, root):
+        self.root = root
+        self._attrs = {}
+
+    def _build(self, attr):
+        index = {}
+        for node in self.root.iterdescendants():
+            value = node.get(attr)
+            if value is not None:
+                index.setdefault(value, []).append(node)
+        self._attrs[attr] = index
+        return index
+
+    def _in_document(self, node):
+        parent = node.getparent()
+        while parent is not None:
+            if parent is self.root:
+                return True
+            parent = parent.getparent()
+        return False
+
+    def invalidate(self, attr):
+        self._attrs.pop(attr, None)
+
+    def find(self, tag, attr, value):
+        """Retorna o primeiro nó, na ordem do documento, com a tag `tag`
+        (`*` para qualquer tag) e o atributo `attr` igual a `value`, como
+        `root.find('.//tag[@attr="value"]')`"""
+
+        index = self._attrs.get(attr)
+        if index is None:
+            index = self._build(attr)
+
+        for node in index.get(value, ()):
+            if not self._in_document(node):
+                index = self._build(attr)
+                break
+        for node in index.get(value, ()):
+            if node.get(attr) == value and tag in ("*", node.tag):
+                return node
+        return None
+
+
 class CustomPipe(plumber.Pipe):
     def __init__(self, super_obj=None, *args, **kwargs):
 
         self.super_obj = super_obj
         super(CustomPipe, self).__init__(*args, **kwargs)
 
+    def get_node_index(self, node):
+        """Retorna o `NodeIndex` do documento de `node`, compartilhado
+        pelos pipes de um mesmo `super_obj`"""
+
+        root = node.getroottree().getroot()
+        holder = self if self.super_obj is None else self.super_obj
+        index = getattr(holder, "_node_index", None)
+        if index is None or index.root is not root:
+            index = holder._node_index = NodeIndex(root)
+        return index
+
+
+class TagDispatchPipe(plumber.Pipe):
+    """Executa os `pipes` informados com uma única varredura do XML.
+
+    Cada pipe declara em `TAG` os nós que processa (`tag` ou
+    `tag[@atributo]`) e os trata em `parser_node`. Os nós de todas as tags
+    são coletados de uma só vez e cada pipe, na ordem informada, processa
+    os nós que ainda correspondem à sua `TAG`, como faria o `_process`.
+
+    O resultado é o mesmo da execução em sequência desde que nenhum pipe
+    crie, mova ou copie nós das tags tratadas pelos pipes seguintes."""
+
+    TAG_REGEX = re.compile(r"^([\w-]+)(?:\[@([\w-]+)\])?$")
+
+    def __init__(self, *pipes):
+        self.pipes = pipes
+        self.paths = [self.TAG_REGEX.match(pipe.TAG).groups() for pipe in pipes]
+        self.tags = sorted({tag for tag, attr in self.paths})
+
+    def transform(self, data):
+        raw, xml = data
+
+        found = {tag: [] for tag in self.tags}
+        for node in xml.iterdescendants(*self.tags):
+            found[node.tag].append(node)
+
+        for pipe, (tag, attr) in zip(self.pipes, self.paths):
+            logger.debug("\tbuscando tag '%s'", pipe.TAG)
+            nodes = [
+                node
+                for node in found[tag]
+                if node.tag == tag and (attr is None or attr in node.attrib)
+            ]
+            for node in nodes:
+                pipe.parser_node(node)
+            logger.info("Total de %s tags '%s' processadas", len(nodes), pipe.TAG)
+        return data
+
 
 class HTML2SPSPipeline(object):
     def __init__(self, pid, index_body=1):
         self.pid = pid
         self.index_body = index_body
-        self._ppl = plumber.Pipeline(
+        self.pipes = (
             self.SetupPipe(super_obj=self),
             self.SaveRawBodyPipe(super_obj=self),
             self.DeprecatedHTMLTagsPipe(),
@@ -107,29 +228,45 @@ class HTML2SPSPipeline(object):
             self.RemoveCommentPipe(),
             self.HTMLEscapingPipe(),
             self.BRPipe(),
-            self.PPipe(),
-            self.DivPipe(),
-            self.ANamePipe(super_obj=self),
-            self.TablePipe(),
-            self.ImgPipe(),
-            self.LiPipe(),
-            self.OlPipe(),
-            self.UlPipe(),
-            self.IPipe(),
-            self.EmPipe(),
-            self.UPipe(),
-            self.BPipe(),
-            self.APipe(),
-            self.StrongPipe(),
-            self.TdCleanPipe(),
-            self.TableCleanPipe(),
-            self.BlockquotePipe(),
-            self.HrPipe(),
-            self.GraphicChildrenPipe(),
+            # LiPipe e APipe copiam e movem nós, por isso encerram os grupos
+            TagDispatchPipe(
+                self.PPipe(),
+                self.DivPipe(),
+                self.ANamePipe(super_obj=self),
+                self.TablePipe(),
+                self.ImgPipe(super_obj=self),
+                self.LiPipe(),
+            ),
+            TagDispatchPipe(
+                self.OlPipe(),
+                self.UlPipe(),
+                self.IPipe(),
+                self.EmPipe(),
+                self.UPipe(),
+                self.BPipe(),
+                self.APipe(super_obj=self),
+            ),
+            TagDispatchPipe(
+                self.StrongPipe(),
+                self.TdCleanPipe(),
+                self.TableCleanPipe(),
+                self.BlockquotePipe(),
+                self.HrPipe(),
+                self.GraphicChildrenPipe(),
+            ),
             self.RemovePWhichIsParentOfPPipe(),
             self.RemoveRefIdPipe(),
             self.SanitizationPipe(),
         )
+        self._ppl = plumber.Pipeline(*self.pipes)
+
+    def reset(self, pid, index_body=1):
+        """Prepara o pipeline para converter outro `body`, permitindo que
+        a mesma instância seja reaproveitada entre documentos"""
+
+        self.pid = pid
+        self.index_body = index_body
+        return self
 
     class SetupPipe(CustomPipe):
         def transform(self, data):
@@ -139,14 +276,17 @@ class HTML2SPSPipeline(object):
     class SaveRawBodyPipe(CustomPipe):
         def transform(self, data):
             raw, xml = data
-            root = xml.getroottree()
-            root.write(
-                os.path.join("/tmp/", "%s.xml" % self.super_obj.pid),
-                encoding="utf-8",
-                doctype=config.DOC_TYPE_XML,
-                xml_declaration=True,
-                pretty_print=True,
-            )
+            sink = body_sink.get_sink()
+            if sink is not None:
+                sink.put(
+                    "%s-%s" % (self.super_obj.pid, self.super_obj.index_body),
+                    etree.tostring(
+                        xml.getroottree(),
+                        encoding="unicode",
+                        doctype=config.DOC_TYPE_XML,
+                        pretty_print=True,
+                    ),
+                )
             return data, xml
 
     class DeprecatedHTMLTagsPipe(CustomPipe):
@@ -154,10 +294,7 @@ class HTML2SPSPipeline(object):
 
         def transform(self, data):
             raw, xml = data
-            for tag in self.TAGS:
-                nodes = xml.findall(".//" + tag)
-                if len(nodes) > 0:
-                    etree.strip_tags(xml, tag)
+            etree.strip_tags(xml, *self.TAGS)
             return data
 
     class RemoveExcedingStyleTagsPipe(plumber.Pipe):
@@ -165,11 +302,10 @@ class HTML2SPSPipeline(object):
 
         def transform(self, data):
             raw, xml = data
-            for tag in self.TAGS:
-                for node in xml.findall(".//" + tag):
-                    text = "".join(node.itertext()).strip()
-                    if not text:
-                        node.tag = "STRIPTAG"
+            for node in xml.iterdescendants(*self.TAGS):
+                text = "".join(node.itertext()).strip()
+                if not text:
+                    node.tag = "STRIPTAG"
             etree.strip_tags(xml, "STRIPTAG")
             return data
 
@@ -180,23 +316,34 @@ class HTML2SPSPipeline(object):
             return node.findall("*") == [] and not (node.text or "").strip()
 
         def _remove_empty_tags(self, xml):
+            """Remove as tags vazias em rodadas, como se o documento fosse
+            varrido até não restar tag vazia. Na primeira rodada todos os
+            nós são avaliados; nas seguintes, apenas os pais dos nós
+            removidos na rodada anterior, os únicos que podem ter ficado
+            vazios, sempre na ordem do documento"""
+            order = {}
+            candidates = []
+            for position, node in enumerate(xml.iter(etree.Element)):
+                order[node] = position
+                candidates.append(node)
+
             removed_tags = []
-            for node in xml.xpath("//*"):
-                if node.tag not in self.EXCEPTIONS:
-                    if self._is_empty_element(node):
-                        removed = _remove_element_or_comment(node)
-                        if removed:
-                            removed_tags.append(removed)
+            while candidates:
+                parents = {}
+                for node in candidates:
+                    if node.tag not in self.EXCEPTIONS:
+                        if self._is_empty_element(node):
+                            parent = node.getparent()
+                            removed = _remove_element_or_comment(node)
+                            if removed:
+                                removed_tags.append(removed)
+                                parents[order[parent]] = parent
+                candidates = [parents[position] for position in sorted(parents)]
             return removed_tags
 
         def transform(self, data):
             raw, xml = data
-            total_removed_tags = []
-            remove = True
-            while remove:
-                removed_tags = self._remove_empty_tags(xml)
-                total_removed_tags.extend(removed_tags)
-                remove = len(removed_tags) > 0
+            total_removed_tags = self._remove_empty_tags(xml)
             if len(total_removed_tags) > 0:
                 logger.info(
                     "Total de %s tags vazias removidas", len(total_removed_tags)
@@ -225,16 +372,13 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
             count = 0
-            for node in xml.xpath(".//*"):
+            for node in XPATH_DESCENDANTS(xml):
                 if node.tag in self.EXCEPT_FOR:
                     continue
-                _attrib = deepcopy(node.attrib)
-                style = _attrib.pop("style", None)
+                style = node.attrib.pop("style", None)
                 if style:
                     count += 1
                     logger.debug("removendo style da tag '%s'", node.tag)
-                node.attrib.clear()
-                node.attrib.update(_attrib)
             logger.info("Total de %s tags com style", count)
             return data
 
@@ -256,30 +400,37 @@ class HTML2SPSPipeline(object):
             "trans-title",
         ]
 
-        def replace_CHANGE_BR_by_close_p_open_p(self, xml):
-            _xml = etree.tostring(xml)
-            _xml = _xml.replace(b"<CHANGE_BR/>", b"</p><p>")
-            return etree.fromstring(_xml)
+        def split_p_by_br(self, node):
+            """Divide o parágrafo `node` em um novo `p` a cada `br` filho,
+            movendo para cada novo `p` o conteúdo que segue o `br`"""
+            tail, node.tail = node.tail, None
+            current = node
+            for child in list(node):
+                if child.tag == "br":
+                    new_p = etree.Element("p")
+                    new_p.text = child.tail
+                    node.remove(child)
+                    current.addnext(new_p)
+                    current = new_p
+                elif current is not node:
+                    current.append(child)
+            current.tail = tail
 
         def transform(self, data):
             raw, xml = data
-            changed = False
             nodes = xml.findall("*[br]")
             for node in nodes:
                 if node.tag in self.ALLOWED_IN:
                     for br in node.findall("br"):
                         br.tag = "break"
                 elif node.tag == "p":
-                    for br in node.findall("br"):
-                        br.tag = "CHANGE_BR"
-                        changed = True
+                    self.split_p_by_br(node)
 
             etree.strip_tags(xml, "br")
-            if changed:
-                return data[0], self.replace_CHANGE_BR_by_close_p_open_p(xml)
             return data
 
     class PPipe(plumber.Pipe):
+        TAG = "p"
         TAGS = [
             "abstract",
             "ack",
@@ -328,10 +479,12 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "p", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class DivPipe(plumber.Pipe):
+        TAG = "div"
+
         def parser_node(self, node):
             node.tag = "p"
             _id = node.attrib.pop("id", None)
@@ -342,12 +495,14 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "div", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class ANamePipe(CustomPipe):
-        def find_a_href(self, root, _id_name):
-            return root.find('.//a[@href="#{}"]'.format(_id_name))
+        TAG = "a[@name]"
+
+        def find_a_href(self, index, _id_name):
+            return index.find("a", "href", "#" + _id_name)
 
         def parser_node(self, node):
             attrib = node.attrib
@@ -356,14 +511,14 @@ class HTML2SPSPipeline(object):
             if _id_name.startswith("top") or _id_name.startswith("back"):
                 return
 
-            root = node.getroottree()
+            index = self.get_node_index(node)
             if _id_name.startswith("tx"):
                 _remove_element_or_comment(node)
-                _a_ref_node = self.find_a_href(root, _id_name)
+                _a_ref_node = self.find_a_href(index, _id_name)
                 if _a_ref_node is not None:
                     _remove_element_or_comment(_a_ref_node)
             elif _id_name.startswith("t"):
-                a_href = self.find_a_href(root, _id_name)
+                a_href = self.find_a_href(index, _id_name)
                 if a_href is not None and a_href.text and "tab" in a_href.text.lower():
                     node.tag = "table-wrap"
                 else:
@@ -387,41 +542,43 @@ class HTML2SPSPipeline(object):
             )
             node.set("ref-id", ref_id)
             node.set("id", ref_id)
+            index.invalidate("ref-id")
 
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "a[@name]", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class TablePipe(plumber.Pipe):
-        def parser_node_table(self, node):
+        TAG = "table[@id]"
+
+        def parser_node(self, node):
 
             _id = node.attrib.get("id")
             if _id:
                 p = etree.Element("table-wrap")
-                _node = deepcopy(node)
-                p.append(_node)
 
                 id_name = gera_id(new_element[0] + id_name[-1])
                 if id_name:
                     p.set("id", id_name)
 
                 parent = node.getparent()
+                p.append(node)
                 parent.append(p)
-                parent.remove(node)
 
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "table[@id]", self.parser_node_table)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
-    class ImgPipe(plumber.Pipe):
+    class ImgPipe(CustomPipe):
+        TAG = "img"
+
         def parser_node(self, node):
             node.tag = "graphic"
-            _attrib = deepcopy(node.attrib)
-            src = _attrib.pop("src")
+            src = node.attrib["src"]
 
             node.attrib.clear()
             node.set("{http://www.w3.org/1999/xlink}href", src)
@@ -436,22 +593,18 @@ class HTML2SPSPipeline(object):
 
             n_id = gera_id(new_element[0] + id_name[-1])
             if n_id:
-                root = node.getroottree()
-                ref_node = root.find("//%s[@ref-id='%s']" % (new_element, n_id))
+                ref_node = self.get_node_index(node).find(new_element, "ref-id", n_id)
                 if ref_node is not None:
-                    _node = deepcopy(node)
-                    ref_node.append(_node)
-
-                    parent = node.getparent()
-                    parent.remove(node)
+                    ref_node.append(node)
 
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "img", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class LiPipe(plumber.Pipe):
+        TAG = "li"
         ALLOWED_CHILDREN = ("label", "title", "p", "def-list", "list")
 
         def parser_node(self, node):
@@ -464,6 +617,7 @@ class HTML2SPSPipeline(object):
                 if c_node.tag not in self.ALLOWED_CHILDREN
             ]
             for c_node in c_not_allowed:
+                c_node = copy_if_contains(c_node, XPATH_LI_OR_SELF)
                 wrap_node(c_node, "p")
 
             if node.text:
@@ -476,11 +630,13 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "li", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
 
             return data
 
     class OlPipe(plumber.Pipe):
+        TAG = "ol"
+
         def parser_node(self, node):
             node.tag = "list"
             node.set("list-type", "order")
@@ -488,10 +644,12 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "ol", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class UlPipe(plumber.Pipe):
+        TAG = "ul"
+
         def parser_node(self, node):
             node.tag = "list"
             node.set("list-type", "bullet")
@@ -500,10 +658,12 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "ul", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class IPipe(plumber.Pipe):
+        TAG = "i"
+
         def parser_node(self, node):
             etree.strip_tags(node, "break")
             node.tag = "italic"
@@ -512,10 +672,12 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "i", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class BPipe(plumber.Pipe):
+        TAG = "b"
+
         def parser_node(self, node):
             node.tag = "bold"
             etree.strip_tags(node, "break")
@@ -526,10 +688,12 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "b", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
-    class APipe(plumber.Pipe):
+    class APipe(CustomPipe):
+        TAG = "a"
+
         def _parser_node_external_link(self, node, extlinktype="uri"):
             node.tag = "ext-link"
 
@@ -542,8 +706,7 @@ class HTML2SPSPipeline(object):
             node.attrib.update(_attrib)
 
         def _create_email(self, node):
-            a_node_copy = deepcopy(node)
-            href = a_node_copy.attrib.get("href")
+            href = node.attrib.get("href")
             if "mailto:" in href:
                 href = href.split("mailto:")[1]
 
@@ -596,7 +759,6 @@ class HTML2SPSPipeline(object):
                 _remove_element_or_comment(node)
 
             node.attrib.clear()
-            root = node.getroottree()
 
             xref_name = href.replace("#", "")
             if xref_name == "ref":
@@ -617,7 +779,7 @@ class HTML2SPSPipeline(object):
             else:
                 rid = gera_id(xref_name)
                 if rid:
-                    ref_node = root.find("//*[@ref_id='%s']" % rid)
+                    ref_node = self.get_node_index(node).find("*", "ref_id", rid)
                     node.set("rid", xref_name)
                     if ref_node is not None:
                         ref_type = ref_node.tag
@@ -642,10 +804,12 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "a", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class StrongPipe(plumber.Pipe):
+        TAG = "strong"
+
         def parser_node(self, node):
             node.tag = "bold"
             node.attrib.clear()
@@ -655,10 +819,11 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "strong", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class TdCleanPipe(plumber.Pipe):
+        TAG = "td"
         EXPECTED_INNER_TAGS = [
             "email",
             "ext-link",
@@ -746,10 +911,11 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "td", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class TableCleanPipe(TdCleanPipe):
+        TAG = "table"
         EXPECTED_INNER_TAGS = ["col", "colgroup", "thead", "tfoot", "tbody", "tr"]
 
         EXPECTED_ATTRIBUTES = [
@@ -767,13 +933,9 @@ class HTML2SPSPipeline(object):
             "xml:base",
         ]
 
-        def transform(self, data):
-            raw, xml = data
-
-            _process(xml, "table", self.parser_node)
-            return data
-
     class EmPipe(plumber.Pipe):
+        TAG = "em"
+
         def parser_node(self, node):
             node.tag = "italic"
             node.attrib.clear()
@@ -782,30 +944,36 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "em", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class UPipe(plumber.Pipe):
+        TAG = "u"
+
         def parser_node(self, node):
             node.tag = "underline"
 
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "u", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class BlockquotePipe(plumber.Pipe):
+        TAG = "blockquote"
+
         def parser_node(self, node):
             node.tag = "disp-quote"
 
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "blockquote", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class HrPipe(plumber.Pipe):
+        TAG = "hr"
+
         def parser_node(self, node):
             node.attrib.clear()
             node.tag = "p"
@@ -814,10 +982,11 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "hr", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class GraphicChildrenPipe(plumber.Pipe):
+        TAG = "graphic"
         TAGS = (
             "addr-line",
             "alternatives",
@@ -890,14 +1059,14 @@ class HTML2SPSPipeline(object):
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "graphic", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class RemoveCommentPipe(plumber.Pipe):
         def transform(self, data):
             raw, xml = data
 
-            comments = xml.xpath("//comment()")
+            comments = XPATH_COMMENTS(xml)
             for comment in comments:
                 _remove_element_or_comment(comment)
             logger.info("Total de %s 'comentarios' processadas", len(comments))
@@ -917,7 +1086,7 @@ class HTML2SPSPipeline(object):
 
     class RemovePWhichIsParentOfPPipe(plumber.Pipe):
         def _tag_texts(self, xml):
-            for node in xml.xpath(".//p[p]"):
+            for node in XPATH_P_WITH_P(xml):
                 if node.text and node.text.strip():
                     new_p = etree.Element("p")
                     new_p.text = node.text
@@ -932,11 +1101,11 @@ class HTML2SPSPipeline(object):
                         child.addnext(new_p)
 
         def _identify_extra_p_tags(self, xml):
-            for node in xml.xpath(".//p[p]"):
+            for node in XPATH_P_WITH_P(xml):
                 node.tag = "REMOVE_P"
 
         def _tag_text_in_body(self, xml):
-            for body in xml.xpath(".//body"):
+            for body in XPATH_BODIES(xml):
                 for node in body.findall("*"):
                     if node.tail and node.tail.strip():
                         new_p = etree.Element("p")
@@ -963,11 +1132,13 @@ class HTML2SPSPipeline(object):
             return data
 
     class SanitizationPipe(plumber.Pipe):
+        def __init__(self):
+            self.convert = DataSanitizationPipeline()
+
         def transform(self, data):
             raw, xml = data
 
-            convert = DataSanitizationPipeline()
-            _, obj = convert.deploy(xml)
+            _, obj = self.convert.deploy(xml)
             return raw, obj
 
     def deploy(self, raw):
@@ -977,13 +1148,14 @@ class HTML2SPSPipeline(object):
 
 class DataSanitizationPipeline(object):
     def __init__(self):
-        self._ppl = plumber.Pipeline(
+        self.pipes = (
             self.SetupPipe(),
             self.GraphicInExtLink(),
             self.TableinBody(),
             self.TableinP(),
             self.AddPinFN(),
         )
+        self._ppl = plumber.Pipeline(*self.pipes)
 
     def deploy(self, raw):
         transformed_data = self._ppl.run(raw, rewrap=True)
@@ -992,13 +1164,14 @@ class DataSanitizationPipeline(object):
     class SetupPipe(plumber.Pipe):
         def transform(self, data):
 
-            new_obj = deepcopy(data)
-            return data, new_obj
+            return data, data
 
     class GraphicInExtLink(plumber.Pipe):
         def parser_node(self, node):
 
-            graphic = node.find("graphic")
+            graphic = copy_if_contains(
+                node.find("graphic"), XPATH_NESTED_EXT_LINK_GRAPHIC
+            )
             graphic.tag = "inline-graphic"
             wrap_node(graphic, "p")
 
@@ -1009,27 +1182,28 @@ class DataSanitizationPipeline(object):
             return data
 
     class TableinBody(plumber.Pipe):
+        TAG = "body[table]"
+        XPATH_NESTED = XPATH_NESTED_BODY_TABLE
+
         def parser_node(self, node):
 
-            table = node.find("table")
+            table = copy_if_contains(node.find("table"), self.XPATH_NESTED)
             wrap_node(table, "table-wrap")
 
         def transform(self, data):
             raw, xml = data
 
-            _process(xml, "body[table]", self.parser_node)
+            _process(xml, self.TAG, self.parser_node)
             return data
 
     class TableinP(TableinBody):
-        def transform(self, data):
-            raw, xml = data
-
-            _process(xml, "p[table]", self.parser_node)
-            return data
+        TAG = "p[table]"
+        XPATH_NESTED = XPATH_NESTED_P_TABLE
 
     class AddPinFN(plumber.Pipe):
         def parser_node(self, node):
             if node.text:
+                node = copy_if_contains(node, XPATH_NESTED_FN)
                 wrap_content_node(node, "p")
 
         def transform(self, data):
@@ -0,0 +1,152 @@
+""" module to collect and report runtime metrics """
+import json
+import time
+import bisect
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Histograma de valores em milissegundos agrupados nos limites de
+    `BUCKETS`. Os percentis são estimados pelo limite superior do grupo
+    em que se encontram"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = pct / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "buckets": {
+                ("<=%s" % bound if bound is not None else "inf"): count
+                for bound, count in zip(self.buckets + (None,), self.counts)
+                if count
+            },
+        }
+
+
+class Metrics:
+    """Registro de contadores e histogramas compartilhado entre threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started_at = time.time()
+            self.counters = Counter()
+            self.histograms = {}
+
+    def incr(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timed(self, name: str):
+        """Registra no histograma `name` a duração, em milissegundos, do
+        bloco"""
+
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - started_at) * 1000)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "elapsed": time.time() - self.started_at,
+                "counters": dict(sorted(self.counters.items())),
+                "histograms": {
+                    name: histogram.summary()
+                    for name, histogram in sorted(self.histograms.items())
+                },
+            }
+
+
+registry = Metrics()
+
+
+class Reporter:
+    """Emite periodicamente, a cada `interval` segundos, e ao final da
+    execução um resumo em JSON das métricas de `metrics`. O resumo é
+    acrescentado como uma linha ao arquivo `output_path` ou, quando não
+    informado, registrado no log"""
+
+    def __init__(self, metrics: Metrics, interval: float, output_path: str = None):
+        self.metrics = metrics
+        self.interval = interval
+        self.output_path = output_path
+        self._stop = threading.Event()
+        self._thread = None
+
+    def emit(self) -> None:
+        summary = json.dumps(self.metrics.snapshot())
+        if self.output_path:
+            with open(self.output_path, "a", encoding="utf-8") as output:
+                output.write(summary + "\n")
+        else:
+            logger.info("Métricas: %s", summary)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.emit()
+
+    def start(self) -> None:
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.emit()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
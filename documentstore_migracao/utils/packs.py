@@ -0,0 +1,144 @@
+""" module to packed storage of documents """
+import os
+import zlib
+import logging
+from typing import Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PACK_EXT = ".pack"
+INDEX_EXT = ".idx"
+
+
+class PackWriter:
+    """Grava documentos em arquivos `.pack` somente de acréscimo, cada
+    documento compactado com zlib, acompanhados de um índice `.idx` com
+    uma linha `pid offset tamanho` por documento.
+
+    Cada instância cria um novo pack, e outro quando o atual ultrapassa
+    `max_size` bytes, de modo que vários processos possam gravar na mesma
+    pasta. Um documento só é considerado gravado após sua linha no índice,
+    o que torna descartável um registro interrompido no final do pack."""
+
+    def __init__(self, path: str, max_size: int):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_size = max_size
+        self._pack = None
+        self._index = None
+        self._open_next()
+
+    def _open_next(self):
+        self.close()
+
+        number = len(list_packs(self.path))
+        while True:
+            pack_path = os.path.join(self.path, "%06d%s" % (number, PACK_EXT))
+            try:
+                fd = os.open(pack_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            except FileExistsError:
+                number += 1
+                continue
+            break
+
+        logger.debug("Criando pack '%s'", pack_path)
+        self._pack = os.fdopen(fd, "wb")
+        self._index = open(
+            os.path.splitext(pack_path)[0] + INDEX_EXT, "a", encoding="utf-8"
+        )
+
+    def write(self, pid: str, content: str) -> None:
+        if self._pack.tell() >= self.max_size:
+            self._open_next()
+
+        data = zlib.compress(content.encode("utf-8"))
+        offset = self._pack.tell()
+        self._pack.write(data)
+        self._pack.flush()
+        self._index.write("%s %d %d\n" % (pid, offset, len(data)))
+        self._index.flush()
+
+    def close(self) -> None:
+        for f in (self._pack, self._index):
+            if f is not None:
+                f.close()
+        self._pack = self._index = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def list_packs(path: str) -> list:
+    """Lista, em ordem de criação, os packs de uma pasta"""
+
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return []
+    return sorted(os.path.join(path, name) for name in names if name.endswith(PACK_EXT))
+
+
+def read_index(pack_path: str) -> Iterator[Tuple[str, int, int]]:
+    """Itera pelas entradas `(pid, offset, tamanho)` do índice de um pack"""
+
+    try:
+        f = open(os.path.splitext(pack_path)[0] + INDEX_EXT, encoding="utf-8")
+    except FileNotFoundError:
+        return
+
+    with f:
+        for line in f:
+            try:
+                pid, offset, size = line.split()
+                yield pid, int(offset), int(size)
+            except ValueError:
+                logger.warning("Entrada inválida no índice de '%s'", pack_path)
+
+
+def latest_entries(path: str) -> dict:
+    """Retorna, para cada documento gravado nos packs de uma pasta, o pack
+    e o offset de sua versão mais recente, i.e. a última entrada dos
+    índices em ordem de criação dos packs"""
+
+    latest = {}
+    for pack_path in list_packs(path):
+        for pid, offset, _ in read_index(pack_path):
+            latest[pid] = pack_path, offset
+    return latest
+
+
+def iter_documents(path: str) -> Iterator[Tuple[str, bytes]]:
+    """Lê sequencialmente os documentos gravados nos packs de uma pasta,
+    retornando tuplas `(pid, conteúdo)`. Um documento reextraído é lido
+    uma única vez, em sua versão mais recente"""
+
+    latest = latest_entries(path)
+    for pack_path in list_packs(path):
+        with open(pack_path, "rb") as f:
+            for pid, offset, size in read_index(pack_path):
+                if latest.get(pid) != (pack_path, offset):
+                    continue
+                if f.tell() != offset:
+                    f.seek(offset)
+                yield pid, zlib.decompress(f.read(size))
+
+
+def get_document(path: str, pid: str) -> Optional[bytes]:
+    """Recupera o conteúdo mais recente de um documento por meio dos
+    índices dos packs"""
+
+    found = None
+    for pack_path in list_packs(path):
+        for _pid, offset, size in read_index(pack_path):
+            if _pid == pid:
+                found = pack_path, offset, size
+
+    if found is None:
+        return None
+    pack_path, offset, size = found
+    with open(pack_path, "rb") as f:
+        f.seek(offset)
+        return zlib.decompress(f.read(size))
@@ -0,0 +1,69 @@
+""" module to read lists of documents PIDs """
+import io
+import sys
+import gzip
+import zlib
+from typing import Iterable, Iterator, Optional, Tuple, TextIO
+
+
+def open_pids_file(path: str, mode: str = "r") -> TextIO:
+    """Abre um arquivo de PIDs, que pode estar compactado com gzip
+    (extensão `.gz`). O path `-` representa a entrada padrão, para
+    leitura, ou a saída padrão, para gravação"""
+
+    if path == "-":
+        stream = sys.stdin if mode == "r" else sys.stdout
+        return io.open(stream.fileno(), mode, encoding="utf-8", closefd=False)
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """Converte a representação `i/n` de um shard na tupla `(i, n)`,
+    onde `0 <= i < n`"""
+
+    try:
+        index, total = [int(part) for part in value.split("/")]
+    except ValueError:
+        raise ValueError("Shard '%s' deve estar no formato i/n" % value) from None
+
+    if not 0 <= index < total:
+        raise ValueError("Shard '%s' deve respeitar 0 <= i < n" % value)
+    return index, total
+
+
+def in_shard(pid: str, shard: Tuple[int, int]) -> bool:
+    """Verifica se um PID pertence ao shard `(i, n)` por meio de um hash
+    estável, permitindo que máquinas distintas dividam uma mesma lista
+    sem coordenação"""
+
+    index, total = shard
+    return zlib.crc32(pid.encode("utf-8")) % total == index
+
+
+def iter_pids(lines: Iterable[str], shard: Tuple[int, int] = None) -> Iterator[str]:
+    """Itera sob demanda pelos PIDs de `lines`, ignorando linhas em branco
+    e, quando informado, os PIDs que não pertencem ao `shard`. Apenas a
+    primeira coluna de cada linha é considerada, o que permite ler os
+    arquivos gerados pelo comando `discover`"""
+
+    for pid, _ in iter_pids_with_dates(lines, shard):
+        yield pid
+
+
+def iter_pids_with_dates(
+    lines: Iterable[str], shard: Tuple[int, int] = None
+) -> Iterator[Tuple[str, Optional[str]]]:
+    """Como `iter_pids`, mas retorna os pares `(PID, data de processamento)`
+    das linhas geradas pelo comando `discover`. A data é `None` nas linhas
+    que contêm apenas o PID"""
+
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        pid = fields[0]
+        if shard is not None and not in_shard(pid, shard):
+            continue
+        yield pid, fields[1] if len(fields) > 1 else None
@@ -0,0 +1,219 @@
+""" module to profile the pipes of the html to sps conversion """
+import heapq
+import json
+import time
+from typing import Dict
+
+from lxml import etree
+
+from documentstore_migracao.utils import metrics
+from documentstore_migracao.utils.convert_html_body import (
+    HTML2SPSPipeline,
+    TagDispatchPipe,
+)
+
+# limites, em milissegundos, dos histogramas de tempo por pipe
+BUCKETS = (
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    25,
+    50,
+    100,
+    250,
+    500,
+    1000,
+    2500,
+    5000,
+    10000,
+)
+
+
+def pipe_name(pipe) -> str:
+    if isinstance(pipe, TagDispatchPipe):
+        return "TagDispatchPipe(%s-%s)" % (
+            type(pipe.pipes[0]).__name__,
+            type(pipe.pipes[-1]).__name__,
+        )
+    return type(pipe).__qualname__
+
+
+def _count_nodes(data) -> int:
+    xml = data[1] if isinstance(data, tuple) else data
+    if etree.iselement(xml):
+        return sum(1 for _ in xml.iter())
+    return 0
+
+
+class PipeProfiler:
+    """Mede o tempo e os nós tratados por cada pipe de um `HTML2SPSPipeline`,
+    incluindo os pipes de `DataSanitizationPipeline` e os agrupados em
+    `TagDispatchPipe`.
+
+    O tempo de cada pipe exclui o de seus pipes internos, de modo que a
+    soma dos tempos corresponde ao tempo total da conversão. Os nós
+    tratados são as chamadas a `parser_node`, nos pipes que tratam uma
+    tag, ou os nós do XML recebido, nos pipes que percorrem o documento
+    inteiro. As medidas se acumulam em `samples` até a chamada de
+    `reset`, o que permite somar os `body` de um mesmo documento."""
+
+    def __init__(self):
+        self.samples = {}
+        self._stack = []
+
+    def reset(self) -> None:
+        self.samples = {}
+
+    def instrument(self, pipeline) -> None:
+        for pipe in pipeline.pipes:
+            name = pipe_name(pipe)
+            if hasattr(pipe, "parser_node"):
+                pipe.parser_node = self._wrap_parser_node(name, pipe.parser_node)
+                pipe.transform = self._wrap_transform(name, pipe.transform)
+            else:
+                pipe.transform = self._wrap_transform(
+                    name, pipe.transform, count_nodes=True
+                )
+
+            if isinstance(pipe, TagDispatchPipe):
+                self.instrument(pipe)
+            elif isinstance(pipe, HTML2SPSPipeline.SanitizationPipe):
+                self.instrument(pipe.convert)
+
+    def _record(self, name: str, elapsed: float, nodes: int) -> None:
+        sample = self.samples.setdefault(name, [0.0, 0])
+        sample[0] += elapsed * 1000
+        sample[1] += nodes
+
+    def _timed(self, name, func, args, nodes):
+        # `frame` acumula o tempo dos pipes internos, descontado do pipe atual
+        frame = [0.0]
+        self._stack.append(frame)
+        started_at = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1][0] += elapsed
+            self._record(name, elapsed - frame[0], nodes)
+
+    def _wrap_transform(self, name, transform, count_nodes=False):
+        def timed_transform(data):
+            nodes = 0
+            if count_nodes:
+                started_at = time.perf_counter()
+                nodes = _count_nodes(data)
+                if self._stack:
+                    self._stack[-1][0] += time.perf_counter() - started_at
+            return self._timed(name, transform, (data,), nodes)
+
+        return timed_transform
+
+    def _wrap_parser_node(self, name, parser_node):
+        def timed_parser_node(node):
+            return self._timed(name, parser_node, (node,), 1)
+
+        return timed_parser_node
+
+
+class PipeProfileReport:
+    """Agrega as medidas de `PipeProfiler` de vários documentos, mantendo
+    para cada pipe um histograma dos tempos e os `slowest` documentos mais
+    lentos"""
+
+    def __init__(self, slowest: int = 5):
+        self.slowest = slowest
+        self.documents = 0
+        self.histograms = {}
+        self.nodes = {}
+        self._slowest = {}
+
+    def add(self, document: str, samples: Dict[str, list]) -> None:
+        self.documents += 1
+        for name, (ms, nodes) in samples.items():
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = metrics.Histogram(BUCKETS)
+                self.nodes[name] = 0
+                self._slowest[name] = []
+            histogram.observe(ms)
+            self.nodes[name] += nodes
+
+            heap = self._slowest[name]
+            item = (ms, document, nodes)
+            if len(heap) < self.slowest:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+    def to_dict(self) -> dict:
+        total = sum(histogram.sum for histogram in self.histograms.values())
+        pipes = []
+        for name, histogram in self.histograms.items():
+            pipes.append(
+                {
+                    "pipe": name,
+                    "documents": histogram.count,
+                    "total_ms": histogram.sum,
+                    "percent": histogram.sum / total * 100 if total else 0.0,
+                    "mean_ms": histogram.sum / histogram.count,
+                    "p99_ms": histogram.percentile(99),
+                    "max_ms": histogram.max,
+                    "nodes": self.nodes[name],
+                    "slowest": [
+                        {"document": document, "ms": ms, "nodes": nodes}
+                        for ms, document, nodes in sorted(
+                            self._slowest[name], reverse=True
+                        )
+                    ],
+                }
+            )
+        pipes.sort(key=lambda pipe: pipe["total_ms"], reverse=True)
+        return {"documents": self.documents, "total_ms": total, "pipes": pipes}
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as output:
+            json.dump(self.to_dict(), output, indent=2)
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        "Documentos: %(documents)d, tempo total nos pipes: %(total_ms).1fms" % report,
+        "",
+        "%-50s %12s %6s %10s %10s %10s"
+        % ("Pipe", "Total (ms)", "%", "Média (ms)", "p99 (ms)", "Nós"),
+    ]
+    for pipe in report["pipes"]:
+        lines.append(
+            "%-50s %12.1f %6.1f %10.3f %10.3f %10d"
+            % (
+                pipe["pipe"],
+                pipe["total_ms"],
+                pipe["percent"],
+                pipe["mean_ms"],
+                pipe["p99_ms"],
+                pipe["nodes"],
+            )
+        )
+
+    lines.extend(["", "Documentos mais lentos por pipe:"])
+    for pipe in report["pipes"]:
+        lines.append(
+            "%s: %s"
+            % (
+                pipe["pipe"],
+                ", ".join(
+                    "%(document)s (%(ms).1fms)" % slowest for slowest in pipe["slowest"]
+                ),
+            )
+        )
+    return "\n".join(lines)
@@ -1,17 +1,299 @@
+""" module to http requests methods """
+import os
+import time
+import email.utils
+import threading
+
 import requests
-from requests.exceptions import HTTPError
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, HTTPError, RequestException, Timeout
+from urllib3.util.retry import Retry
+
+from documentstore_migracao import config
+from documentstore_migracao.utils import metrics
+from documentstore_migracao.utils.request_cache import ResponseCache
+from documentstore_migracao.utils.throttle import (
+    AdaptiveLimiter,
+    CircuitBreaker,
+    CircuitOpenError,
+    Throttle,
+)
+
+
+RETRY_STATUS_FORCELIST = (500, 502, 503, 504)
+OVERLOAD_STATUS = (429,) + RETRY_STATUS_FORCELIST
+BACKOFF_MAX = 120
+
+_session = None
+_throttled_session = None
+_session_pool_size = 0
+_session_lock = threading.Lock()
+_cache = None
+_throttle = None
 
 
 class HTTPGetError(Exception):
-    pass
+    def __init__(self, message="", status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def create_session(
+    pool_size: int, retries: int, backoff_factor: float
+) -> requests.Session:
+    """Cria uma sessão HTTP com pools de conexões persistentes (keep-alive)
+    por host e política de novas tentativas com backoff exponencial para
+    falhas de conexão e respostas 5xx"""
+
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_FORCELIST,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _replace_session(pool_size: int = None) -> requests.Session:
+    """Substitui as sessões compartilhadas. Deve ser chamada com
+    `_session_lock` adquirido; as duas sessões são publicadas juntas"""
+
+    global _session, _throttled_session, _session_pool_size
+
+    pool_size = pool_size or int(config.get("REQUEST_POOL_SIZE"))
+    session = create_session(
+        pool_size=pool_size,
+        retries=int(config.get("REQUEST_RETRIES")),
+        backoff_factor=float(config.get("REQUEST_BACKOFF_FACTOR")),
+    )
+    # as novas tentativas das requisições controladas por `Throttle` são
+    # feitas por `_send`, para que cada falha chegue ao limitador e ao
+    # circuito
+    throttled_session = create_session(pool_size=pool_size, retries=0, backoff_factor=0)
+
+    old_sessions = (_session, _throttled_session)
+    _session, _throttled_session = session, throttled_session
+    _session_pool_size = pool_size
+    for old_session in old_sessions:
+        if old_session is not None:
+            old_session.close()
+    return _session
+
+
+def configure(pool_size: int = None) -> requests.Session:
+    """(Re)cria a sessão compartilhada a partir das configurações
+    `REQUEST_POOL_SIZE`, `REQUEST_RETRIES` e `REQUEST_BACKOFF_FACTOR`.
+    O argumento `pool_size` tem precedência sobre `REQUEST_POOL_SIZE`"""
+
+    with _session_lock:
+        return _replace_session(pool_size)
+
+
+def ensure_pool_size(pool_size: int) -> None:
+    """Garante que o pool de conexões de cada host comporte `pool_size`
+    requisições simultâneas"""
+
+    with _session_lock:
+        if pool_size > max(_session_pool_size, int(config.get("REQUEST_POOL_SIZE"))):
+            _replace_session(pool_size)
+
+
+def get_session(throttled: bool = False) -> requests.Session:
+    """Retorna a sessão HTTP compartilhada pelo processo. Com `throttled`,
+    retorna a sessão sem novas tentativas, usada pelas requisições
+    controladas por `Throttle`"""
+
+    session = _throttled_session if throttled else _session
+    if session is None:
+        with _session_lock:
+            if _throttled_session is None:
+                _replace_session()
+            session = _throttled_session if throttled else _session
+    return session
+
+
+def enable_cache(
+    path: str = None, max_size: int = None, max_age: float = None
+) -> ResponseCache:
+    """Habilita o cache em disco das respostas das requisições feitas com
+    `cached=True`. Por padrão utiliza a pasta `responses` dentro de
+    `CACHE_PATH` e as configurações `REQUEST_CACHE_MAX_SIZE` e
+    `REQUEST_CACHE_MAX_AGE`"""
+
+    global _cache
+
+    _cache = ResponseCache(
+        path=path or os.path.join(config.get("CACHE_PATH"), "responses"),
+        max_size=max_size or int(config.get("REQUEST_CACHE_MAX_SIZE")),
+        max_age=float(
+            config.get("REQUEST_CACHE_MAX_AGE") if max_age is None else max_age
+        ),
+    )
+    return _cache
+
+
+def disable_cache() -> None:
+    global _cache
+
+    _cache = None
 
 
-def get(uri, **kwargs):
+def create_throttle() -> Throttle:
+    """Cria o controle de concorrência adaptativo a partir das
+    configurações `REQUEST_LIMIT_*` e `REQUEST_BREAKER_*`"""
 
-    r = requests.get(uri, **kwargs)
+    return Throttle(
+        limiter=AdaptiveLimiter(
+            initial_limit=int(config.get("REQUEST_LIMIT_INITIAL")),
+            max_limit=int(config.get("REQUEST_LIMIT_MAX")),
+            latency_target=float(config.get("REQUEST_LATENCY_TARGET")),
+        ),
+        breaker=CircuitBreaker(
+            failure_threshold=int(config.get("REQUEST_BREAKER_THRESHOLD")),
+            reset_timeout=float(config.get("REQUEST_BREAKER_RESET")),
+            max_wait=float(config.get("REQUEST_BREAKER_MAX_WAIT")),
+        ),
+    )
+
+
+def get_throttle() -> Throttle:
+    """Retorna o controle de concorrência compartilhado pelas requisições
+    feitas com `throttled=True`"""
+
+    global _throttle
+
+    if _throttle is None:
+        with _session_lock:
+            if _throttle is None:
+                _throttle = create_throttle()
+    return _throttle
+
+
+def _raise_for_status(r):
     try:
         r.raise_for_status()
     except HTTPError as exc:
-        raise HTTPGetError(str(exc))
+        raise HTTPGetError(str(exc), status_code=r.status_code)
+
+
+def _session_get(uri, throttled=False, **kwargs):
+    """Realiza a requisição pela sessão compartilhada, registrando em
+    `metrics.registry` a latência, o tamanho e o status da resposta e as
+    novas tentativas feitas pela sessão"""
+
+    started_at = time.perf_counter()
+    try:
+        r = get_session(throttled).get(uri, **kwargs)
+    except RequestException as exc:
+        metrics.registry.incr("request.errors.%s" % type(exc).__name__)
+        raise
+    finally:
+        metrics.registry.observe(
+            "request.latency", (time.perf_counter() - started_at) * 1000
+        )
+
+    metrics.registry.incr("request.status.%s" % r.status_code)
+    metrics.registry.incr("request.bytes", len(r.content))
+    retries = getattr(getattr(r.raw, "retries", None), "history", ())
+    if retries:
+        metrics.registry.incr("request.retries", len(retries))
+    return r
+
+
+def _retry_wait(r, attempt: int) -> float:
+    """Retorna o tempo de espera antes da nova tentativa `attempt`:
+    o informado pelo servidor em `Retry-After` ou, na sua ausência, o
+    backoff exponencial de `REQUEST_BACKOFF_FACTOR`"""
+
+    retry_after = r.headers.get("Retry-After") if r is not None else None
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0), BACKOFF_MAX)
+        except ValueError:
+            retry_date = email.utils.parsedate_tz(retry_after)
+            if retry_date is not None:
+                wait = email.utils.mktime_tz(retry_date) - time.time()
+                return min(max(wait, 0), BACKOFF_MAX)
+
+    backoff_factor = float(config.get("REQUEST_BACKOFF_FACTOR"))
+    return min(backoff_factor * 2 ** (attempt - 1), BACKOFF_MAX)
+
+
+def _send(uri, throttled=False, **kwargs):
+    """Realiza a requisição. Com `throttled`, cada tentativa ocupa uma vaga
+    do `Throttle` e tem seu resultado informado ao limitador e ao circuito.
+    As falhas de conexão e as respostas 429 e 5xx são repetidas até
+    `REQUEST_RETRIES` vezes, com backoff exponencial ou respeitando
+    `Retry-After`, e aguardando o circuito: com o serviço degradado, a nova
+    tentativa é a requisição de teste do circuito meio-aberto"""
+
+    if not throttled:
+        return _session_get(uri, **kwargs)
+
+    retries = int(config.get("REQUEST_RETRIES"))
+    r = None
+    for attempt in range(retries + 1):
+        if attempt:
+            metrics.registry.incr("request.retries")
+            time.sleep(_retry_wait(r, attempt))
+        try:
+            with get_throttle().slot() as report_overload:
+                r = _session_get(uri, throttled=True, **kwargs)
+                report_overload(r.status_code in OVERLOAD_STATUS)
+        except CircuitOpenError as exc:
+            raise HTTPGetError(str(exc))
+        except (ConnectionError, Timeout) as exc:
+            if attempt == retries:
+                raise HTTPGetError(str(exc))
+            r = None
+            continue
+
+        if r.status_code not in OVERLOAD_STATUS:
+            break
+    return r
+
+
+def _cached_get(cache, uri, revalidate=False, **kwargs):
+    """Realiza uma requisição consultando o cache: entradas recentes são
+    servidas localmente e as demais, ou todas com `revalidate`, são
+    revalidadas por meio de uma requisição condicional"""
+
+    key = cache.key(uri, kwargs.get("params"))
+    entry = cache.get(key)
+    if entry is not None:
+        meta, body = entry
+        if not revalidate and cache.is_fresh(meta):
+            metrics.registry.incr("request.cache.hits")
+            return cache.to_response(meta, body)
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        headers.update(cache.conditional_headers(meta))
+        r = _send(uri, headers=headers, **kwargs)
+        if r.status_code == 304:
+            metrics.registry.incr("request.cache.revalidated")
+            cache.revalidate(key, meta)
+            return cache.to_response(meta, body)
     else:
-        return r
+        r = _send(uri, **kwargs)
+
+    _raise_for_status(r)
+    cache.store(key, r)
+    return r
+
+
+def get(uri, cached=False, throttled=False, revalidate=False, **kwargs):
+
+    kwargs.setdefault("timeout", float(config.get("REQUEST_TIMEOUT")))
+    if cached and _cache is not None:
+        return _cached_get(
+            _cache, uri, revalidate=revalidate, throttled=throttled, **kwargs
+        )
+
+    r = _send(uri, throttled=throttled, **kwargs)
+    _raise_for_status(r)
+    return r
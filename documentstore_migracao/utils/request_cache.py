@@ -0,0 +1,168 @@
+""" module to on-disk cache of http responses """
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+from typing import Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Cache em disco, endereçado pelo conteúdo da requisição (endpoint e
+    parâmetros), das respostas HTTP bem sucedidas.
+
+    Cada entrada é composta por um arquivo `.body` com o conteúdo da
+    resposta e um arquivo `.json` com os metadados necessários para
+    requisições condicionais (`ETag` e `Last-Modified`). O tamanho total
+    das entradas é limitado por `max_size` bytes, removendo-se as menos
+    utilizadas recentemente (LRU). Entradas mais novas que `max_age`
+    segundos são servidas sem nenhuma requisição."""
+
+    def __init__(self, path: str, max_size: int, max_age: float = 0):
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._load()
+
+    @staticmethod
+    def key(uri: str, params: dict = None) -> str:
+        query = urlencode(sorted((params or {}).items()))
+        return hashlib.sha1(("%s?%s" % (uri, query)).encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    def _load(self):
+        """Reconstrói o índice LRU a partir dos arquivos existentes,
+        ordenando-os pela data do último acesso"""
+
+        entries = []
+        for dirpath, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                key, ext = os.path.splitext(filename)
+                if ext != ".body":
+                    continue
+                stat = os.stat(os.path.join(dirpath, filename))
+                entries.append((stat.st_mtime, key, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+
+    def get(self, key: str) -> Optional[Tuple[dict, bytes]]:
+        """Retorna os metadados e o conteúdo de uma entrada, marcando-a
+        como utilizada recentemente"""
+
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path + ".json", "r") as f:
+                meta = json.load(f)
+            with open(entry_path + ".body", "rb") as f:
+                body = f.read()
+            os.utime(entry_path + ".body")
+        except (OSError, ValueError):
+            self._discard(key)
+            return None
+        return meta, body
+
+    def store(self, key: str, response: requests.Response) -> dict:
+        """Grava uma resposta no cache e remove as entradas excedentes"""
+
+        meta = {
+            "url": response.url,
+            "headers": dict(response.headers),
+            "encoding": response.encoding,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "stored_at": time.time(),
+        }
+        entry_path = self._entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        _write_atomic(entry_path + ".body", response.content)
+        _write_atomic(entry_path + ".json", json.dumps(meta).encode("utf-8"))
+
+        with self._lock:
+            self._size += len(response.content) - self._entries.pop(key, 0)
+            self._entries[key] = len(response.content)
+        self._evict()
+        return meta
+
+    def revalidate(self, key: str, meta: dict) -> None:
+        """Renova o prazo de validade de uma entrada confirmada pelo
+        servidor por meio de uma resposta `304 Not Modified`"""
+
+        meta["stored_at"] = time.time()
+        _write_atomic(self._entry_path(key) + ".json", json.dumps(meta).encode("utf-8"))
+
+    def is_fresh(self, meta: dict) -> bool:
+        return time.time() - meta.get("stored_at", 0) < self.max_age
+
+    @staticmethod
+    def conditional_headers(meta: dict) -> dict:
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    @staticmethod
+    def to_response(meta: dict, body: bytes) -> requests.Response:
+        """Reconstrói um objeto `requests.Response` a partir de uma entrada"""
+
+        response = requests.Response()
+        response.status_code = 200
+        response.url = meta["url"]
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.encoding = meta["encoding"]
+        response._content = body
+        return response
+
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+        entry_path = self._entry_path(key)
+        for ext in (".body", ".json"):
+            try:
+                os.unlink(entry_path + ext)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self) -> None:
+        while True:
+            with self._lock:
+                if self._size <= self.max_size or len(self._entries) <= 1:
+                    return
+                key = next(iter(self._entries))
+            logger.debug("Removendo do cache a entrada '%s'", key)
+            self._discard(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+
+def _write_atomic(path: str, content: bytes) -> None:
+    tmp_path = "%s.%s-%s.tmp" % (path, os.getpid(), threading.get_ident())
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
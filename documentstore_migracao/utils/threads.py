@@ -0,0 +1,37 @@
+""" module to thread based concurrency helpers """
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Iterable, Iterator, Tuple, Any
+
+
+def bounded_map(
+    func: Callable, iterable: Iterable, max_workers: int
+) -> Iterator[Tuple[Any, Any]]:
+    """Executa `func` para cada item de `iterable` utilizando um pool de
+    threads, mantendo no máximo `max_workers` chamadas em andamento.
+
+    Os itens de `iterable` são consumidos sob demanda, o que permite
+    processar entradas muito grandes sem materializá-las em memória.
+    Retorna um iterador de tuplas `(item, resultado)` na ordem em que
+    as chamadas forem finalizadas. Exceções levantadas por `func` são
+    propagadas ao consumidor do iterador."""
+
+    max_workers = max(int(max_workers), 1)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {}
+        try:
+            for item in iterable:
+                if len(pending) >= max_workers:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future.result()
+
+                pending[executor.submit(func, item)] = item
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        finally:
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,180 @@
+""" module to adaptive concurrency control of http requests """
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class AdaptiveLimiter:
+    """Limita o número de requisições simultâneas a um serviço, ajustando
+    o limite pelo algoritmo AIMD: cada resposta saudável aumenta o limite
+    em `1 / limite`, ou seja, cerca de uma unidade a cada janela completa,
+    enquanto cada sinal de sobrecarga (429, 5xx, timeouts ou latência
+    acima de `latency_target` segundos) multiplica o limite por
+    `decrease_factor`.
+
+    A redução ocorre no máximo uma vez por janela: falhas de requisições
+    iniciadas antes da última redução são consequência da mesma
+    sobrecarga e não reduzem o limite novamente."""
+
+    def __init__(
+        self,
+        initial_limit: int,
+        max_limit: int,
+        latency_target: float,
+        min_limit: int = 1,
+        decrease_factor: float = 0.5,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> float:
+        """Aguarda uma vaga e retorna o instante de início da requisição"""
+
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+        return time.monotonic()
+
+    def release(self, started_at: float, overloaded: bool) -> None:
+        """Libera a vaga de uma requisição iniciada em `started_at`,
+        ajustando o limite conforme a resposta obtida"""
+
+        latency = time.monotonic() - started_at
+        with self._cond:
+            self._in_flight -= 1
+            if overloaded or latency > self.latency_target:
+                if started_at > self._last_decrease:
+                    self._limit = max(
+                        self.min_limit, self._limit * self.decrease_factor
+                    )
+                    self._last_decrease = time.monotonic()
+                    logger.debug("Reduzindo limite de requisições para %d", self.limit)
+            else:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """Interrompe as requisições a um serviço após `failure_threshold`
+    falhas consecutivas. Com o circuito aberto, as requisições aguardam
+    `reset_timeout` segundos, quando uma única requisição de teste é
+    liberada: seu sucesso fecha o circuito e sua falha o abre novamente.
+    Requisições que aguardam mais que `max_wait` segundos são abortadas
+    com `CircuitOpenError`."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, max_wait: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_wait = max_wait
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._cond = threading.Condition()
+
+    def before_call(self) -> None:
+        """Aguarda até que o circuito permita uma nova requisição"""
+
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self.state == self.CLOSED:
+                    return
+                reset_at = self._opened_at + self.reset_timeout
+                if self.state == self.OPEN and now >= reset_at:
+                    logger.info("Circuito meio-aberto, testando o serviço")
+                    self.state = self.HALF_OPEN
+                    return
+                if now >= deadline:
+                    raise CircuitOpenError(
+                        "Serviço indisponível há mais de %s segundos" % self.max_wait
+                    )
+
+                wait = deadline - now
+                if self.state == self.OPEN:
+                    wait = min(wait, reset_at - now)
+                self._cond.wait(wait)
+
+    def record_success(self) -> None:
+        with self._cond:
+            if self.state != self.CLOSED:
+                logger.info("Circuito fechado, serviço restabelecido")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._cond.notify_all()
+
+    def record_failure(self) -> None:
+        with self._cond:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                logger.warning(
+                    "Circuito aberto após %d falhas, aguardando %s segundos",
+                    self._failures,
+                    self.reset_timeout,
+                )
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._cond.notify_all()
+
+
+class Throttle:
+    """Combina um `CircuitBreaker` e um `AdaptiveLimiter` para controlar
+    as requisições feitas a um mesmo serviço"""
+
+    def __init__(self, limiter: AdaptiveLimiter, breaker: CircuitBreaker):
+        self.limiter = limiter
+        self.breaker = breaker
+
+    @contextmanager
+    def slot(self):
+        """Reserva uma vaga para uma requisição. O bloco deve chamar a
+        função recebida com `True` quando a resposta indicar sobrecarga
+        do serviço; exceções também são contabilizadas como sobrecarga"""
+
+        self.breaker.before_call()
+        started_at = self.limiter.acquire()
+        overloaded = False
+
+        def report(value: bool) -> None:
+            nonlocal overloaded
+            overloaded = value
+
+        try:
+            yield report
+        except Exception:
+            overloaded = True
+            raise
+        finally:
+            self.limiter.release(started_at, overloaded)
+            if overloaded:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
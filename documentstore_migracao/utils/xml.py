@@ -1,7 +1,9 @@
 """ module to methods xml file """
 
+import re
 import logging
 import itertools
+import threading
 
 from lxml import etree
 from xml.dom.minidom import parseString
@@ -12,12 +14,32 @@ from documentstore_migracao.utils import string, convert_html_body, files
 
 logger = logging.getLogger(__name__)
 
+# os parsers do lxml podem ser reaproveitados, mas não compartilhados entre threads
+_parsers = threading.local()
+
+
+def get_html_parser():
+    """Retorna o `etree.HTMLParser` da thread corrente"""
+
+    parser = getattr(_parsers, "html", None)
+    if parser is None:
+        parser = _parsers.html = etree.HTMLParser(remove_blank_text=True, recover=True)
+    return parser
+
+
+def get_xml_parser():
+    """Retorna o `etree.XMLParser` da thread corrente"""
+
+    parser = getattr(_parsers, "xml", None)
+    if parser is None:
+        parser = _parsers.xml = etree.XMLParser(remove_blank_text=True, no_network=True)
+    return parser
+
 
 def str2objXML(_string):
     _string = string.normalize(_string)
     try:
-        parser = etree.HTMLParser(remove_blank_text=True, recover=True)
-        return etree.fromstring("<body>%s</body>" % (_string), parser=parser)
+        return etree.fromstring("<body>%s</body>" % (_string), parser=get_html_parser())
     except etree.XMLSyntaxError as e:
         logger.exception(e)
         return etree.fromstring("<body></body>")
@@ -27,29 +49,41 @@ def file2objXML(file_path):
     return loadToXML(file_path)
 
 
-def objXML2file(file_path, obj_xml, pretty=False):
-    files.write_file_binary(
-        file_path,
-        etree.tostring(
-            obj_xml,
-            doctype=config.DOC_TYPE_XML,
-            xml_declaration=True,
-            method="xml",
-            pretty_print=pretty,
-        ),
+def objXML2bytes(obj_xml, pretty=False):
+    return etree.tostring(
+        obj_xml,
+        doctype=config.DOC_TYPE_XML,
+        xml_declaration=True,
+        method="xml",
+        pretty_print=pretty,
     )
 
 
+def objXML2file(file_path, obj_xml, pretty=False):
+    files.write_file_binary(file_path, objXML2bytes(obj_xml, pretty))
+
+
 def prettyPrint_format(xml_string):
     return parseString(xml_string).toprettyxml()
 
 
+def set_doctype(xmltree, doctype: str = None) -> None:
+    """Declara em `xmltree` o DOCTYPE `doctype`, por padrão o
+    `DOC_TYPE_XML`, como se o documento tivesse sido lido de um arquivo
+    que o contém"""
+
+    public_id, system_url = re.search(
+        r'PUBLIC "([^"]*)" "([^"]*)"', doctype or config.DOC_TYPE_XML
+    ).groups()
+    xmltree.docinfo.public_id = public_id
+    xmltree.docinfo.system_url = system_url
+
+
 def loadToXML(file):
     """Parses `file` to produce an etree instance.
 
     The XML can be retrieved given its filesystem path,
     an URL or a file-object.
     """
-    parser = etree.XMLParser(remove_blank_text=True, no_network=True)
-    xml = etree.parse(file, parser)
+    xml = etree.parse(file, get_xml_parser())
     return xml
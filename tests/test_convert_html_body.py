@@ -1,11 +1,17 @@
 import os
 import unittest
+from copy import deepcopy
 from lxml import etree
 
 from documentstore_migracao.utils.convert_html_body import (
+    DataSanitizationPipeline,
     HTML2SPSPipeline,
+    NodeIndex,
+    TagDispatchPipe,
     _process,
     _remove_element_or_comment,
+    wrap_content_node,
+    wrap_node,
 )
 from . import SAMPLES_PATH
 
@@ -31,6 +37,21 @@ class TestHTML2SPSPipeline(unittest.TestCase):
         raw, xml = pipeline.SetupPipe().transform(expected_text)
         self.assertIn(expected_text, str(etree.tostring(xml)))
 
+    def test_reset_reuses_pipeline(self):
+        text = '<p><a name="n1">1</a> nota <b>b</b></p>'
+        pipeline = HTML2SPSPipeline(pid="S1234-56782018000100011")
+        pipeline.deploy(text)
+
+        self.assertIs(pipeline.reset("S1234-56782018000100012", 2), pipeline)
+        self.assertEqual(pipeline.pid, "S1234-56782018000100012")
+        self.assertEqual(pipeline.index_body, 2)
+        _, reused = pipeline.deploy(text)
+        _, fresh = HTML2SPSPipeline(pid="S1234-56782018000100012", index_body=2).deploy(
+            text
+        )
+        self.assertEqual(etree.tostring(reused), etree.tostring(fresh))
+        self.assertIsNotNone(reused.find(".//fn[@id='n1-2']"))
+
     def test_pipe_remove_empty_do_not_remove_img(self):
         text = '<root><p> <img align="x" src="a04qdr04.gif"/> </p> </root>'
         expected = '<root><p> <img align="x" src="a04qdr04.gif"/> </p> </root>'
@@ -92,6 +113,26 @@ class TestHTML2SPSPipeline(unittest.TestCase):
             resultado.replace(">", ">[BREAK]").split("[BREAK]"),
         )
 
+    def test_pipe_remove_empty_nested(self):
+        text = "<root><p>texto<div><span><i> </i></span>\n</div> fim</p><b><img/></b></root>"
+        with self.assertLogs(
+            "documentstore_migracao.utils.convert_html_body", level="INFO"
+        ) as logs:
+            raw, transformed = self._transform(text, self.pipeline.RemoveEmptyPipe())
+        self.assertEqual(
+            etree.tostring(transformed, encoding="unicode"),
+            "<root><p>texto fim</p><b><img/></b></root>",
+        )
+        self.assertEqual(
+            logs.output,
+            [
+                "INFO:documentstore_migracao.utils.convert_html_body:"
+                "Total de 3 tags vazias removidas",
+                "INFO:documentstore_migracao.utils.convert_html_body:"
+                "Tags removidas:div, i, span ",
+            ],
+        )
+
     def test_pipe_remove_attribute_style(self):
         text = '<root><p style="x">texto <b style="x"></b></p> <td style="bla"><caption style="x"/></td></root>'
         raw, transformed = self._transform(
@@ -118,6 +159,17 @@ class TestHTML2SPSPipeline(unittest.TestCase):
             b'<root><p align="x">bla</p><p> continua outra linha</p><p baljlba="1"/><td><break/></td><sec/></root>',
         )
 
+    def test_pipe_br_splits_p_in_place(self):
+        text = "<root><p>um<br/>dois <b>negrito</b><br/><!-- c --><i>tres</i><br/></p>fim</root>"
+        tree = etree.fromstring(text)
+        raw, transformed = self.pipeline.BRPipe().transform((text, tree))
+
+        self.assertIs(transformed, tree)
+        self.assertEqual(
+            etree.tostring(transformed),
+            b"<root><p>um</p><p>dois <b>negrito</b></p><p><!-- c --><i>tres</i></p><p/>fim</root>",
+        )
+
     def test_pipe_p(self):
         text = '<root><p align="x" id="y">bla</p><p baljlba="1"/></root>'
         raw, transformed = self._transform(text, self.pipeline.PPipe())
@@ -170,6 +222,47 @@ class TestHTML2SPSPipeline(unittest.TestCase):
                 self.assertEqual(text, etree.tostring(node).strip())
                 self.assertEqual(len(node.attrib), 0)
 
+    def test_pipe_li_keeps_nested_li_of_wrapped_children(self):
+        text = "<root><li>a<b>b<li>c</li></b></li></root>"
+        raw, transformed = self._transform(text, self.pipeline.LiPipe())
+        self.assertEqual(
+            etree.tostring(transformed),
+            b"<root><list-item><p>a</p><p><b>b<li>c</li></b></p></list-item></root>",
+        )
+
+    def test_pipe_add_p_in_fn_keeps_nested_fn(self):
+        text = "<root><fn>a<fn>b</fn></fn></root>"
+        raw, transformed = self._transform(text, DataSanitizationPipeline.AddPinFN())
+        self.assertEqual(
+            etree.tostring(transformed), b"<root><fn><fn>b</fn><p>a</p></fn></root>"
+        )
+
+    def test_pipe_table_in_p_keeps_nested_p_table(self):
+        text = "<root><p><table><tr><td><p><table/></p></td></tr></table></p></root>"
+        raw, transformed = self._transform(text, DataSanitizationPipeline.TableinP())
+        self.assertEqual(
+            etree.tostring(transformed),
+            b"<root><p><table-wrap><table><tr><td><p><table/></p></td></tr>"
+            b"</table></table-wrap></p></root>",
+        )
+
+    def test_wrap_node_moves_node(self):
+        root = etree.fromstring("<root>a<b>b</b>c<i>d</i></root>")
+        node = root.find("b")
+        p = wrap_node(node, "p")
+
+        self.assertIs(p[0], node)
+        self.assertEqual(
+            etree.tostring(root), b"<root>a<p><b>b</b>c</p><i>d</i></root>"
+        )
+
+    def test_wrap_content_node(self):
+        root = etree.fromstring("<root><fn>nota <b>b</b></fn> fim</root>")
+        wrap_content_node(root.find("fn"), "p")
+        self.assertEqual(
+            etree.tostring(root), b"<root><fn><b>b</b><p>nota </p> fim</fn></root>"
+        )
+
     def test_pipe_ol(self):
         text = """
             <root>
@@ -735,6 +828,77 @@ class TestHTML2SPSPipeline(unittest.TestCase):
                 found = tree.findall(".//%s" % expected_tag)
                 self.assertIsNotNone(found)
 
+    def test_tag_dispatch_pipe_runs_pipes_in_order(self):
+        text = """<root><div id="d1" class="x">texto</div><p class="y">bla</p><hr class="z"/><strong><span>forte</span></strong></root>"""
+        pipe = TagDispatchPipe(
+            self.pipeline.PPipe(),
+            self.pipeline.DivPipe(),
+            self.pipeline.StrongPipe(),
+            self.pipeline.HrPipe(),
+        )
+        raw, transformed = self._transform(text, pipe)
+        self.assertEqual(
+            etree.tostring(transformed),
+            b"""<root><p id="d1">texto</p><p>bla</p><p content-type="hr"/><bold>forte</bold></root>""",
+        )
+
+    def test_tag_dispatch_pipe_skips_nodes_changed_by_previous_pipes(self):
+        text = """<root><a name="t1">1</a><a href="#t1">Tab 1</a><a name="top">topo</a><td><blockquote><i>a</i></blockquote></td></root>"""
+        expected = etree.tostring(
+            self.pipeline.BlockquotePipe().transform(
+                self.pipeline.TdCleanPipe().transform(
+                    self.pipeline.APipe().transform(
+                        self.pipeline.ANamePipe(super_obj=self.pipeline).transform(
+                            (text, etree.fromstring(text))
+                        )
+                    )
+                )
+            )[1]
+        )
+        pipe = TagDispatchPipe(
+            self.pipeline.ANamePipe(super_obj=self.pipeline),
+            self.pipeline.APipe(),
+            self.pipeline.TdCleanPipe(),
+            self.pipeline.BlockquotePipe(),
+        )
+        raw, transformed = self._transform(text, pipe)
+        self.assertEqual(etree.tostring(transformed), expected)
+        self.assertIsNone(transformed.find(".//disp-quote"))
+
+
+class TestNodeIndex(unittest.TestCase):
+    def setUp(self):
+        self.xml = etree.fromstring(
+            '<root><a href="#t1">1</a><p><a href="#t1">2</a><fig ref-id="f1"/></p></root>'
+        )
+        self.index = NodeIndex(self.xml)
+
+    def test_find_returns_first_node_in_document_order(self):
+        found = self.index.find("a", "href", "#t1")
+        self.assertEqual(found.text, "1")
+        self.assertIsNone(self.index.find("p", "href", "#t1"))
+        self.assertEqual(self.index.find("*", "ref-id", "f1").tag, "fig")
+
+    def test_find_ignores_renamed_and_changed_nodes(self):
+        first, second = self.xml.findall(".//a")
+        first.tag = "REMOVE_NODE"
+        self.assertIs(self.index.find("a", "href", "#t1"), second)
+        second.attrib.clear()
+        self.assertIsNone(self.index.find("a", "href", "#t1"))
+
+    def test_find_finds_copies_of_removed_nodes(self):
+        self.index.find("fig", "ref-id", "f1")
+        p = self.xml.find("p")
+        copy = deepcopy(p)
+        self.xml.replace(p, copy)
+        self.assertIs(self.index.find("fig", "ref-id", "f1"), copy.find("fig"))
+
+    def test_invalidate_indexes_new_attributes(self):
+        self.assertIsNone(self.index.find("p", "id", "p1"))
+        self.xml.find("p").set("id", "p1")
+        self.index.invalidate("id")
+        self.assertIs(self.index.find("p", "id", "p1"), self.xml.find("p"))
+
 
 class Test_RemovePWhichIsParentOfPPipe_Case1(unittest.TestCase):
     def setUp(self):
@@ -4,7 +4,7 @@ import requests
 from copy import deepcopy
 from unittest.mock import patch, ANY
 from xylose.scielodocument import Journal, Article
-from documentstore_migracao.export import journal, article
+from documentstore_migracao.export import journal, article, issue
 from documentstore_migracao.utils import request
 from documentstore_migracao import exceptions, config
 from . import SAMPLES_JOURNAL, SAMPLES_ARTICLE, SAMPLES_PATH, utils
@@ -18,7 +18,7 @@ class TestExportJournal(unittest.TestCase):
 
         result = journal.ext_journal("1234-5678")
         mk_request_get.assert_called_once_with(
-            ANY, params={"collection": ANY, "issn": "1234-5678"}
+            ANY, params={"collection": ANY, "issn": "1234-5678"}, throttled=True
         )
 
         self.assertEqual(result.title, SAMPLES_JOURNAL["v100"][0]["_"])
@@ -39,7 +39,9 @@ class TestExportJournal(unittest.TestCase):
     def test_ext_identifiers(self, mk_request_get):
 
         journal.ext_identifiers()
-        mk_request_get.assert_called_once_with(ANY, params={"collection": ANY})
+        mk_request_get.assert_called_once_with(
+            ANY, params={"collection": ANY}, throttled=True
+        )
 
     @patch("documentstore_migracao.export.journal.request.get")
     @patch("documentstore_migracao.export.journal.ext_identifiers")
@@ -63,13 +65,35 @@ class TestExportJournal(unittest.TestCase):
         mk_journals.assert_called_once_with(collection=ANY)
 
 
+class TestExportIssue(unittest.TestCase):
+    @patch("documentstore_migracao.export.issue.request.get")
+    def test_ext_identifiers(self, mk_request_get):
+
+        mk_request_get.return_value.json.return_value = {"objects": []}
+        result = issue.ext_identifiers("1234-5678")
+        mk_request_get.assert_called_once_with(
+            ANY, params={"collection": ANY, "issn": "1234-5678"}, throttled=True
+        )
+        self.assertEqual(result, {"objects": []})
+
+    @patch("documentstore_migracao.export.issue.request.get")
+    def test_ext_issue(self, mk_request_get):
+
+        mk_request_get.return_value.json.return_value = {"issue": {}}
+        result = issue.ext_issue("0036-363419970001")
+        mk_request_get.assert_called_once_with(
+            ANY, params={"collection": ANY, "code": "0036-363419970001"}, throttled=True
+        )
+        self.assertEqual(result.data, {"issue": {}})
+
+
 class TestExportArticle(unittest.TestCase):
     @patch("documentstore_migracao.export.article.request.get")
     def test_ext_identifiers(self, mk_request_get):
 
         article.ext_identifiers("1234-5678")
         mk_request_get.assert_called_once_with(
-            ANY, params={"collection": ANY, "issn": "1234-5678"}
+            ANY, params={"collection": ANY, "issn": "1234-5678"}, throttled=True
         )
 
     @patch("documentstore_migracao.export.article.request.get")
@@ -77,7 +101,11 @@ class TestExportArticle(unittest.TestCase):
 
         result = article.ext_article("S0036-36341997000100001")
         mk_request_get.assert_called_once_with(
-            ANY, params={"collection": ANY, "code": "S0036-36341997000100001"}
+            ANY,
+            params={"collection": ANY, "code": "S0036-36341997000100001"},
+            cached=True,
+            throttled=True,
+            revalidate=False,
         )
 
     @patch("documentstore_migracao.export.article.logger.error")
@@ -110,7 +138,7 @@ class TestExportArticle(unittest.TestCase):
 
         result = article.ext_article_txt("S0036-36341997000100001")
         mk_ext_article.assert_called_once_with(
-            "S0036-36341997000100001", body="true", format="xmlrsps"
+            "S0036-36341997000100001", revalidate=False, body="true", format="xmlrsps"
         )
 
     @patch("documentstore_migracao.export.article.ext_article")
@@ -142,6 +170,56 @@ class TestExportArticle(unittest.TestCase):
         result = article.get_articles("1234-5678")
         mk_documents.assert_called_once_with(collection=ANY, issn="1234-5678")
 
+    @patch("documentstore_migracao.export.article.request.get")
+    def test_ext_identifiers_page(self, mk_request_get):
+
+        article.ext_identifiers_page(1000, issn="1234-5678", until=None)
+        mk_request_get.assert_called_once_with(
+            ANY,
+            params={
+                "collection": ANY,
+                "offset": 1000,
+                "limit": 1000,
+                "issn": "1234-5678",
+            },
+            throttled=True,
+        )
+
+    @patch("documentstore_migracao.export.article.request.get")
+    def test_iter_documents_pages_through_listing(self, mk_request_get):
+        pages = [
+            {"objects": [{"code": "1"}, {"code": "2"}]},
+            {"objects": [{"code": "3"}]},
+        ]
+        mk_request_get.return_value.json.side_effect = pages
+
+        result = list(article.iter_documents("1234-5678", page_size=2))
+        self.assertEqual(result, [{"code": "1"}, {"code": "2"}, {"code": "3"}])
+        self.assertEqual(
+            [c[1]["params"]["offset"] for c in mk_request_get.call_args_list], [0, 2]
+        )
+        mk_request_get.assert_called_with(
+            ANY,
+            params={
+                "collection": ANY,
+                "issn": "1234-5678",
+                "limit": 2,
+                "offset": 2,
+                "body": "false",
+            },
+            throttled=True,
+        )
+
+    @patch("documentstore_migracao.export.article.iter_documents")
+    def test_iter_notXML_codes_skips_xml_documents(self, mk_iter_documents):
+        mk_iter_documents.return_value = [
+            {"code": "S0036-36341997000100001", "version": "html"},
+            {"code": "S0036-36341997000100002", "version": "xml"},
+        ]
+
+        result = list(article.iter_notXML_codes("1234-5678"))
+        self.assertEqual(result, ["S0036-36341997000100001"])
+
     @patch("documentstore_migracao.export.article.ext_article_txt")
     def test_get_not_xml_article(self, mk_ext_article_txt):
 
@@ -7,21 +7,207 @@ from . import SAMPLES_PATH
 
 
 class TestMigrateProcess(unittest.TestCase):
+    @patch("documentstore_migracao.processing.extracted.discover_documents")
+    def test_command_discover(self, mk_discover_documents):
+
+        migrate_articlemeta_parser(
+            ["discover", "--output", "/tmp/pids.txt.gz", "--since", "2019-01-31"]
+        )
+        mk_discover_documents.assert_called_once_with(
+            "/tmp/pids.txt.gz", since="2019-01-31", issn=None, concurrency=1
+        )
+
+    def test_command_discover_invalid_since(self):
+        with self.assertRaises(SystemExit):
+            migrate_articlemeta_parser(
+                ["discover", "--output", "/tmp/pids.txt", "--since", "31/01/2019"]
+            )
+
     @patch("documentstore_migracao.processing.extracted.extract_all_data")
     def test_command_extrate(self, mk_extract_all_data):
+        extracted_pids = []
+        mk_extract_all_data.side_effect = lambda pids, **kwargs: extracted_pids.extend(
+            pid for pid, _ in pids
+        )
 
         migrate_articlemeta_parser(
             ["extract", os.path.join(SAMPLES_PATH, "documents_pids.txt")]
         )
         mk_extract_all_data.assert_called_once_with(
-            ["S0021-25712009000400001\n", "S0021-25712009000400002"]
+            ANY, concurrency=1, packed=False, force=False
+        )
+        self.assertEqual(
+            extracted_pids, ["S0021-25712009000400001", "S0021-25712009000400002"]
+        )
+
+    @patch("documentstore_migracao.processing.extracted.extract_all_data")
+    def test_command_extrate_arg_shard(self, mk_extract_all_data):
+        extracted_pids = []
+        mk_extract_all_data.side_effect = lambda pids, **kwargs: extracted_pids.extend(
+            pid for pid, _ in pids
+        )
+
+        for shard in ("0/2", "1/2"):
+            migrate_articlemeta_parser(
+                [
+                    "extract",
+                    os.path.join(SAMPLES_PATH, "documents_pids.txt"),
+                    "--shard",
+                    shard,
+                ]
+            )
+        self.assertEqual(
+            sorted(extracted_pids),
+            ["S0021-25712009000400001", "S0021-25712009000400002"],
+        )
+
+    def test_command_extrate_arg_shard_invalid(self):
+        with self.assertRaises(SystemExit):
+            migrate_articlemeta_parser(
+                [
+                    "extract",
+                    os.path.join(SAMPLES_PATH, "documents_pids.txt"),
+                    "--shard",
+                    "2/2",
+                ]
+            )
+
+    @patch("documentstore_migracao.processing.extracted.extract_all_data")
+    def test_command_extrate_arg_concurrency(self, mk_extract_all_data):
+
+        migrate_articlemeta_parser(
+            [
+                "extract",
+                os.path.join(SAMPLES_PATH, "documents_pids.txt"),
+                "--concurrency",
+                "8",
+            ]
+        )
+        mk_extract_all_data.assert_called_once_with(
+            ANY, concurrency=8, packed=False, force=False
+        )
+
+    @patch("documentstore_migracao.main.migrate_articlemeta.metrics.Reporter")
+    @patch("documentstore_migracao.processing.extracted.extract_all_data")
+    def test_command_extrate_arg_metrics(self, mk_extract_all_data, MockReporter):
+
+        migrate_articlemeta_parser(
+            [
+                "extract",
+                os.path.join(SAMPLES_PATH, "documents_pids.txt"),
+                "--metrics-interval",
+                "5",
+                "--metrics-output",
+                "/tmp/metrics.jsonl",
+            ]
+        )
+        MockReporter.assert_called_once_with(ANY, 5.0, "/tmp/metrics.jsonl")
+        MockReporter.return_value.__exit__.assert_called_once()
+
+    @patch("documentstore_migracao.processing.extracted.extract_all_data_by_issn")
+    def test_command_extrate_arg_by_issn(self, mk_extract_all_data_by_issn):
+
+        migrate_articlemeta_parser(
+            ["extract", os.path.join(SAMPLES_PATH, "documents_pids.txt"), "--by-issn"]
+        )
+        mk_extract_all_data_by_issn.assert_called_once_with(
+            ANY, concurrency=1, packed=False, force=False
+        )
+
+    @patch("documentstore_migracao.processing.extracted.extract_all_data")
+    def test_command_extrate_arg_force(self, mk_extract_all_data):
+
+        migrate_articlemeta_parser(
+            ["extract", os.path.join(SAMPLES_PATH, "documents_pids.txt"), "--force"]
+        )
+        mk_extract_all_data.assert_called_once_with(
+            ANY, concurrency=1, packed=False, force=True
+        )
+
+    @patch("documentstore_migracao.main.migrate_articlemeta.request.enable_cache")
+    @patch("documentstore_migracao.processing.extracted.extract_all_data")
+    def test_command_extrate_arg_cache(self, mk_extract_all_data, mk_enable_cache):
+
+        migrate_articlemeta_parser(
+            ["extract", os.path.join(SAMPLES_PATH, "documents_pids.txt"), "--cache"]
+        )
+        mk_enable_cache.assert_called_once_with()
+
+    @patch("documentstore_migracao.processing.extracted.extract_metadata")
+    def test_command_metadata(self, mk_extract_metadata):
+
+        migrate_articlemeta_parser(
+            [
+                "metadata",
+                "--type",
+                "issue",
+                "--output",
+                "/tmp/issues.jsonl",
+                "--concurrency",
+                "8",
+            ]
+        )
+        mk_extract_metadata.assert_called_once_with(
+            "issue", "/tmp/issues.jsonl", concurrency=8
         )
 
     @patch("documentstore_migracao.processing.conversion.convert_article_ALLxml")
     def test_command_conversion(self, mk_convert_article_ALLxml):
 
         migrate_articlemeta_parser(["convert"])
-        mk_convert_article_ALLxml.assert_called_once_with()
+        mk_convert_article_ALLxml.assert_called_once_with(
+            jobs=1, profile_path=None, incremental=False, force=False
+        )
+
+    @patch("documentstore_migracao.processing.conversion.convert_article_ALLxml")
+    def test_command_conversion_arg_jobs(self, mk_convert_article_ALLxml):
+
+        migrate_articlemeta_parser(["convert", "--jobs", "4"])
+        mk_convert_article_ALLxml.assert_called_once_with(
+            jobs=4, profile_path=None, incremental=False, force=False
+        )
+
+    @patch("documentstore_migracao.processing.conversion.convert_article_ALLxml")
+    def test_command_conversion_arg_profile_pipes(self, mk_convert_article_ALLxml):
+
+        migrate_articlemeta_parser(["convert", "--profile-pipes", "/tmp/pipes.json"])
+        mk_convert_article_ALLxml.assert_called_once_with(
+            jobs=1, profile_path="/tmp/pipes.json", incremental=False, force=False
+        )
+
+    @patch("documentstore_migracao.processing.conversion.convert_article_ALLxml")
+    def test_command_conversion_arg_incremental(self, mk_convert_article_ALLxml):
+
+        migrate_articlemeta_parser(["convert", "--incremental", "--force"])
+        mk_convert_article_ALLxml.assert_called_once_with(
+            jobs=1, profile_path=None, incremental=True, force=True
+        )
+
+    @patch("documentstore_migracao.processing.conversion.convert_article_ALLxml")
+    def test_command_conversion_arg_force_requires_incremental(
+        self, mk_convert_article_ALLxml
+    ):
+        with self.assertRaises(SystemExit):
+            migrate_articlemeta_parser(["convert", "--force"])
+        mk_convert_article_ALLxml.assert_not_called()
+
+    @patch("documentstore_migracao.processing.extracted.extract_all_data")
+    def test_command_extrate_arg_packed(self, mk_extract_all_data):
+
+        migrate_articlemeta_parser(
+            ["extract", os.path.join(SAMPLES_PATH, "documents_pids.txt"), "--packed"]
+        )
+        mk_extract_all_data.assert_called_once_with(
+            ANY, concurrency=1, packed=True, force=False
+        )
+
+    @patch("documentstore_migracao.processing.conversion.convert_article_ALLpacks")
+    def test_command_conversion_arg_packed(self, mk_convert_article_ALLpacks):
+
+        migrate_articlemeta_parser(["convert", "--packed"])
+        mk_convert_article_ALLpacks.assert_called_once_with(
+            jobs=1, profile_path=None, incremental=False, force=False
+        )
 
     @patch("documentstore_migracao.processing.conversion.convert_article_xml")
     def test_command_conversion_arg_pathFile(self, mk_convert_article_xml):
@@ -53,6 +239,26 @@ class TestMigrateProcess(unittest.TestCase):
         migrate_articlemeta_parser(["pack", "--file", "/tmp/example.xml"])
         mk_pack_article_xml.assert_called_once_with("/tmp/example.xml")
 
+    @patch("documentstore_migracao.processing.fused.process_article_ALLxml")
+    def test_command_process(self, mk_process_article_ALLxml):
+
+        migrate_articlemeta_parser(["process", "--jobs", "4"])
+        mk_process_article_ALLxml.assert_called_once_with(jobs=4, keep_files=False)
+
+    @patch("documentstore_migracao.processing.fused.process_article_ALLpacks")
+    def test_command_process_arg_packed(self, mk_process_article_ALLpacks):
+
+        migrate_articlemeta_parser(["process", "--packed", "--keep-files"])
+        mk_process_article_ALLpacks.assert_called_once_with(jobs=1, keep_files=True)
+
+    @patch("documentstore_migracao.processing.fused.process_article_xml")
+    def test_command_process_arg_pathFile(self, mk_process_article_xml):
+
+        migrate_articlemeta_parser(["process", "--file", "/tmp/example.xml"])
+        mk_process_article_xml.assert_called_once_with(
+            "/tmp/example.xml", keep_files=False
+        )
+
     @patch("documentstore_migracao.processing.inserting.import_documents_to_kernel")
     def test_command_import(self, mk_import_documents_to_kernel):
 
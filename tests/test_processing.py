@@ -1,16 +1,20 @@
 import os
+import json
+import tempfile
 import unittest
 from lxml import etree
 from unittest.mock import patch, ANY, call, Mock, MagicMock
 
-from xylose.scielodocument import Journal, Article
+from xylose.scielodocument import Journal, Article, Issue
 from documentstore_migracao.processing import (
     extracted,
     conversion,
     validation,
     reading,
     inserting,
+    fused,
 )
+from documentstore_migracao.utils import packs, request, pids, xml
 
 from . import (
     utils,
@@ -28,13 +32,237 @@ class TestProcessingExtracted(unittest.TestCase):
     def test_extract_all_data(self, mk_extract_article_txt):
 
         mk_extract_article_txt.return_value = SAMPLES_XML_ARTICLE
-        with utils.environ(SOURCE_PATH="/tmp"):
-            try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with utils.environ(SOURCE_PATH="/tmp", CACHE_PATH=tmpdir):
+                try:
+                    extracted.extract_all_data(["S0036-36341997000100001"])
+
+                    self.assertTrue(os.path.exists("/tmp/S0036-36341997000100001.xml"))
+                finally:
+                    os.remove("/tmp/S0036-36341997000100001.xml")
+
+    @patch("documentstore_migracao.processing.extracted.article.ext_article_txt")
+    def test_extract_all_data_with_concurrency(self, mk_extract_article_txt):
+        pids = ["S0036-36341997000100001", "S0036-36341997000100002"]
+        mk_extract_article_txt.return_value = SAMPLES_XML_ARTICLE
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with utils.environ(SOURCE_PATH=tmpdir, CACHE_PATH=tmpdir):
+                extracted.extract_all_data(pids, concurrency=2)
+
+                for pid in pids:
+                    self.assertTrue(
+                        os.path.exists(os.path.join(tmpdir, "%s.xml" % pid))
+                    )
+
+    @patch("documentstore_migracao.processing.extracted.article.ext_article_txt")
+    def test_extract_all_data_skips_already_extracted(self, mk_extract_article_txt):
+        mk_extract_article_txt.return_value = SAMPLES_XML_ARTICLE
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with utils.environ(SOURCE_PATH=tmpdir, CACHE_PATH=tmpdir):
+                extracted.extract_all_data(["S0036-36341997000100001\n"])
+                extracted.extract_all_data(
+                    ["S0036-36341997000100001\n", "S0036-36341997000100002"]
+                )
+
+        mk_extract_article_txt.assert_has_calls(
+            [
+                call("S0036-36341997000100001", revalidate=False),
+                call("S0036-36341997000100002", revalidate=False),
+            ]
+        )
+        self.assertEqual(mk_extract_article_txt.call_count, 2)
+
+    @patch("documentstore_migracao.processing.extracted.article.ext_article_txt")
+    def test_extract_all_data_reextracts_updated_documents(
+        self, mk_extract_article_txt
+    ):
+        mk_extract_article_txt.return_value = SAMPLES_XML_ARTICLE
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with utils.environ(SOURCE_PATH=tmpdir, CACHE_PATH=tmpdir):
+                documents = [
+                    ("S0036-36341997000100001", "2019-01-01"),
+                    ("S0036-36341997000100002", None),
+                ]
+                extracted.extract_all_data(documents)
+                extracted.extract_all_data(documents)
+                self.assertEqual(mk_extract_article_txt.call_count, 2)
+
+                extracted.extract_all_data(
+                    [
+                        ("S0036-36341997000100001", "2019-03-01"),
+                        ("S0036-36341997000100002", "2019-03-01"),
+                    ]
+                )
+                extracted.extract_all_data([("S0036-36341997000100001", "2019-03-01")])
+
+        self.assertEqual(
+            mk_extract_article_txt.call_args_list[2:],
+            [
+                call("S0036-36341997000100001", revalidate=True),
+                call("S0036-36341997000100002", revalidate=True),
+            ],
+        )
+
+    @patch("documentstore_migracao.processing.extracted.article.ext_article_txt")
+    def test_extract_all_data_force(self, mk_extract_article_txt):
+        mk_extract_article_txt.return_value = SAMPLES_XML_ARTICLE
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with utils.environ(SOURCE_PATH=tmpdir, CACHE_PATH=tmpdir):
                 extracted.extract_all_data(["S0036-36341997000100001"])
+                extracted.extract_all_data(["S0036-36341997000100001"], force=True)
+
+        self.assertEqual(
+            mk_extract_article_txt.call_args_list,
+            [
+                call("S0036-36341997000100001", revalidate=False),
+                call("S0036-36341997000100001", revalidate=True),
+            ],
+        )
+
+    @patch("documentstore_migracao.processing.extracted.article.ext_article_txt")
+    def test_extract_all_data_skips_duplicated_pids(self, mk_extract_article_txt):
+        mk_extract_article_txt.return_value = SAMPLES_XML_ARTICLE
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with utils.environ(SOURCE_PATH=tmpdir, CACHE_PATH=tmpdir):
+                extracted.extract_all_data(
+                    iter(["S0036-36341997000100001"] * 3), concurrency=2
+                )
+
+        mk_extract_article_txt.assert_called_once_with(
+            "S0036-36341997000100001", revalidate=False
+        )
+
+    @patch("documentstore_migracao.processing.extracted.extract_all_data")
+    @patch("documentstore_migracao.processing.extracted.article.iter_notXML_codes")
+    def test_extract_all_data_by_issn(self, mk_iter_notXML_codes, mk_extract_all_data):
+        mk_iter_notXML_codes.side_effect = lambda issn: iter(["%s-pid" % issn])
+        extracted_pids = []
+        mk_extract_all_data.side_effect = lambda pids, **kwargs: extracted_pids.extend(
+            pids
+        )
+
+        extracted.extract_all_data_by_issn(["1234-5678\n", "0036-3634"], 4)
+        mk_extract_all_data.assert_called_once_with(
+            ANY, concurrency=4, packed=False, force=False
+        )
+        self.assertEqual(extracted_pids, ["1234-5678-pid", "0036-3634-pid"])
+
+    @patch("documentstore_migracao.processing.extracted.article.ext_article_txt")
+    def test_extract_all_data_packed(self, mk_extract_article_txt):
+        mk_extract_article_txt.return_value = SAMPLES_XML_ARTICLE
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with utils.environ(
+                SOURCE_PATH=os.path.join(tmpdir, "source"),
+                SOURCE_PACK_PATH=tmpdir,
+                CACHE_PATH=tmpdir,
+            ):
+                extracted.extract_all_data(["S0036-36341997000100001"], packed=True)
+
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, "source")))
+            self.assertEqual(
+                list(packs.iter_documents(tmpdir)),
+                [("S0036-36341997000100001", SAMPLES_XML_ARTICLE.encode("utf-8"))],
+            )
+
+    @patch("documentstore_migracao.processing.extracted.journal.ext_journal")
+    @patch("documentstore_migracao.processing.extracted.journal.ext_identifiers")
+    def test_extract_metadata_journal(self, mk_ext_identifiers, mk_ext_journal):
+        mk_ext_identifiers.return_value = {
+            "objects": [{"code": "0036-3634"}, {"code": "0001-3714"}]
+        }
+        mk_ext_journal.side_effect = lambda issn: (
+            Journal(SAMPLES_JOURNAL) if issn == "0036-3634" else None
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "journals.jsonl")
+            count = extracted.extract_metadata("journal", output_path, concurrency=2)
+
+            self.assertEqual(count, 1)
+            self.assertEqual(reading.read_json_file(output_path), [SAMPLES_JOURNAL])
+
+    @patch("documentstore_migracao.processing.extracted.issue.ext_issue")
+    @patch("documentstore_migracao.processing.extracted.issue.ext_identifiers")
+    @patch("documentstore_migracao.processing.extracted.journal.ext_identifiers")
+    def test_extract_metadata_issue(
+        self, mk_journal_identifiers, mk_issue_identifiers, mk_ext_issue
+    ):
+        mk_journal_identifiers.return_value = {
+            "objects": [{"code": "0036-3634"}, {"code": "0001-3714"}]
+        }
+        mk_issue_identifiers.side_effect = lambda issn: {
+            "objects": [{"code": "%s-1" % issn}, {"code": "%s-2" % issn}]
+        }
+        mk_ext_issue.side_effect = lambda code: Issue({"issue": {"code": code}})
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "issues.jsonl")
+            extracted.extract_metadata("issue", output_path, concurrency=3)
+
+            self.assertEqual(
+                sorted(issue["code"] for issue in reading.read_json_file(output_path)),
+                ["0001-3714-1", "0001-3714-2", "0036-3634-1", "0036-3634-2"],
+            )
+
+    @patch("documentstore_migracao.processing.extracted.issue.ext_issue")
+    def test_extract_issue_logs_errors(self, mk_ext_issue):
+        mk_ext_issue.side_effect = request.HTTPGetError("Not Found")
+
+        with self.assertLogs("documentstore_migracao.processing.extracted") as log:
+            self.assertIsNone(extracted.extract_issue("0036-363419970001"))
+        self.assertIn("0036-363419970001", log.output[0])
+
+    @patch("documentstore_migracao.processing.extracted.article.ext_identifiers_page")
+    def test_iter_identifiers_fetches_remaining_pages_from_total(
+        self, mk_ext_identifiers_page
+    ):
+        mk_ext_identifiers_page.side_effect = lambda offset, limit, **filters: {
+            "meta": {"total": 5},
+            "objects": [{"code": str(i)} for i in range(offset, 5)][:limit],
+        }
+
+        result = extracted.iter_identifiers(concurrency=2, page_size=2, issn="1234")
+        self.assertEqual(sorted(i["code"] for i in result), ["0", "1", "2", "3", "4"])
+        self.assertEqual(
+            sorted(c[0][0] for c in mk_ext_identifiers_page.call_args_list), [0, 2, 4]
+        )
+        mk_ext_identifiers_page.assert_called_with(ANY, limit=2, issn="1234")
+
+    @patch("documentstore_migracao.processing.extracted.article.ext_identifiers_page")
+    def test_iter_identifiers_without_total(self, mk_ext_identifiers_page):
+        mk_ext_identifiers_page.side_effect = lambda offset, limit: {
+            "objects": [{"code": str(i)} for i in range(offset, min(offset + limit, 4))]
+        }
+
+        result = list(extracted.iter_identifiers(page_size=2))
+        self.assertEqual([i["code"] for i in result], ["0", "1", "2", "3"])
+        self.assertEqual(mk_ext_identifiers_page.call_count, 3)
+
+    @patch("documentstore_migracao.processing.extracted.iter_identifiers")
+    def test_discover_documents(self, mk_iter_identifiers):
+        mk_iter_identifiers.return_value = [
+            {"code": "S0036-36341997000100001", "processing_date": "2019-03-01"},
+            {"code": "S0036-36341997000100002"},
+        ]
 
-                self.assertTrue(os.path.exists("/tmp/S0036-36341997000100001.xml"))
-            finally:
-                os.remove("/tmp/S0036-36341997000100001.xml")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "pids.txt")
+            extracted.discover_documents(output_path, since="2019-01-01")
+
+            with open(output_path) as f:
+                self.assertEqual(
+                    f.read(),
+                    "S0036-36341997000100001 2019-03-01\nS0036-36341997000100002\n",
+                )
+            with open(output_path) as f:
+                self.assertEqual(
+                    list(pids.iter_pids(f)),
+                    ["S0036-36341997000100001", "S0036-36341997000100002"],
+                )
+
+        mk_iter_identifiers.assert_called_once_with(
+            concurrency=1, issn=None, until=ANY, **{"from": "2019-01-01"}
+        )
 
 
 class TestProcessingConversion(unittest.TestCase):
@@ -107,6 +335,193 @@ class TestProcessingConversion(unittest.TestCase):
                 len(mk_convert_article_xml.mock_calls), COUNT_SAMPLES_FILES
             )
 
+    @patch(
+        "documentstore_migracao.utils.scielo_ids_generator.generate_scielo_pid",
+        return_value="ZZZZZZZZZZZZZZZZZZZZZZZ",
+    )
+    def test_convert_article_from_bytes(self, mk_generate_scielo_pid):
+        with open(os.path.join(SAMPLES_PATH, "S0036-36341997000100001.xml"), "rb") as f:
+            content = f.read()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with utils.environ(CONVERSION_PATH=tmpdir):
+                xmltree, languages = conversion.convert_article(content)
+                self.assertEqual(os.listdir(tmpdir), [])
+
+                file_xml_path = conversion.convert_article_xml(
+                    os.path.join(SAMPLES_PATH, "S0036-36341997000100001.xml")
+                )
+                with open(file_xml_path, "rb") as f:
+                    converted = f.read()
+
+        self.assertEqual(languages, ["es"])
+        self.assertEqual(xmltree.getroot().get("specific-use"), "sps-1.9")
+        self.assertEqual(
+            conversion.convert_article(content, serialize=True), (converted, ["es"])
+        )
+
+    def test_convert_article_from_element(self):
+        obj_xml = xml.loadToXML(
+            os.path.join(SAMPLES_PATH, "S0036-36341997000100001.xml")
+        ).getroot()
+
+        result = conversion.convert_article(obj_xml, serialize=True, pretty=False)
+
+        self.assertEqual(result.languages, ["es"])
+        self.assertTrue(result.document.startswith(b"<?xml"))
+        self.assertIn(b"<!DOCTYPE article PUBLIC", result.document)
+        self.assertEqual(obj_xml.get("dtd-version"), "1.1")
+
+    def test_convert_article_ALLpacks(self):
+        with open(os.path.join(SAMPLES_PATH, "S0036-36341997000100001.xml")) as f:
+            content = f.read()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with packs.PackWriter(tmpdir, max_size=1024 ** 2) as writer:
+                writer.write("S0036-36341997000100001", content)
+
+            with utils.environ(SOURCE_PACK_PATH=tmpdir, CONVERSION_PATH=tmpdir):
+                conversion.convert_article_ALLpacks()
+
+            self.assertIn("S0036-36341997000100001.es.xml", os.listdir(tmpdir))
+
+    def test_convert_article_ALLxml_with_jobs(self):
+        names = ["S0036-36341997000100001.xml", "S0036-36341997000100002.xml"]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source_path = os.path.join(tmpdir, "source")
+            os.makedirs(source_path)
+            for name in names:
+                with open(os.path.join(SAMPLES_PATH, name)) as f:
+                    content = f.read()
+                with open(os.path.join(source_path, name), "w") as f:
+                    f.write(content)
+            with open(os.path.join(source_path, "invalid.xml"), "w") as f:
+                f.write("<article>")
+
+            with utils.environ(SOURCE_PATH=source_path, CONVERSION_PATH=tmpdir):
+                with self.assertLogs(
+                    "documentstore_migracao.processing.conversion", "ERROR"
+                ) as log:
+                    conversion.convert_article_ALLxml(jobs=2)
+
+            self.assertEqual(
+                sorted(f for f in os.listdir(tmpdir) if f.endswith(".xml")),
+                ["S0036-36341997000100001.es.xml", "S0036-36341997000100002.es.xml"],
+            )
+        self.assertEqual(len(log.records), 2)
+        self.assertEqual(log.records[0].getMessage(), "invalid.xml")
+        self.assertIn("XMLSyntaxError", log.records[1].getMessage())
+
+    def test_convert_job_returns_error(self):
+        result = conversion.convert_job(("missing", "/tmp/missing/file.xml"))
+        self.assertEqual(result.name, "missing")
+        self.assertIn("OSError", result.error)
+        self.assertIn("Traceback", result.traceback)
+
+    @patch("documentstore_migracao.processing.conversion.convert_article_xml")
+    def test_convert_all_logs_errors_in_order(self, mk_convert_article_xml):
+        mk_convert_article_xml.side_effect = [
+            KeyError("first"),
+            None,
+            KeyError("third"),
+        ]
+
+        with self.assertLogs("documentstore_migracao.processing.conversion") as log:
+            errors = conversion.convert_all(
+                [(name, "/tmp/%s" % name) for name in ("a.xml", "b.xml", "c.xml")]
+            )
+
+        self.assertEqual(errors, 2)
+        messages = [r.getMessage() for r in log.records if r.levelname == "ERROR"]
+        self.assertEqual(messages[0], "a.xml")
+        self.assertIn("KeyError: 'first'", messages[1])
+        self.assertEqual(messages[2], "c.xml")
+
+    def test_convert_all_saves_raw_bodies_from_workers(self):
+        names = ["S0036-36341997000100001.xml", "S0036-36341997000100002.xml"]
+        jobs = [(name, os.path.join(SAMPLES_PATH, name)) for name in names]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sink_path = os.path.join(tmpdir, "bodies")
+            with utils.environ(CONVERSION_PATH=tmpdir, RAW_BODY_SINK_PATH=sink_path):
+                conversion.convert_all(jobs, total=2, processes=2)
+
+            saved = sorted(pid for pid, _ in packs.iter_documents(sink_path))
+        self.assertEqual(
+            saved, ["S0036-36341997000100001-1", "S0036-36341997000100002-1"]
+        )
+
+    @patch("documentstore_migracao.processing.conversion.convert_article_xml")
+    def test_convert_all_incremental_skips_unchanged(self, mk_convert_article_xml):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source_path = os.path.join(tmpdir, "source")
+            conversion_path = os.path.join(tmpdir, "conversion")
+            os.makedirs(source_path)
+            os.makedirs(conversion_path)
+            jobs = []
+            for name in ("a.xml", "b.xml"):
+                with open(os.path.join(source_path, name), "w") as f:
+                    f.write("<article>%s</article>" % name)
+                jobs.append((name, os.path.join(source_path, name)))
+
+            def convert(path):
+                output = os.path.join(
+                    conversion_path, os.path.basename(path).replace(".xml", ".pt.xml")
+                )
+                open(output, "w").close()
+                return output
+
+            mk_convert_article_xml.side_effect = convert
+
+            def run(**kwargs):
+                mk_convert_article_xml.reset_mock()
+                conversion.convert_all(jobs, incremental=True, **kwargs)
+                return [c[0][0] for c in mk_convert_article_xml.call_args_list]
+
+            with utils.environ(CACHE_PATH=tmpdir, CONVERSION_PATH=conversion_path):
+                self.assertEqual(run(), [jobs[0][1], jobs[1][1]])
+                self.assertEqual(run(), [])
+
+                with open(jobs[1][1], "w") as f:
+                    f.write("<article>changed</article>")
+                self.assertEqual(run(), [jobs[1][1]])
+
+                os.remove(os.path.join(conversion_path, "a.pt.xml"))
+                self.assertEqual(run(), [jobs[0][1]])
+
+                self.assertEqual(run(force=True), [jobs[0][1], jobs[1][1]])
+
+                with patch(
+                    "documentstore_migracao.processing.conversion.converter_fingerprint",
+                    return_value="other",
+                ):
+                    self.assertEqual(run(), [jobs[0][1], jobs[1][1]])
+
+    def test_converter_fingerprint(self):
+        fingerprint = conversion.converter_fingerprint()
+        self.assertEqual(fingerprint, conversion.converter_fingerprint())
+        self.assertEqual(len(fingerprint), 40)
+
+    def test_convert_all_writes_pipes_profile(self):
+        source = os.path.join(SAMPLES_PATH, "S0036-36341997000100001.xml")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            profile_path = os.path.join(tmpdir, "pipes.json")
+            with utils.environ(CONVERSION_PATH=tmpdir):
+                errors = conversion.convert_all(
+                    [("S0036-36341997000100001.xml", source)], profile_path=profile_path
+                )
+            with open(profile_path) as f:
+                report = json.load(f)
+
+        self.assertEqual(errors, 0)
+        self.assertEqual(report["documents"], 1)
+        pipes = {pipe["pipe"]: pipe for pipe in report["pipes"]}
+        self.assertIn("HTML2SPSPipeline.PPipe", pipes)
+        self.assertIn("DataSanitizationPipeline.TableinP", pipes)
+        self.assertEqual(
+            pipes["HTML2SPSPipeline.PPipe"]["slowest"][0]["document"],
+            "S0036-36341997000100001.xml",
+        )
+
     @patch("documentstore_migracao.processing.conversion.convert_article_xml")
     def test_convert_article_ALLxml_with_exception(self, mk_convert_article_xml):
 
@@ -133,6 +548,18 @@ class TestReadingJournals(unittest.TestCase):
 
         self.assertEqual(len(data), 3)
 
+    def test_should_load_json_lines_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "title.jsonl")
+            with open(file_path, "w") as f:
+                f.write('{"v100": [{"_": "first"}]}\n\n{"v100": [{"_": "second"}]}\n')
+
+            data = reading.read_json_file(file_path)
+
+        self.assertEqual(
+            [journal["v100"][0]["_"] for journal in data], ["first", "second"]
+        )
+
 
 class TestConversionJournalJson(unittest.TestCase):
     def setUp(self):
@@ -249,3 +676,122 @@ class TestProcessingValidation(unittest.TestCase):
             },
             result,
         )
+
+    @patch("documentstore_migracao.processing.validation.get_dtd")
+    @patch("documentstore_migracao.processing.validation.XMLValidator")
+    def test_validate_article_xml_tree(self, mk_xmlvalidator, mk_get_dtd):
+        mk_xmlvalidator.parse.return_value.validate.return_value = (True, [])
+        xmltree = etree.ElementTree(etree.XML("<article/>"))
+        xml.set_doctype(xmltree)
+
+        result = validation.validate_article_xml(xmltree, False, filename="a.xml")
+
+        self.assertEqual(result, {})
+        mk_get_dtd.assert_called_once_with(
+            "-//NLM//DTD JATS (Z39.96) Journal Publishing DTD v1.1 20151215//EN"
+        )
+        mk_xmlvalidator.parse.assert_called_once_with(
+            xmltree, dtd=mk_get_dtd.return_value
+        )
+
+
+@patch("documentstore_migracao.processing.packing.pack_article_xmltree")
+@patch("documentstore_migracao.processing.validation.validate_article_xml")
+class TestProcessingFused(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.paths = {}
+        for name in ("CONVERSION_PATH", "VALID_XML_PATH", "XML_ERRORS_PATH"):
+            self.paths[name] = os.path.join(self.tmpdir.name, name)
+            os.makedirs(self.paths[name])
+        self.xmltree = xml.loadToXML(
+            os.path.join(SAMPLES_PATH, "S0036-36341997000100001.xml")
+        )
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def listdir(self, name):
+        return os.listdir(self.paths[name])
+
+    def test_process_article_xmltree(self, mk_validate, mk_pack):
+        mk_validate.return_value = {}
+        with utils.environ(**self.paths):
+            result = fused.process_article_xmltree(
+                self.xmltree, "S0036-36341997000100001"
+            )
+
+        self.assertEqual(result, mk_pack.return_value)
+        xmltree = mk_validate.call_args[0][0]
+        self.assertEqual(xmltree.getroot().get("specific-use"), "sps-1.9")
+        self.assertTrue(xmltree.docinfo.public_id.startswith("-//NLM//DTD JATS"))
+        mk_validate.assert_called_once_with(
+            xmltree, False, filename="S0036-36341997000100001.es.xml"
+        )
+        mk_pack.assert_called_once_with(
+            xmltree, "S0036-36341997000100001", "S0036-36341997000100001.es.xml"
+        )
+        for name in self.paths:
+            self.assertEqual(self.listdir(name), [])
+
+    def test_process_article_xmltree_keep_files(self, mk_validate, mk_pack):
+        mk_validate.return_value = {}
+        with utils.environ(**self.paths):
+            fused.process_article_xmltree(
+                self.xmltree, "S0036-36341997000100001", keep_files=True
+            )
+
+        for name in ("CONVERSION_PATH", "VALID_XML_PATH"):
+            self.assertEqual(self.listdir(name), ["S0036-36341997000100001.es.xml"])
+        valid_path = self.paths["VALID_XML_PATH"]
+        with open(os.path.join(valid_path, "S0036-36341997000100001.es.xml")) as f:
+            self.assertIn("<!DOCTYPE article PUBLIC", f.read())
+
+    def test_process_article_xmltree_writes_errors(self, mk_validate, mk_pack):
+        errors = {
+            "some error": {
+                "count": 1,
+                "lineno": [10],
+                "message": ["some error"],
+                "filename": {"S0036-36341997000100001.es.xml"},
+            }
+        }
+        mk_validate.return_value = errors
+        with utils.environ(**self.paths):
+            result = fused.process_article_xmltree(
+                self.xmltree, "S0036-36341997000100001"
+            )
+
+        self.assertIsNone(result)
+        mk_pack.assert_not_called()
+        self.assertEqual(mk_validate.call_count, 2)
+        content = mk_validate.call_args[0][0].getvalue()
+        self.assertTrue(content.startswith(b"<?xml"))
+        self.assertEqual(self.listdir("VALID_XML_PATH"), [])
+        errors_path = self.paths["XML_ERRORS_PATH"]
+        with open(os.path.join(errors_path, "S0036-36341997000100001.err")) as f:
+            err = f.read()
+        self.assertTrue(err.startswith(content.decode("utf-8")))
+        self.assertIn("some error", err)
+
+    def test_process_article_ALLpacks(self, mk_validate, mk_pack):
+        mk_validate.return_value = {}
+        with open(os.path.join(SAMPLES_PATH, "S0036-36341997000100001.xml")) as f:
+            content = f.read()
+        source_pack_path = os.path.join(self.tmpdir.name, "packs")
+        with packs.PackWriter(source_pack_path, max_size=1024 ** 2) as writer:
+            writer.write("S0036-36341997000100001", content)
+            writer.write("invalid", "<article>")
+
+        with utils.environ(SOURCE_PACK_PATH=source_pack_path, **self.paths):
+            with self.assertLogs(
+                "documentstore_migracao.processing.conversion", "ERROR"
+            ) as log:
+                errors = fused.process_article_ALLpacks()
+
+        self.assertEqual(errors, 1)
+        self.assertEqual(log.records[0].getMessage(), "invalid")
+        mk_pack.assert_called_once_with(
+            ANY, "S0036-36341997000100001", "S0036-36341997000100001.es.xml"
+        )
+        self.assertEqual(self.listdir("CONVERSION_PATH"), [])
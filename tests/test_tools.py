@@ -3,8 +3,13 @@ import unittest
 from unittest.mock import patch, ANY
 
 from documentstore_migracao.main.tools import tools_parser
-from documentstore_migracao.tools import generation, constructor
-from . import utils, SAMPLES_PATH, COUNT_SAMPLES_FILES
+import json
+import tempfile
+
+import requests
+
+from documentstore_migracao.tools import generation, constructor, replay, benchmark
+from . import utils, SAMPLES_PATH, COUNT_SAMPLES_FILES, SAMPLES_JOURNAL
 
 
 class TestMainTools(unittest.TestCase):
@@ -22,6 +27,76 @@ class TestMainTools(unittest.TestCase):
             tools_parser(["construction"])
             mk_article_ALL_constructor.assert_called_once_with("/tmp", "/tmp")
 
+    @patch("documentstore_migracao.tools.benchmark.run_extraction_benchmark")
+    @patch("documentstore_migracao.tools.replay.create_server")
+    def test_arg_benchmark(self, mk_create_server, mk_run_extraction_benchmark):
+        mk_run_extraction_benchmark.return_value = {
+            "documents": 10,
+            "extracted": 10,
+            "concurrency": 4,
+            "elapsed": 1.0,
+            "docs_per_sec": 10.0,
+            "latency_p50": 0.01,
+            "latency_p99": 0.02,
+            "requests": 11,
+            "retries": 1,
+            "errors": 1,
+        }
+
+        tools_parser(
+            [
+                "benchmark",
+                "--samples",
+                SAMPLES_PATH,
+                "--documents",
+                "10",
+                "--concurrency",
+                "4",
+                "--error-rate",
+                "0.1",
+            ]
+        )
+        mk_create_server.assert_called_once_with(
+            SAMPLES_PATH, latency=0.05, jitter=0.0, error_rate=0.1, seed=0
+        )
+        mk_run_extraction_benchmark.assert_called_once_with(
+            mk_create_server.return_value, 10, concurrency=4
+        )
+        mk_create_server.return_value.stop.assert_called_once_with()
+
+    @patch("documentstore_migracao.tools.benchmark.run_conversion_benchmark")
+    def test_arg_benchmark_conversion(self, mk_run_conversion_benchmark):
+        report = {
+            "cases": [
+                {"document": "a.xml", "kind": "convert", "ms": 30.0, "peak_kb": 1.0}
+            ],
+            "errors": [],
+            "throughput": {},
+            "max_rss_kb": 1,
+        }
+        mk_run_conversion_benchmark.return_value = report
+        with tempfile.TemporaryDirectory() as tmpdir:
+            baseline_path = os.path.join(tmpdir, "baseline.json")
+            benchmark.write_report(
+                baseline_path, dict(report, cases=[dict(report["cases"][0], ms=10.0)])
+            )
+            result = tools_parser(
+                [
+                    "benchmark-conversion",
+                    "--samples",
+                    SAMPLES_PATH,
+                    "--scale",
+                    "10",
+                    "--baseline",
+                    baseline_path,
+                ]
+            )
+
+        mk_run_conversion_benchmark.assert_called_once_with(
+            SAMPLES_PATH, scale=10, repeat=3
+        )
+        self.assertEqual(result, 1)
+
 
 class TestProcessingConstructor(unittest.TestCase):
     @patch("documentstore_migracao.tools.constructor.xml.objXML2file")
@@ -95,3 +170,103 @@ class TestProcessingGeneration(unittest.TestCase):
         with self.assertRaises(SystemExit) as cm:
             tools_parser([])
             self.assertEqual("Vc deve escolher algum parametro", str(cm.exception))
+
+
+class TestToolsReplay(unittest.TestCase):
+    def setUp(self):
+        records = replay.load_samples(SAMPLES_PATH)
+        records["journal"]["journal"] = (
+            "application/json",
+            json.dumps([SAMPLES_JOURNAL]).encode("utf-8"),
+        )
+        self.server = replay.ReplayServer(("127.0.0.1", 0), records, seed=1)
+        self.server.start()
+        self.session = requests.Session()
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_serves_recorded_article(self):
+        response = self.session.get(
+            self.server.url + "/api/v1/article",
+            params={"code": "S0036-36341997000100001"},
+        )
+        self.assertEqual(response.status_code, 200)
+        with open(os.path.join(SAMPLES_PATH, "S0036-36341997000100001.xml")) as f:
+            self.assertEqual(response.text, f.read())
+
+    def test_serves_any_pid_from_samples(self):
+        url = self.server.url + "/api/v1/article"
+        first = self.session.get(url, params={"code": "S0000-00000000000000001"})
+        second = self.session.get(url, params={"code": "S0000-00000000000000001"})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(self.server.retries, 1)
+
+    def test_serves_journal(self):
+        response = self.session.get(
+            self.server.url + "/api/v1/journal", params={"issn": "0036-3634"}
+        )
+        self.assertEqual(response.json(), [SAMPLES_JOURNAL])
+
+    def test_unknown_endpoint(self):
+        response = self.session.get(self.server.url + "/api/v1/collection")
+        self.assertEqual(response.status_code, 404)
+
+    def test_error_injection(self):
+        self.server.error_rate = 1.0
+        response = self.session.get(
+            self.server.url + "/api/v1/article", params={"code": "S0036"}
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.server.errors, 1)
+
+
+class TestToolsBenchmark(unittest.TestCase):
+    def test_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(benchmark.percentile(values, 50), 50.0)
+        self.assertEqual(benchmark.percentile(values, 99), 99.0)
+        self.assertEqual(benchmark.percentile([], 99), 0.0)
+
+    def test_run_extraction_benchmark(self):
+        server = replay.create_server(SAMPLES_PATH, seed=1)
+        server.start()
+        try:
+            report = benchmark.run_extraction_benchmark(server, 5, concurrency=2)
+        finally:
+            server.stop()
+
+        self.assertEqual(report["extracted"], 5)
+        self.assertEqual(report["requests"], 5)
+        self.assertEqual(report["retries"], 0)
+        self.assertGreater(report["docs_per_sec"], 0)
+        self.assertGreater(report["latency_p99"], 0)
+
+    def test_run_conversion_benchmark(self):
+        report = benchmark.run_conversion_benchmark(SAMPLES_PATH, scale=20, repeat=1)
+
+        cases = {case["document"]: case for case in report["cases"]}
+        self.assertEqual(cases["S0036-36341997000100001.xml"]["kind"], "convert")
+        self.assertEqual(cases["S0036-36341997000100001.xml#body1"]["kind"], "deploy")
+        self.assertEqual(cases["synthetic-table"]["kind"], "synthetic")
+        self.assertIn("any.xml", report["errors"])
+        self.assertGreater(report["throughput"]["convert"]["docs_per_sec"], 0)
+        self.assertGreater(cases["synthetic-anchors"]["peak_kb"], 0)
+        self.assertEqual(benchmark.compare_with_baseline(report, report), [])
+
+    def test_compare_with_baseline(self):
+        baseline = {
+            "cases": [{"document": "a", "ms": 10.0}, {"document": "b", "ms": 10.0}]
+        }
+        report = {
+            "cases": [
+                {"document": "a", "ms": 11.0},
+                {"document": "b", "ms": 15.0},
+                {"document": "c", "ms": 50.0},
+            ]
+        }
+        regressions = benchmark.compare_with_baseline(report, baseline, 0.2)
+        self.assertEqual([r["document"] for r in regressions], ["b"])
+        self.assertEqual(regressions[0]["ratio"], 1.5)
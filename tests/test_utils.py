@@ -1,12 +1,35 @@
 import os
+import gzip
+import json
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
+import requests
 from requests.exceptions import HTTPError
 from unittest.mock import patch, MagicMock
 from lxml import etree
 
-from documentstore_migracao.utils import files, xml, request, dicts, string
-
-from . import SAMPLES_PATH, COUNT_SAMPLES_FILES
+from documentstore_migracao.utils import (
+    files,
+    xml,
+    request,
+    request_cache,
+    checkpoint,
+    dicts,
+    string,
+    threads,
+    pids,
+    packs,
+    throttle,
+    metrics,
+    profiling,
+    body_sink,
+)
+from documentstore_migracao.utils.convert_html_body import HTML2SPSPipeline
+
+from . import SAMPLES_PATH, COUNT_SAMPLES_FILES, utils
 
 
 class TestUtilsFiles(unittest.TestCase):
@@ -93,6 +116,85 @@ class TestUtilsFiles(unittest.TestCase):
         self.assertEqual("efaa1e0fc26b5b5266be343526434a67c8aca530", str_hash)
 
 
+class TestUtilsCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "stages", "extract.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_register_and_lookup(self):
+        with checkpoint.StageStore(self.path) as stages:
+            stages.register("S0036-36341997000100001")
+            self.assertIn("S0036-36341997000100001", stages)
+            self.assertNotIn("S0036-36341997000100002", stages)
+
+    def test_registers_are_committed_in_batches(self):
+        stages = checkpoint.StageStore(self.path, batch_size=2)
+        reader = checkpoint.StageStore(self.path)
+        try:
+            stages.register("a")
+            self.assertNotIn("a", reader)
+            stages.register("b")
+            self.assertIn("a", reader)
+            self.assertIn("b", reader)
+        finally:
+            stages.close()
+            reader.close()
+
+    def test_registers_are_persisted_on_close(self):
+        with checkpoint.StageStore(self.path) as stages:
+            stages.register("a")
+            stages.register("a")
+
+        with checkpoint.StageStore(self.path) as stages:
+            self.assertIn("a", stages)
+            self.assertEqual(len(stages), 1)
+
+    def test_register_values(self):
+        with checkpoint.StageStore(self.path) as stages:
+            stages.register("a", "1")
+            self.assertEqual(stages.get("a"), "1")
+            stages.register("a", "2")
+
+        with checkpoint.StageStore(self.path) as stages:
+            self.assertEqual(stages.get("a"), "2")
+            self.assertIsNone(stages.get("b"))
+            self.assertEqual(len(stages), 1)
+
+    def test_adds_value_column_to_existing_store(self):
+        os.makedirs(os.path.dirname(self.path))
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE stages (stage_id TEXT PRIMARY KEY) WITHOUT ROWID")
+        conn.execute("INSERT INTO stages VALUES ('a')")
+        conn.commit()
+        conn.close()
+
+        with checkpoint.StageStore(self.path) as stages:
+            self.assertIn("a", stages)
+            self.assertIsNone(stages.get("a"))
+            stages.register("b", "1")
+        with checkpoint.StageStore(self.path) as stages:
+            self.assertEqual(stages.get("b"), "1")
+
+    def test_concurrent_writers(self):
+        with checkpoint.StageStore(self.path, batch_size=10) as stages:
+            list(
+                threads.bounded_map(
+                    lambda i: stages.register(str(i)), range(1000), max_workers=8
+                )
+            )
+            self.assertEqual(len(stages), 1000)
+
+    def test_open_stage_store_uses_cache_path(self):
+        with utils.environ(CACHE_PATH=self.tmpdir.name):
+            with checkpoint.open_stage_store("extract") as stages:
+                self.assertEqual(
+                    stages.path, os.path.join(self.tmpdir.name, "extract.db")
+                )
+
+
 class TestUtilsXML(unittest.TestCase):
     def test_str2objXML(self):
 
@@ -107,6 +209,18 @@ class TestUtilsXML(unittest.TestCase):
         obj = xml.file2objXML(file_path)
         self.assertIn(expected_text, str(etree.tostring(obj)))
 
+    def test_set_doctype(self):
+        obj = etree.ElementTree(xml.str2objXML("<article/>"))
+        xml.set_doctype(obj)
+        self.assertEqual(
+            obj.docinfo.public_id,
+            "-//NLM//DTD JATS (Z39.96) Journal Publishing DTD v1.1 20151215//EN",
+        )
+        self.assertEqual(
+            obj.docinfo.system_url,
+            "https://jats.nlm.nih.gov/publishing/1.1/JATS-journalpublishing1.dtd",
+        )
+
     def test_file2objXML_raise_OSError_for_filenotfound(self):
         file_path = os.path.join(SAMPLES_PATH, "none.xml")
         with self.assertRaises(OSError):
@@ -117,24 +231,318 @@ class TestUtilsXML(unittest.TestCase):
         with self.assertRaises(etree.XMLSyntaxError):
             xml.file2objXML(file_path)
 
+    def test_parsers_are_reused_by_thread(self):
+        html_parser, xml_parser = xml.get_html_parser(), xml.get_xml_parser()
+        self.assertIs(xml.get_html_parser(), html_parser)
+        self.assertIs(xml.get_xml_parser(), xml_parser)
+
+        other = []
+        thread = threading.Thread(
+            target=lambda: other.extend([xml.get_html_parser(), xml.get_xml_parser()])
+        )
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], html_parser)
+        self.assertIsNot(other[1], xml_parser)
+
 
 class TestUtilsRequest(unittest.TestCase):
-    @patch("documentstore_migracao.utils.request.requests")
-    def test_get(self, mk_requests):
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get(self, mk_get_session):
 
-        expected = {"params": {"collection": "spa"}}
+        expected = {"params": {"collection": "spa"}, "timeout": 10}
         request.get("http://api.test.com", **expected)
-        mk_requests.get.assert_called_once_with("http://api.test.com", **expected)
+        mk_get_session.return_value.get.assert_called_once_with(
+            "http://api.test.com", **expected
+        )
+
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_uses_default_timeout(self, mk_get_session):
+
+        with utils.environ(REQUEST_TIMEOUT="5"):
+            request.get("http://api.test.com")
+        mk_get_session.return_value.get.assert_called_once_with(
+            "http://api.test.com", timeout=5.0
+        )
 
-    @patch("documentstore_migracao.utils.request.requests")
-    def test_get_raises_exception_if_requests_exception(self, mk_requests):
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_raises_exception_if_requests_exception(self, mk_get_session):
         mk_response = MagicMock()
         mk_response.raise_for_status.side_effect = HTTPError
-        mk_requests.get.return_value = mk_response
+        mk_get_session.return_value.get.return_value = mk_response
         self.assertRaises(
             request.HTTPGetError, request.get, "http://api.test.com", **{}
         )
 
+    def test_create_session_mounts_pooled_adapter(self):
+        session = request.create_session(pool_size=7, retries=2, backoff_factor=0.1)
+        adapter = session.get_adapter("http://api.test.com")
+
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertEqual(adapter.max_retries.backoff_factor, 0.1)
+        self.assertIs(adapter, session.get_adapter("https://api.test.com"))
+
+    def test_get_session_is_shared(self):
+        self.assertIs(request.get_session(), request.get_session())
+
+    def test_get_session_publishes_both_sessions_together(self):
+        create_session = request.create_session
+
+        def slow_create_session(**kwargs):
+            time.sleep(0.1)
+            return create_session(**kwargs)
+
+        sessions = []
+        with patch.object(request, "_session", None), patch.object(
+            request, "_throttled_session", None
+        ), patch.object(request, "create_session", slow_create_session):
+            worker = threading.Thread(
+                target=lambda: sessions.append(request.get_session(True))
+            )
+            worker.start()
+            # a primeira sessão já foi criada e a segunda ainda não
+            time.sleep(0.15)
+            sessions.append(request.get_session(True))
+            worker.join()
+
+        self.assertIsNotNone(sessions[0])
+        self.assertIs(sessions[0], sessions[1])
+
+    def test_ensure_pool_size_recreates_smaller_session(self):
+        with utils.environ(REQUEST_POOL_SIZE="2"):
+            session = request.configure()
+            request.ensure_pool_size(5)
+            self.assertIsNot(session, request.get_session())
+            self.assertEqual(
+                request.get_session().get_adapter("http://a")._pool_maxsize, 5
+            )
+            session = request.get_session()
+            request.ensure_pool_size(3)
+            self.assertIs(session, request.get_session())
+
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_raises_exception_with_status_code(self, mk_get_session):
+        mk_get_session.return_value.get.return_value = make_response(status_code=404)
+        with self.assertRaises(request.HTTPGetError) as exc:
+            request.get("http://api.test.com")
+        self.assertEqual(exc.exception.status_code, 404)
+
+    @patch("documentstore_migracao.utils.request.get_throttle")
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_throttled_reports_overload(self, mk_get_session, mk_get_throttle):
+        mk_get_throttle.return_value = throttle.Throttle(
+            throttle.AdaptiveLimiter(initial_limit=4, max_limit=8, latency_target=60),
+            throttle.CircuitBreaker(failure_threshold=1, reset_timeout=60, max_wait=0),
+        )
+        mk_get_session.return_value.get.return_value = make_response(status_code=429)
+
+        with self.assertRaises(request.HTTPGetError):
+            request.get("http://api.test.com", throttled=True)
+        self.assertEqual(mk_get_throttle.return_value.limiter.limit, 2)
+
+        with self.assertRaises(request.HTTPGetError):
+            request.get("http://api.test.com", throttled=True)
+        mk_get_session.return_value.get.assert_called_once()
+
+    def test_throttled_session_has_no_retries(self):
+        with utils.environ(REQUEST_RETRIES="3"):
+            request.configure()
+            self.assertEqual(
+                request.get_session().get_adapter("http://a").max_retries.total, 3
+            )
+            self.assertEqual(
+                request.get_session(True).get_adapter("http://a").max_retries.total, 0
+            )
+
+    @patch("documentstore_migracao.utils.request.get_throttle")
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_throttled_retries_through_throttle(
+        self, mk_get_session, mk_get_throttle
+    ):
+        mk_get_throttle.return_value = throttle.Throttle(
+            throttle.AdaptiveLimiter(initial_limit=4, max_limit=8, latency_target=60),
+            throttle.CircuitBreaker(failure_threshold=5, reset_timeout=60, max_wait=0),
+        )
+        mk_get_session.return_value.get.side_effect = [
+            make_response(status_code=503),
+            make_response(),
+        ]
+
+        with utils.environ(REQUEST_RETRIES="3", REQUEST_BACKOFF_FACTOR="0"):
+            response = request.get("http://api.test.com", throttled=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mk_get_session.return_value.get.call_count, 2)
+        mk_get_session.assert_called_with(True)
+        self.assertEqual(mk_get_throttle.return_value.limiter.limit, 2)
+
+    @patch("documentstore_migracao.utils.request.get_throttle")
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_throttled_retries_wait_for_breaker(
+        self, mk_get_session, mk_get_throttle
+    ):
+        mk_get_throttle.return_value = throttle.Throttle(
+            throttle.AdaptiveLimiter(initial_limit=4, max_limit=8, latency_target=60),
+            throttle.CircuitBreaker(failure_threshold=2, reset_timeout=60, max_wait=0),
+        )
+        mk_get_session.return_value.get.side_effect = requests.exceptions.ConnectTimeout
+
+        with utils.environ(REQUEST_RETRIES="3", REQUEST_BACKOFF_FACTOR="0"):
+            with self.assertRaises(request.HTTPGetError):
+                request.get("http://api.test.com", throttled=True)
+
+        self.assertEqual(mk_get_session.return_value.get.call_count, 2)
+        self.assertEqual(mk_get_throttle.return_value.breaker.state, "open")
+
+    @patch("documentstore_migracao.utils.request.time.sleep")
+    @patch("documentstore_migracao.utils.request.get_throttle")
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_throttled_retries_too_many_requests(
+        self, mk_get_session, mk_get_throttle, mk_sleep
+    ):
+        mk_get_throttle.return_value = throttle.Throttle(
+            throttle.AdaptiveLimiter(initial_limit=4, max_limit=8, latency_target=60),
+            throttle.CircuitBreaker(failure_threshold=5, reset_timeout=60, max_wait=0),
+        )
+        mk_get_session.return_value.get.side_effect = [
+            make_response(status_code=429, headers={"Retry-After": "7"}),
+            make_response(status_code=429),
+            make_response(),
+        ]
+
+        with utils.environ(REQUEST_RETRIES="3", REQUEST_BACKOFF_FACTOR="0.5"):
+            response = request.get("http://api.test.com", throttled=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mk_get_session.return_value.get.call_count, 3)
+        self.assertEqual([call[0][0] for call in mk_sleep.call_args_list], [7.0, 1.0])
+
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_records_metrics(self, mk_get_session):
+        response = make_response(content=b"12345")
+        response.raw = MagicMock()
+        response.raw.retries.history = ("first", "second")
+        mk_get_session.return_value.get.return_value = response
+
+        with patch.object(request.metrics, "registry", metrics.Metrics()) as registry:
+            request.get("http://api.test.com")
+
+        self.assertEqual(registry.counters["request.status.200"], 1)
+        self.assertEqual(registry.counters["request.bytes"], 5)
+        self.assertEqual(registry.counters["request.retries"], 2)
+        self.assertEqual(registry.histograms["request.latency"].count, 1)
+
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_records_request_errors(self, mk_get_session):
+        mk_get_session.return_value.get.side_effect = requests.exceptions.ReadTimeout
+
+        with patch.object(request.metrics, "registry", metrics.Metrics()) as registry:
+            with self.assertRaises(requests.exceptions.ReadTimeout):
+                request.get("http://api.test.com")
+
+        self.assertEqual(registry.counters["request.errors.ReadTimeout"], 1)
+        self.assertEqual(registry.histograms["request.latency"].count, 1)
+
+
+def make_response(content=b"<article/>", status_code=200, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = "http://api.test.com/article"
+    response.headers.update(headers or {})
+    response.encoding = "utf-8"
+    response._content = content
+    return response
+
+
+class TestUtilsRequestCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.params = {"params": {"code": "S0036-36341997000100001"}, "cached": True}
+
+    def tearDown(self):
+        request.disable_cache()
+        self.tmpdir.cleanup()
+
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_without_cache_enabled_does_not_store(self, mk_get_session):
+        mk_get_session.return_value.get.return_value = make_response()
+        request.get("http://api.test.com/article", **self.params)
+        request.get("http://api.test.com/article", **self.params)
+        self.assertEqual(mk_get_session.return_value.get.call_count, 2)
+
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_serves_fresh_entries_locally(self, mk_get_session):
+        mk_get_session.return_value.get.return_value = make_response()
+        request.enable_cache(path=self.tmpdir.name, max_size=1024, max_age=60)
+
+        request.get("http://api.test.com/article", **self.params)
+        result = request.get("http://api.test.com/article", **self.params)
+
+        self.assertEqual(mk_get_session.return_value.get.call_count, 1)
+        self.assertEqual(result.text, "<article/>")
+
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_sends_conditional_request_for_stale_entries(self, mk_get_session):
+        mk_get = mk_get_session.return_value.get
+        mk_get.side_effect = [
+            make_response(headers={"ETag": '"abc"'}),
+            make_response(content=b"", status_code=304),
+        ]
+        request.enable_cache(path=self.tmpdir.name, max_size=1024, max_age=0)
+
+        request.get("http://api.test.com/article", **self.params)
+        result = request.get("http://api.test.com/article", **self.params)
+
+        self.assertEqual(mk_get.call_args[1]["headers"], {"If-None-Match": '"abc"'})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.content, b"<article/>")
+
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_revalidates_fresh_entries(self, mk_get_session):
+        mk_get = mk_get_session.return_value.get
+        mk_get.side_effect = [
+            make_response(headers={"ETag": '"abc"'}),
+            make_response(content=b"<article>new</article>"),
+        ]
+        request.enable_cache(path=self.tmpdir.name, max_size=1024, max_age=60)
+
+        request.get("http://api.test.com/article", **self.params)
+        result = request.get(
+            "http://api.test.com/article", revalidate=True, **self.params
+        )
+
+        self.assertEqual(mk_get.call_args[1]["headers"], {"If-None-Match": '"abc"'})
+        self.assertEqual(result.content, b"<article>new</article>")
+
+    @patch("documentstore_migracao.utils.request.get_session")
+    def test_get_does_not_cache_errors(self, mk_get_session):
+        mk_get_session.return_value.get.return_value = make_response(status_code=404)
+        cache = request.enable_cache(path=self.tmpdir.name, max_size=1024)
+
+        with self.assertRaises(request.HTTPGetError):
+            request.get("http://api.test.com/article", **self.params)
+        self.assertEqual(len(cache), 0)
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = request_cache.ResponseCache(self.tmpdir.name, max_size=25)
+        for key in ("a" * 40, "b" * 40, "c" * 40):
+            cache.store(key, make_response(content=b"0123456789"))
+            if key.startswith("b"):
+                cache.get("a" * 40)
+
+        self.assertIsNotNone(cache.get("a" * 40))
+        self.assertIsNone(cache.get("b" * 40))
+        self.assertEqual(cache.size, 20)
+
+    def test_cache_reloads_entries_from_disk(self):
+        cache = request_cache.ResponseCache(self.tmpdir.name, max_size=1024)
+        cache.store(cache.key("http://api.test.com", {"a": 1}), make_response())
+
+        cache = request_cache.ResponseCache(self.tmpdir.name, max_size=1024)
+        meta, body = cache.get(cache.key("http://api.test.com", {"a": 1}))
+        self.assertEqual(body, b"<article/>")
+
 
 class TestUtilsDicts(unittest.TestCase):
     def test_merge(self):
@@ -158,3 +566,341 @@ class TestUtilsStrings(unittest.TestCase):
         self.assertEqual(
             string.remove_spaces("MUITO    ESPACO   PALAVRA"), "MUITO ESPACO PALAVRA"
         )
+
+
+class TestUtilsThreads(unittest.TestCase):
+    def test_bounded_map(self):
+        result = threads.bounded_map(lambda x: x * 2, range(10), 3)
+        self.assertEqual(sorted(result), [(i, i * 2) for i in range(10)])
+
+    def test_bounded_map_propagates_exceptions(self):
+        def func(x):
+            raise ValueError(x)
+
+        with self.assertRaises(ValueError):
+            list(threads.bounded_map(func, range(3), 2))
+
+
+class TestUtilsPids(unittest.TestCase):
+    def test_open_pids_file_gzip(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "pids.txt.gz")
+            with gzip.open(path, "wt") as f:
+                f.write("S0021-25712009000400001\nS0021-25712009000400002\n")
+
+            with pids.open_pids_file(path) as f:
+                self.assertEqual(
+                    list(pids.iter_pids(f)),
+                    ["S0021-25712009000400001", "S0021-25712009000400002"],
+                )
+
+    def test_iter_pids_skips_blank_lines(self):
+        lines = ["S0021-25712009000400001\n", "\n", "  S0021-25712009000400002  "]
+        self.assertEqual(
+            list(pids.iter_pids(lines)),
+            ["S0021-25712009000400001", "S0021-25712009000400002"],
+        )
+
+    def test_iter_pids_shards_are_disjoint_partitions(self):
+        lines = ["S0021-257120090004%05d" % i for i in range(100)]
+        shards = [list(pids.iter_pids(lines, shard=(i, 3))) for i in range(3)]
+
+        self.assertEqual(sorted(sum(shards, [])), lines)
+        for shard in shards:
+            self.assertTrue(shard)
+
+    def test_iter_pids_reads_first_column(self):
+        lines = ["S0021-25712009000400001 2019-03-01\n", "S0021-25712009000400002"]
+        self.assertEqual(
+            list(pids.iter_pids(lines)),
+            ["S0021-25712009000400001", "S0021-25712009000400002"],
+        )
+
+    def test_iter_pids_with_dates(self):
+        lines = ["S0021-25712009000400001 2019-03-01\n", "S0021-25712009000400002"]
+        self.assertEqual(
+            list(pids.iter_pids_with_dates(lines)),
+            [
+                ("S0021-25712009000400001", "2019-03-01"),
+                ("S0021-25712009000400002", None),
+            ],
+        )
+
+    def test_parse_shard(self):
+        self.assertEqual(pids.parse_shard("1/4"), (1, 4))
+
+    def test_parse_shard_invalid(self):
+        for value in ("4/4", "-1/4", "1", "a/b"):
+            with self.assertRaises(ValueError):
+                pids.parse_shard(value)
+
+
+class TestUtilsPacks(unittest.TestCase):
+    def test_write_and_iter_documents(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with packs.PackWriter(tmpdir, max_size=1024) as writer:
+                writer.write("S0021-25712009000400001", "<article>1</article>")
+                writer.write("S0021-25712009000400002", "<article>2</article>")
+
+            self.assertEqual(
+                list(packs.iter_documents(tmpdir)),
+                [
+                    ("S0021-25712009000400001", b"<article>1</article>"),
+                    ("S0021-25712009000400002", b"<article>2</article>"),
+                ],
+            )
+
+    def test_writer_rolls_over_to_new_pack(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with packs.PackWriter(tmpdir, max_size=1) as writer:
+                for i in range(3):
+                    writer.write("pid-%d" % i, "<article>%d</article>" % i)
+
+            self.assertEqual(len(packs.list_packs(tmpdir)), 3)
+            self.assertEqual(
+                [pid for pid, _ in packs.iter_documents(tmpdir)],
+                ["pid-0", "pid-1", "pid-2"],
+            )
+
+    def test_writers_do_not_share_packs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with packs.PackWriter(tmpdir, max_size=1024) as first:
+                with packs.PackWriter(tmpdir, max_size=1024) as second:
+                    first.write("pid-1", "1")
+                    second.write("pid-2", "2")
+
+            self.assertEqual(len(packs.list_packs(tmpdir)), 2)
+            self.assertEqual(
+                sorted(packs.iter_documents(tmpdir)), [("pid-1", b"1"), ("pid-2", b"2")]
+            )
+
+    def test_get_document_returns_latest_version(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for content in ("old", "new"):
+                with packs.PackWriter(tmpdir, max_size=1024) as writer:
+                    writer.write("pid-1", content)
+
+            self.assertEqual(packs.get_document(tmpdir, "pid-1"), b"new")
+            self.assertIsNone(packs.get_document(tmpdir, "pid-2"))
+
+    def test_iter_documents_reads_only_latest_version(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with packs.PackWriter(tmpdir, max_size=1024) as writer:
+                writer.write("pid-1", "old")
+                writer.write("pid-2", "2")
+                writer.write("pid-1", "newer")
+            with packs.PackWriter(tmpdir, max_size=1024) as writer:
+                writer.write("pid-1", "new")
+
+            self.assertEqual(
+                list(packs.iter_documents(tmpdir)), [("pid-2", b"2"), ("pid-1", b"new")]
+            )
+
+    def test_unindexed_record_is_ignored(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with packs.PackWriter(tmpdir, max_size=1024) as writer:
+                writer.write("pid-1", "1")
+            with open(packs.list_packs(tmpdir)[0], "ab") as f:
+                f.write(b"truncated")
+
+            self.assertEqual(list(packs.iter_documents(tmpdir)), [("pid-1", b"1")])
+
+
+class TestUtilsThrottle(unittest.TestCase):
+    def test_limiter_increases_additively(self):
+        limiter = throttle.AdaptiveLimiter(
+            initial_limit=2, max_limit=10, latency_target=60
+        )
+        for _ in range(4):
+            limiter.release(limiter.acquire(), overloaded=False)
+        self.assertEqual(limiter.limit, 3)
+
+    def test_limiter_decreases_once_per_window(self):
+        limiter = throttle.AdaptiveLimiter(
+            initial_limit=8, max_limit=10, latency_target=60
+        )
+        started = [limiter.acquire() for _ in range(3)]
+        for started_at in started:
+            limiter.release(started_at, overloaded=True)
+        self.assertEqual(limiter.limit, 4)
+
+        limiter.release(limiter.acquire(), overloaded=True)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_limiter_respects_bounds(self):
+        limiter = throttle.AdaptiveLimiter(
+            initial_limit=1, max_limit=2, latency_target=60
+        )
+        limiter.release(limiter.acquire(), overloaded=True)
+        self.assertEqual(limiter.limit, 1)
+        for _ in range(10):
+            limiter.release(limiter.acquire(), overloaded=False)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_limiter_treats_slow_responses_as_overload(self):
+        limiter = throttle.AdaptiveLimiter(
+            initial_limit=4, max_limit=10, latency_target=0
+        )
+        limiter.release(limiter.acquire() - 1, overloaded=False)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_breaker_opens_after_threshold(self):
+        breaker = throttle.CircuitBreaker(
+            failure_threshold=2, reset_timeout=60, max_wait=0
+        )
+        breaker.record_failure()
+        breaker.before_call()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, breaker.OPEN)
+        with self.assertRaises(throttle.CircuitOpenError):
+            breaker.before_call()
+
+    def test_breaker_probes_after_reset_timeout(self):
+        breaker = throttle.CircuitBreaker(
+            failure_threshold=1, reset_timeout=0, max_wait=0
+        )
+        breaker.record_failure()
+        breaker.before_call()
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_throttle_slot_counts_exceptions_as_overload(self):
+        slots = throttle.Throttle(
+            throttle.AdaptiveLimiter(initial_limit=4, max_limit=8, latency_target=60),
+            throttle.CircuitBreaker(failure_threshold=1, reset_timeout=60, max_wait=0),
+        )
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            with slots.slot():
+                raise requests.exceptions.ConnectionError()
+
+        self.assertEqual(slots.limiter.limit, 2)
+        self.assertEqual(slots.limiter.in_flight, 0)
+        self.assertEqual(slots.breaker.state, slots.breaker.OPEN)
+
+
+class TestUtilsMetrics(unittest.TestCase):
+    def test_histogram_percentiles(self):
+        histogram = metrics.Histogram()
+        for value in [3] * 90 + [40] * 9 + [2000]:
+            histogram.observe(value)
+
+        self.assertEqual(histogram.percentile(50), 5)
+        self.assertEqual(histogram.percentile(99), 50)
+        self.assertEqual(histogram.percentile(100), 2000)
+        self.assertEqual(
+            histogram.summary()["buckets"], {"<=5": 90, "<=50": 9, "<=2500": 1}
+        )
+
+    def test_histogram_values_above_last_bucket(self):
+        histogram = metrics.Histogram()
+        histogram.observe(60000)
+        self.assertEqual(histogram.percentile(50), 60000)
+        self.assertEqual(histogram.summary()["buckets"], {"inf": 1})
+
+    def test_timed_and_snapshot(self):
+        registry = metrics.Metrics()
+        with registry.timed("source.write"):
+            pass
+        registry.incr("request.bytes", 10)
+
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["counters"], {"request.bytes": 10})
+        self.assertEqual(snapshot["histograms"]["source.write"]["count"], 1)
+        json.dumps(snapshot)
+
+    def test_reporter_emits_final_summary(self):
+        registry = metrics.Metrics()
+        registry.incr("extract.documents", 3)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_path = os.path.join(tmpdir, "metrics.jsonl")
+            with metrics.Reporter(registry, interval=0, output_path=output_path):
+                pass
+
+            with open(output_path) as f:
+                summaries = [json.loads(line) for line in f]
+
+        self.assertEqual(len(summaries), 1)
+        self.assertEqual(summaries[0]["counters"], {"extract.documents": 3})
+
+    def test_reporter_logs_summary(self):
+        with self.assertLogs("documentstore_migracao.utils.metrics") as log:
+            metrics.Reporter(metrics.Metrics(), interval=0).stop()
+        self.assertIn("Métricas", log.output[0])
+
+
+class TestUtilsProfiling(unittest.TestCase):
+    def test_profiler_records_pipes(self):
+        pipeline = HTML2SPSPipeline(pid="S0000-00002019000100001")
+        profiler = profiling.PipeProfiler()
+        profiler.instrument(pipeline)
+
+        text = "<root><p>texto <b>negrito</b></p><p>outro</p></root>"
+        pipeline.deploy(text)
+
+        ms, nodes = profiler.samples["HTML2SPSPipeline.PPipe"]
+        self.assertGreaterEqual(ms, 0)
+        self.assertEqual(nodes, 2)
+        self.assertEqual(profiler.samples["HTML2SPSPipeline.BPipe"][1], 1)
+        self.assertIn("DataSanitizationPipeline.TableinP", profiler.samples)
+
+        profiler.reset()
+        self.assertEqual(profiler.samples, {})
+
+    def test_report(self):
+        report = profiling.PipeProfileReport(slowest=2)
+        report.add("a", {"PPipe": [1.0, 2], "BPipe": [3.0, 1]})
+        report.add("b", {"PPipe": [4.0, 5]})
+        report.add("c", {"PPipe": [2.0, 1]})
+
+        data = report.to_dict()
+        self.assertEqual(data["documents"], 3)
+        self.assertEqual(data["total_ms"], 10.0)
+        self.assertEqual([pipe["pipe"] for pipe in data["pipes"]], ["PPipe", "BPipe"])
+        self.assertEqual(data["pipes"][0]["nodes"], 8)
+        self.assertEqual(
+            [slowest["document"] for slowest in data["pipes"][0]["slowest"]], ["b", "c"]
+        )
+        self.assertIn("PPipe: b (4.0ms), c (2.0ms)", profiling.format_report(data))
+
+
+class TestUtilsBodySink(unittest.TestCase):
+    def test_raw_body_sink_writes_packs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sink = body_sink.RawBodySink(tmpdir, max_size=1024 ** 2, queue_size=1)
+            sink.put("S0000-00002019000100001-1", "<body>um</body>")
+            sink.put("S0000-00002019000100001-2", "<body>dois</body>")
+            sink.close()
+
+            self.assertEqual(
+                list(packs.iter_documents(tmpdir)),
+                [
+                    ("S0000-00002019000100001-1", b"<body>um</body>"),
+                    ("S0000-00002019000100001-2", b"<body>dois</body>"),
+                ],
+            )
+
+    def test_get_sink_disabled_by_default(self):
+        with utils.environ(RAW_BODY_SINK_PATH=""):
+            self.assertIsNone(body_sink.get_sink())
+
+    def test_pipeline_saves_raw_body(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with utils.environ(RAW_BODY_SINK_PATH=tmpdir):
+                try:
+                    HTML2SPSPipeline(pid="S0000-00002019000100001").deploy(
+                        "<p>texto</p>"
+                    )
+                finally:
+                    body_sink.close_sink()
+
+            [(name, content)] = list(packs.iter_documents(tmpdir))
+        self.assertEqual(name, "S0000-00002019000100001-1")
+        self.assertIn(b"<p>texto</p>", content)